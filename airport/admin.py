@@ -9,8 +9,12 @@ from .models import (
     Airplane,
     Crew,
     Flight,
+    FlightSchedule,
     Order,
     Ticket,
+    Reservation,
+    SeatHold,
+    OutboxMessage,
 )
 
 
@@ -46,7 +50,21 @@ class CrewAdmin(admin.ModelAdmin):
 
 @admin.register(Flight)
 class FlightAdmin(admin.ModelAdmin):
-    list_display = ("route", "airplane", "departure_time", "arrival_time")
+    list_display = ("route", "airplane", "departure_time", "arrival_time", "seats_sold")
+    list_filter = ("route",)
+
+
+@admin.register(FlightSchedule)
+class FlightScheduleAdmin(admin.ModelAdmin):
+    list_display = (
+        "route",
+        "airplane",
+        "days_of_week",
+        "departure_time",
+        "valid_from",
+        "valid_until",
+        "materialized_until",
+    )
     list_filter = ("route",)
 
 
@@ -56,6 +74,19 @@ class TicketAdmin(admin.ModelAdmin):
     list_filter = ("flight",)
 
 
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ("reservation", "flight", "row", "seat")
+    list_filter = ("flight",)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("topic", "created_at", "attempts", "available_at", "failed_at")
+    list_filter = ("topic", "failed_at")
+
+
 admin.site.register(Country)
 admin.site.register(AirplaneType)
 admin.site.register(Order)
+admin.site.register(Reservation)
@@ -0,0 +1,314 @@
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Concat, TruncDate, TruncHour
+from django.utils import timezone
+
+from .date_ranges import departure_range
+from .models import (
+    DailyRouteLoad,
+    Flight,
+    HourlySales,
+    RollupWatermark,
+    Route,
+    Ticket,
+)
+
+ROLLUP_BATCH_SIZE = 10000
+
+
+def hour_range(date_from, date_to):
+    """Filter kwargs for sales hours between the dates, inclusive"""
+    return {
+        "hour__gte": datetime.combine(date_from, time.min, dt_timezone.utc),
+        "hour__lt": datetime.combine(
+            date_to + timedelta(days=1), time.min, dt_timezone.utc
+        ),
+    }
+
+
+def _watermark(name):
+    """Lock the watermark, so rollups never run twice over the same rows"""
+    watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(
+        name=name
+    )
+    return watermark
+
+
+def roll_up(batch_size=ROLLUP_BATCH_SIZE):
+    """Add tickets and flights created since the watermarks to the rollups.
+
+    Each batch is read once, counted in memory and written with one upsert
+    per rollup table, in the transaction that moves the watermarks. Tickets
+    and flights are only taken once they, or the order of the tickets, are
+    ANALYTICS_ROLLUP_DELAY old, so rows still being committed with lower
+    ids are not skipped over. Flights and seats of a route and day are
+    recounted whenever a flight or ticket of it is rolled up. Returns the
+    number of tickets and flights added.
+    """
+    tickets = flights = 0
+    while True:
+        with transaction.atomic():
+            added_tickets, added_flights, done = _roll_up_batch(batch_size)
+        tickets += added_tickets
+        flights += added_flights
+        if done:
+            return tickets, flights
+
+
+def _roll_up_batch(batch_size):
+    ticket_mark = _watermark("tickets")
+    flight_mark = _watermark("flights")
+    cutoff = timezone.now() - settings.ANALYTICS_ROLLUP_DELAY
+
+    flights = list(
+        Flight.objects.filter(id__gt=flight_mark.last_id)
+        .order_by("id")
+        .values_list("id", "created_at", "route_id", "departure_time")[:batch_size]
+    )
+    flights_done = len(flights) < batch_size
+    for position, (_, created_at, *_) in enumerate(flights):
+        if created_at >= cutoff:
+            flights = flights[:position]
+            flights_done = True
+            break
+
+    tickets = list(
+        Ticket.objects.filter(id__gt=ticket_mark.last_id)
+        .order_by("id")
+        .values_list(
+            "id",
+            "order__created_at",
+            "flight__route_id",
+            "flight__departure_time",
+            "flight__airplane__airplane_type_id",
+        )[:batch_size]
+    )
+    tickets_done = len(tickets) < batch_size
+    for position, (_, ordered_at, *_) in enumerate(tickets):
+        if ordered_at >= cutoff:
+            tickets = tickets[:position]
+            tickets_done = True
+            break
+
+    sold = Counter(
+        (route_id, timezone.localdate(departure_time))
+        for _, _, route_id, departure_time, _ in tickets
+    )
+    sales = Counter(
+        (ordered_at.replace(minute=0, second=0, microsecond=0), route_id, type_id)
+        for _, ordered_at, route_id, _, type_id in tickets
+    )
+    days = set(sold) | {
+        (route_id, timezone.localdate(departure_time))
+        for _, _, route_id, departure_time in flights
+    }
+    _add_route_loads(days, sold)
+    _add_sales(sales)
+
+    if tickets:
+        ticket_mark.last_id = tickets[-1][0]
+        ticket_mark.save()
+    if flights:
+        flight_mark.last_id = flights[-1][0]
+        flight_mark.save()
+    return len(tickets), len(flights), tickets_done and flights_done
+
+
+def _add_route_loads(days, sold):
+    """Recount flights and seats of the route days and add sold seats"""
+    if not days:
+        return
+
+    routes = {route_id for route_id, _ in days}
+    first, last = min(day for _, day in days), max(day for _, day in days)
+    capacity = F("airplane__rows") * F("airplane__seats_in_row")
+    counts = {
+        (route_id, day): (flights, seats)
+        for route_id, day, flights, seats in Flight.objects.filter(
+            route_id__in=routes, **departure_range(first, last)
+        )
+        .annotate(day=TruncDate("departure_time"))
+        .values("route_id", "day")
+        .annotate(flights=Count("id"), seats=Sum(capacity))
+        .values_list("route_id", "day", "flights", "seats")
+    }
+    previous = {
+        (route_id, day): seats_sold
+        for route_id, day, seats_sold in DailyRouteLoad.objects.filter(
+            route_id__in=routes, date__range=(first, last)
+        ).values_list("route_id", "date", "seats_sold")
+    }
+
+    rows = []
+    for route_id, day in days:
+        flights, seats = counts.get((route_id, day), (0, 0))
+        rows.append(
+            DailyRouteLoad(
+                route_id=route_id,
+                date=day,
+                flights=flights,
+                seats=seats,
+                seats_sold=previous.get((route_id, day), 0) + sold[(route_id, day)],
+            )
+        )
+    DailyRouteLoad.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["route", "date"],
+        update_fields=["flights", "seats", "seats_sold"],
+    )
+
+
+def _add_sales(sales):
+    if not sales:
+        return
+
+    previous = {
+        (hour, route_id, type_id): tickets
+        for hour, route_id, type_id, tickets in HourlySales.objects.filter(
+            hour__in={hour for hour, _, _ in sales},
+            route_id__in={route_id for _, route_id, _ in sales},
+        ).values_list("hour", "route_id", "airplane_type_id", "tickets")
+    }
+    HourlySales.objects.bulk_create(
+        [
+            HourlySales(
+                hour=hour,
+                route_id=route_id,
+                airplane_type_id=type_id,
+                tickets=previous.get((hour, route_id, type_id), 0) + tickets,
+            )
+            for (hour, route_id, type_id), tickets in sales.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["hour", "route", "airplane_type"],
+        update_fields=["tickets"],
+    )
+
+
+def rebuild_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """Recount the rollups from the tickets and flights still stored.
+
+    Rollups only grow, so this is how refunded tickets and deleted or
+    moved flights are taken out of them. New rows are rolled up first,
+    then each route is recounted in a transaction of its own, up to the
+    watermarks, which are locked meanwhile. The "rebuild" watermark keeps
+    the last route done, so an interrupted rebuild goes on from there.
+    Returns the number of tickets and flights in the rollups.
+    """
+    roll_up(batch_size)
+
+    tickets = flights = 0
+    while True:
+        with transaction.atomic():
+            route_id, route_tickets, route_flights = _rebuild_next_route()
+        if route_id is None:
+            return tickets, flights
+        tickets += route_tickets
+        flights += route_flights
+
+
+def _rebuild_next_route():
+    ticket_mark = _watermark("tickets")
+    flight_mark = _watermark("flights")
+    rebuild_mark = _watermark("rebuild")
+    route_id = (
+        Route.objects.filter(id__gt=rebuild_mark.last_id)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    if route_id is None:
+        rebuild_mark.last_id = 0
+        rebuild_mark.save()
+        return None, 0, 0
+
+    DailyRouteLoad.objects.filter(route_id=route_id).delete()
+    HourlySales.objects.filter(route_id=route_id).delete()
+
+    tickets = Ticket.objects.filter(
+        id__lte=ticket_mark.last_id, flight__route_id=route_id
+    )
+    sold = Counter(
+        {
+            (route_id, day): count
+            for day, count in tickets.annotate(
+                day=TruncDate("flight__departure_time")
+            )
+            .values("day")
+            .annotate(count=Count("id"))
+            .values_list("day", "count")
+        }
+    )
+    sales = Counter(
+        {
+            (hour, route_id, type_id): count
+            for hour, type_id, count in tickets.annotate(
+                hour=TruncHour("order__created_at", tzinfo=dt_timezone.utc),
+                type_id=F("flight__airplane__airplane_type_id"),
+            )
+            .values("hour", "type_id")
+            .annotate(count=Count("id"))
+            .values_list("hour", "type_id", "count")
+        }
+    )
+    flight_days = {
+        (route_id, day): count
+        for day, count in Flight.objects.filter(
+            id__lte=flight_mark.last_id, route_id=route_id
+        )
+        .annotate(day=TruncDate("departure_time"))
+        .values("day")
+        .annotate(count=Count("id"))
+        .values_list("day", "count")
+    }
+    _add_route_loads(set(sold) | set(flight_days), sold)
+    _add_sales(sales)
+
+    rebuild_mark.last_id = route_id
+    rebuild_mark.save()
+    return route_id, sum(sold.values()), sum(flight_days.values())
+
+
+def route_loads(date_from, date_to, route_id=None):
+    """Daily load of routes departing between the dates"""
+    loads = DailyRouteLoad.objects.filter(
+        date__range=(date_from, date_to)
+    ).select_related(
+        "route__source__closest_big_city", "route__destination__closest_big_city"
+    )
+    if route_id is not None:
+        loads = loads.filter(route_id=route_id)
+    return loads
+
+
+def route_name():
+    return Concat(
+        F("route__source__closest_big_city__name"),
+        Value(" - "),
+        F("route__destination__closest_big_city__name"),
+    )
+
+
+def sales_by_airplane_type(date_from, date_to):
+    """Tickets ordered between the dates per airplane type, most sold first"""
+    return (
+        HourlySales.objects.filter(**hour_range(date_from, date_to))
+        .values("airplane_type_id", name=F("airplane_type__name"))
+        .annotate(tickets=Sum("tickets"))
+        .order_by("-tickets", "airplane_type_id")
+    )
+
+
+def top_selling_routes(date_from, date_to, limit):
+    """Routes with the most tickets ordered between the dates"""
+    return (
+        HourlySales.objects.filter(**hour_range(date_from, date_to))
+        .values("route_id", name=route_name())
+        .annotate(tickets=Sum("tickets"))
+        .order_by("-tickets", "route_id")[:limit]
+    )
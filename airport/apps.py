@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AirportConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "airport"
+
+    def ready(self):
+        from . import notifications, signals  # noqa: F401
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+CACHE_VERSION_KEY = "airport:cache_version:{}"
+LIST_CACHE_KEY = "airport:list:{}:{}"
+
+
+def model_version_key(model) -> str:
+    return CACHE_VERSION_KEY.format(model._meta.label_lower)
+
+
+def invalidate_model_cache(model) -> None:
+    """Make every cached response built from the model stale"""
+    cache.set(model_version_key(model), uuid.uuid4().hex, None)
+
+
+class CachedListMixin:
+    """Serve list responses from the cache with ETag support.
+
+    Entries are keyed by the scheme, host and query params, as responses
+    hold absolute URLs, and by the current version of every model in
+    ``cache_models``; saving or deleting any of them bumps the version, so
+    old entries are never read again and expire on their own.
+    """
+
+    cache_models = ()
+
+    def get_cache_models(self):
+        return self.cache_models or (self.queryset.model,)
+
+    def get_list_cache_key(self, request) -> str:
+        version_keys = [model_version_key(model) for model in self.get_cache_models()]
+        versions = cache.get_many(version_keys)
+        state = "|".join(
+            versions.get(key) or cache.get_or_set(key, uuid.uuid4().hex, None)
+            for key in version_keys
+        )
+        params = "&".join(
+            f"{name}={value}"
+            for name, values in sorted(request.query_params.lists())
+            for value in values
+        )
+        origin = f"{request.scheme}://{request.get_host()}"
+        digest = hashlib.md5(f"{state}|{origin}?{params}".encode()).hexdigest()
+        return LIST_CACHE_KEY.format(self.basename, digest)
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+            data = response.data
+            etag = '"{}"'.format(
+                hashlib.md5(
+                    json.dumps(data, sort_keys=True, default=str).encode()
+                ).hexdigest()
+            )
+            cache.set(key, (etag, data), settings.REFERENCE_CACHE_TIMEOUT)
+        else:
+            etag, data = cached
+
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        return Response(data, headers={"ETag": etag})
@@ -0,0 +1,140 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Max, Q
+
+from .date_ranges import departure_range
+from .models import Flight
+
+Assignment = namedtuple(
+    "Assignment", ("crew_id", "flight_id", "departure_time", "arrival_time")
+)
+Conflict = namedtuple("Conflict", ("crew_id", "flight", "overlapping"))
+
+ASSIGNMENT_FIELDS = (
+    "crew_id",
+    "flight_id",
+    "flight__departure_time",
+    "flight__arrival_time",
+)
+
+
+def overlapping_assignments(crew_ids, departure_time, arrival_time, flight_id=None):
+    """Flights of the crews overlapping the interval, in one query.
+
+    The crew_id index of the crews table picks the crews' flights, so the
+    cost grows with their rosters, not with the number of flights.
+    """
+    if not crew_ids:
+        return []
+
+    assignments = Flight.crews.through.objects.filter(
+        crew_id__in=crew_ids,
+        flight__departure_time__lt=arrival_time,
+        flight__arrival_time__gt=departure_time,
+    )
+    if flight_id is not None:
+        assignments = assignments.exclude(flight_id=flight_id)
+    return [
+        Assignment(*row)
+        for row in assignments.order_by(
+            "crew_id", "flight__departure_time"
+        ).values_list(*ASSIGNMENT_FIELDS)
+    ]
+
+
+def sweep_conflicts(assignments):
+    """Find flights of the same crew overlapping in time, in O(n log n).
+
+    Assignments are sorted by crew and departure, then swept keeping the
+    flight of the crew that lands last so far. A flight departing before
+    it lands overlaps it. Every flight overlapping an earlier one of its
+    crew is reported once, paired with the flight it was found against.
+    """
+    conflicts = []
+    crew_id = latest = None
+    for assignment in sorted(
+        assignments, key=lambda assignment: (assignment[0], assignment[2])
+    ):
+        assignment = Assignment(*assignment)
+        if assignment.crew_id != crew_id:
+            crew_id, latest = assignment.crew_id, assignment
+            continue
+
+        if assignment.departure_time < latest.arrival_time:
+            conflicts.append(Conflict(crew_id, assignment, latest))
+        if assignment.arrival_time > latest.arrival_time:
+            latest = assignment
+    return conflicts
+
+
+def new_conflicts(assignments, replaced_flights=()):
+    """Conflicts of new crew assignments, with stored ones or each other.
+
+    Flights not stored yet may be keyed by anything but an id. Stored
+    assignments of the crews overlapping the new ones are read in one
+    query, except those of replaced_flights, whose crews are being
+    replaced, then everything is swept at once. Each conflict has a new
+    assignment as its flight, the one to leave out.
+    """
+    if not assignments:
+        return []
+
+    new = {(assignment.crew_id, assignment.flight_id) for assignment in assignments}
+    stored = (
+        Flight.crews.through.objects.filter(
+            crew_id__in={assignment.crew_id for assignment in assignments},
+            flight__departure_time__lt=max(
+                assignment.arrival_time for assignment in assignments
+            ),
+            flight__arrival_time__gt=min(
+                assignment.departure_time for assignment in assignments
+            ),
+        )
+        .exclude(flight_id__in=replaced_flights)
+        .values_list(*ASSIGNMENT_FIELDS)
+    )
+    conflicts = []
+    for conflict in sweep_conflicts(
+        [*assignments, *(row for row in stored if row[:2] not in new)]
+    ):
+        if (conflict.crew_id, conflict.flight.flight_id) in new:
+            conflicts.append(conflict)
+        elif (conflict.crew_id, conflict.overlapping.flight_id) in new:
+            conflicts.append(
+                Conflict(conflict.crew_id, conflict.overlapping, conflict.flight)
+            )
+    return conflicts
+
+
+def season_conflicts(date_from, date_to, chunk_size=10000):
+    """Crew conflicts of flights departing between the dates, inclusive.
+
+    Flights departing earlier, at most the longest flight duration before
+    the first date, are swept too while they are still in the air then,
+    as they overlap flights of the range departing before they land.
+    """
+    departures = departure_range(date_from, date_to)
+    start = departures["departure_time__gte"]
+    longest = Flight.objects.aggregate(
+        longest=Max(F("arrival_time") - F("departure_time"))
+    )["longest"] or timedelta()
+    assignments = (
+        Flight.crews.through.objects.using(settings.STREAMING_DB_ALIAS)
+        .filter(
+            Q(**{f"flight__{lookup}": value for lookup, value in departures.items()})
+            | Q(
+                flight__departure_time__gte=start - longest,
+                flight__departure_time__lt=start,
+                flight__arrival_time__gt=start,
+            )
+        )
+        .values_list(*ASSIGNMENT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    return [
+        conflict
+        for conflict in sweep_conflicts(assignments)
+        if conflict.flight.departure_time >= start
+    ]
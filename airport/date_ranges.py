@@ -0,0 +1,11 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+
+def departure_range(date_from, date_to):
+    """Filter kwargs for flights departing between the dates, inclusive"""
+    return {
+        "departure_time__gte": datetime.combine(date_from, time.min, dt_timezone.utc),
+        "departure_time__lt": datetime.combine(
+            date_to + timedelta(days=1), time.min, dt_timezone.utc
+        ),
+    }
@@ -0,0 +1,293 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .models import (
+    Country,
+    City,
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Crew,
+    Flight,
+    Order,
+    Ticket,
+)
+from .search_rows import refresh_search_rows
+from .seat_map import SeatMap
+
+AIRPLANE_LAYOUTS = (
+    ("Regional jet", 20, 4),
+    ("Narrow-body", 30, 6),
+    ("Wide-body", 45, 9),
+)
+
+# Minutes an airplane spends on the ground between two legs
+MIN_TURNAROUND = 45
+
+
+def create_countries(count, batch_size=1000):
+    return Country.objects.bulk_create(
+        (Country(name=f"Country {number}") for number in range(count)),
+        batch_size=batch_size,
+    )
+
+
+def create_cities(countries, per_country, batch_size=1000):
+    return City.objects.bulk_create(
+        (
+            City(name=f"City {country.pk}-{number}", country=country)
+            for country in countries
+            for number in range(per_country)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def create_airports(cities, per_city=1, batch_size=1000):
+    return Airport.objects.bulk_create(
+        (
+            Airport(name=f"{city.name} Airport {number}", closest_big_city=city)
+            for city in cities
+            for number in range(per_city)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def create_routes(airports, per_airport, rng, batch_size=1000):
+    """Connect every airport with randomly picked destinations"""
+    routes = []
+    for source in airports:
+        destinations = rng.sample(airports, min(per_airport + 1, len(airports)))
+        routes.extend(
+            Route(
+                source=source,
+                destination=destination,
+                distance=rng.randint(200, 9000),
+            )
+            for destination in destinations
+            if destination is not source
+        )
+    return Route.objects.bulk_create(routes, batch_size=batch_size)
+
+
+def create_airplanes(count, rng, batch_size=1000):
+    airplane_types = AirplaneType.objects.bulk_create(
+        AirplaneType(name=name) for name, _, _ in AIRPLANE_LAYOUTS
+    )
+    airplanes = []
+    for number in range(count):
+        index = rng.randrange(len(AIRPLANE_LAYOUTS))
+        _, rows, seats_in_row = AIRPLANE_LAYOUTS[index]
+        airplanes.append(
+            Airplane(
+                name=f"Airplane {number}",
+                rows=rows,
+                seats_in_row=seats_in_row,
+                airplane_type=airplane_types[index],
+            )
+        )
+    return Airplane.objects.bulk_create(airplanes, batch_size=batch_size)
+
+
+def create_crews(count, batch_size=1000):
+    return Crew.objects.bulk_create(
+        (
+            Crew(first_name=f"Crew {number}", last_name=f"Member {number}")
+            for number in range(count)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def create_flights(
+    routes, airplanes, count, rng, days=30, load_factor=0.0, batch_size=1000
+):
+    """Fly every airplane along a chain of routes over the next days.
+
+    Each leg departs from the airport the previous one landed at, after a
+    turnaround sized to spread the legs over the days, so an airplane never
+    has two flights at once. Seats_sold and seat maps are set with sold
+    seats spread around the given load factor.
+    """
+    start = timezone.now().replace(minute=0, second=0, microsecond=0)
+    routes_by_source = defaultdict(list)
+    for route in routes:
+        routes_by_source[route.source_id].append(route)
+
+    flights = []
+    for index, airplane in enumerate(airplanes):
+        legs = count // len(airplanes) + (index < count % len(airplanes))
+        if not legs:
+            continue
+
+        chain = [rng.choice(routes)]
+        while len(chain) < legs:
+            destination_id = chain[-1].destination_id
+            chain.append(rng.choice(routes_by_source[destination_id] or routes))
+
+        durations = [route.distance // 12 + 30 for route in chain]
+        turnaround = max(MIN_TURNAROUND, (days * 24 * 60 - sum(durations)) // legs)
+        departure_time = start + timedelta(minutes=rng.randrange(0, 24 * 60, 5))
+        for route, duration in zip(chain, durations):
+            share = min(1.0, max(0.0, rng.gauss(load_factor, 0.1))) if load_factor else 0
+            seats_sold = int(airplane.capacity * share)
+
+            seat_map = SeatMap(airplane.rows, airplane.seats_in_row)
+            for place in range(seats_sold):
+                row, seat = divmod(place, airplane.seats_in_row)
+                seat_map.take(row + 1, seat + 1)
+
+            arrival_time = departure_time + timedelta(minutes=duration)
+            flights.append(
+                Flight(
+                    route=route,
+                    airplane=airplane,
+                    departure_time=departure_time,
+                    arrival_time=arrival_time,
+                    seats_sold=seats_sold,
+                    seat_map=seat_map.to_bytes(),
+                )
+            )
+            departure_time = arrival_time + timedelta(
+                minutes=rng.randint(MIN_TURNAROUND, 2 * turnaround - MIN_TURNAROUND)
+                // 5 * 5
+            )
+    flights = Flight.objects.bulk_create(flights, batch_size=batch_size)
+    # bulk_create skips post_save, which keeps search rows up to date
+    refresh_search_rows(
+        Flight.objects.filter(pk__in=[flight.pk for flight in flights]), batch_size
+    )
+    return flights
+
+
+def crew_pools(airplanes, crews):
+    """Split the crews between the airplanes, each crew flies one airplane.
+
+    An airplane never has two flights at once, so crews picked from its
+    pool never have either. Pools only depend on the ids, so processes
+    seeding different airplanes agree on them.
+    """
+    airplane_ids = sorted(airplane.pk for airplane in airplanes)
+    crews = sorted(crews, key=lambda crew: crew.pk)
+    return {
+        airplane_id: crews[index::len(airplane_ids)]
+        for index, airplane_id in enumerate(airplane_ids)
+    }
+
+
+def assign_crews(flights, pools, per_flight, rng, batch_size=5000):
+    """Insert crew memberships straight into the M2M through table.
+
+    Crews of a flight are picked from the pool of its airplane, see
+    crew_pools, so no crew is on two flights at once.
+    """
+    through = Flight.crews.through
+    return through.objects.bulk_create(
+        (
+            through(flight_id=flight.pk, crew_id=crew.pk)
+            for flight in flights
+            for crew in rng.sample(
+                pools[flight.airplane_id],
+                min(per_flight, len(pools[flight.airplane_id])),
+            )
+        ),
+        batch_size=batch_size,
+    )
+
+
+def create_users(count, batch_size=1000):
+    user_model = get_user_model()
+    return user_model.objects.bulk_create(
+        (
+            user_model(email=f"passenger{number}@airport.com")
+            for number in range(count)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def create_tickets(flights, users, rng, tickets_per_order=3, batch_size=5000):
+    """Create orders and tickets for seats marked as sold on the flights.
+
+    Tickets are taken row by row, matching the seat maps built by
+    create_flights, so counters and bitmaps stay consistent.
+    """
+    tickets_total = 0
+    flights_per_batch = max(1, batch_size // 100)
+    for start in range(0, len(flights), flights_per_batch):
+        seats = []
+        for flight in flights[start:start + flights_per_batch]:
+            seats_in_row = flight.airplane.seats_in_row
+            seats.extend(
+                (flight, index // seats_in_row + 1, index % seats_in_row + 1)
+                for index in range(flight.seats_sold)
+            )
+
+        orders = Order.objects.bulk_create(
+            (
+                Order(user_id=rng.choice(users).pk)
+                for _ in range(0, len(seats), tickets_per_order)
+            ),
+            batch_size=batch_size,
+        )
+        Ticket.objects.bulk_create(
+            (
+                Ticket(
+                    order_id=orders[index // tickets_per_order].pk,
+                    flight_id=flight.pk,
+                    row=row,
+                    seat=seat,
+                )
+                for index, (flight, row, seat) in enumerate(seats)
+            ),
+            batch_size=batch_size,
+        )
+        tickets_total += len(seats)
+    return tickets_total
+
+
+def create_dataset(
+    flights=1000,
+    load_factor=0.75,
+    countries=20,
+    cities_per_country=5,
+    routes_per_airport=8,
+    airplanes=100,
+    crews=400,
+    users=200,
+    days=30,
+    seed=0,
+):
+    """Fill the database with a connected network and sold tickets"""
+    rng = random.Random(seed)
+    country_objects = create_countries(countries)
+    airport_objects = create_airports(
+        create_cities(country_objects, cities_per_country)
+    )
+    route_objects = create_routes(airport_objects, routes_per_airport, rng)
+    airplane_objects = create_airplanes(airplanes, rng)
+    crew_objects = create_crews(crews)
+    flight_objects = create_flights(
+        route_objects,
+        airplane_objects,
+        flights,
+        rng,
+        days=days,
+        load_factor=load_factor,
+    )
+    assign_crews(flight_objects, crew_pools(airplane_objects, crew_objects), 4, rng)
+    tickets = create_tickets(flight_objects, create_users(users), rng)
+
+    return {
+        "countries": countries,
+        "airports": len(airport_objects),
+        "routes": len(route_objects),
+        "flights": len(flight_objects),
+        "tickets": tickets,
+    }
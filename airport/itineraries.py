@@ -0,0 +1,133 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from django.db.models import F
+
+from .models import Flight
+
+
+def available_flights():
+    return Flight.objects.select_related(
+        "route",
+        "airplane",
+        "route__destination__closest_big_city",
+        "route__source__closest_big_city",
+    ).filter(seats_sold__lt=F("airplane__rows") * F("airplane__seats_in_row"))
+
+
+def airports_reaching(graph, targets, legs):
+    """Return airports from which targets are reachable within the given legs"""
+    reverse = defaultdict(set)
+    for source_id, edges in graph.adjacency.items():
+        for _, destination_id, _, _ in edges:
+            reverse[destination_id].add(source_id)
+
+    reached = set(targets)
+    frontier = set(targets)
+    for _ in range(legs):
+        frontier = {
+            source_id for airport_id in frontier for source_id in reverse[airport_id]
+        } - reached
+        reached |= frontier
+    return reached
+
+
+class DeparturesBoard:
+    """Flights of one leg grouped by departure airport and sorted by time"""
+
+    def __init__(self, flights):
+        self.flights = defaultdict(list)
+        for flight in sorted(flights, key=lambda flight: flight.departure_time):
+            self.flights[flight.route.source_id].append(flight)
+        self.times = {
+            airport_id: [flight.departure_time for flight in flights]
+            for airport_id, flights in self.flights.items()
+        }
+
+    def departing(self, airport_id, earliest, latest):
+        times = self.times.get(airport_id)
+        if not times:
+            return []
+        start = bisect_left(times, earliest)
+        end = bisect_right(times, latest)
+        return self.flights[airport_id][start:end]
+
+
+def search_itineraries(
+    graph,
+    sources,
+    targets,
+    departure_from,
+    departure_to,
+    min_layover,
+    max_layover,
+    max_stops=2,
+    limit=20,
+):
+    """Find direct and connecting flights between airports.
+
+    Every leg is loaded with one query: flights that still have free
+    seats, leave from an airport reached by the previous leg within the
+    layover window and can still reach a target within the remaining
+    legs. Connections are then matched in memory with binary search over
+    departure times.
+    """
+    sources, targets = set(sources), set(targets)
+    reaching = [airports_reaching(graph, targets, legs) for legs in range(max_stops + 1)]
+
+    itineraries = []
+    partial = [[]]
+    for leg in range(max_stops + 1):
+        remaining_stops = max_stops - leg
+        if leg == 0:
+            flights = available_flights().filter(
+                route__source_id__in=sources,
+                route__destination_id__in=reaching[remaining_stops],
+                departure_time__gte=departure_from,
+                departure_time__lt=departure_to,
+            )
+            board = DeparturesBoard(flights)
+            extended = [
+                [flight]
+                for airport_id in sources
+                for flight in board.departing(airport_id, departure_from, departure_to)
+            ]
+        else:
+            if not partial:
+                break
+
+            origins = {path[-1].route.destination_id for path in partial}
+            earliest = min(path[-1].arrival_time for path in partial) + min_layover
+            latest = max(path[-1].arrival_time for path in partial) + max_layover
+            flights = available_flights().filter(
+                route__source_id__in=origins,
+                route__destination_id__in=reaching[remaining_stops],
+                departure_time__gte=earliest,
+                departure_time__lte=latest,
+            )
+            board = DeparturesBoard(flights)
+            extended = []
+            for path in partial:
+                visited = {path[0].route.source_id} | {
+                    flight.route.destination_id for flight in path
+                }
+                arrival = path[-1].arrival_time
+                for flight in board.departing(
+                    path[-1].route.destination_id,
+                    arrival + min_layover,
+                    arrival + max_layover,
+                ):
+                    if flight.route.destination_id not in visited:
+                        extended.append(path + [flight])
+
+        itineraries.extend(
+            path for path in extended if path[-1].route.destination_id in targets
+        )
+        partial = [
+            path for path in extended if path[-1].route.destination_id not in targets
+        ]
+
+    itineraries.sort(
+        key=lambda path: (path[-1].arrival_time, len(path), path[0].departure_time)
+    )
+    return itineraries[:limit]
@@ -0,0 +1,111 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.wsgi import get_wsgi_application
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import ResolverMatch, get_resolver
+
+
+def obtain_token(base_url, email, password):
+    request = Request(
+        f"{base_url}/api/user/token/",
+        data=json.dumps({"email": email, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urlopen(request) as response:
+        return json.load(response)["access"]
+
+
+def fetch(url, token):
+    """GET the url, return its status and how long it took in ms"""
+    request = Request(url, headers={"Authorization": f"Bearer {token}"})
+    started = time.perf_counter()
+    try:
+        with urlopen(request) as response:
+            response.read()
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    return status, (time.perf_counter() - started) * 1000
+
+
+def load(url, token, requests, concurrency):
+    """GET the url the number of times from parallel threads, return a summary"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(lambda _: fetch(url, token), range(requests)))
+    elapsed = time.perf_counter() - started
+
+    timings = sorted(timing for _, timing in results)
+    failed = sum(status != 200 for status, _ in results)
+    return (
+        f"{len(results) / elapsed:.1f} req/s, "
+        f"p50 {statistics.median(timings):.1f} ms, "
+        f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms, "
+        f"{failed} failed"
+    )
+
+
+def _empty_view(request):
+    return HttpResponse(b"{}", content_type="application/json")
+
+
+class _EmptyViewHandler(BaseHandler):
+    """Runs the middleware stack of the settings around an empty view"""
+
+    def resolve_request(self, request):
+        match = ResolverMatch(_empty_view, (), {})
+        request.resolver_match = match
+        return match
+
+
+def request_overhead(requests):
+    """Average seconds the middleware stack adds to a request"""
+    handler = _EmptyViewHandler()
+    handler.load_middleware()
+    factory = RequestFactory()
+    batch = [
+        factory.get("/api/airport/", HTTP_ACCEPT="application/json")
+        for _ in range(requests)
+    ]
+
+    # The request is for testserver, which only tests allow by default
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        started = time.perf_counter()
+        for request in batch:
+            response = handler.get_response(request)
+        elapsed = time.perf_counter() - started
+
+    if response.status_code != 200:
+        raise RuntimeError(f"The empty view answered {response.status_code}")
+    return elapsed / requests
+
+
+def report_overhead(requests):
+    """Print startup time and request overhead of the current settings as JSON.
+
+    Run in a fresh interpreter, so startup includes importing every app,
+    building the middleware stack and loading the URL patterns.
+    """
+    started = time.perf_counter()
+    get_wsgi_application()
+    get_resolver().url_patterns
+    startup = time.perf_counter() - started
+
+    print(
+        json.dumps(
+            {
+                "apps": len(settings.INSTALLED_APPS),
+                "middleware": len(settings.MIDDLEWARE),
+                "startup": startup,
+                "request": request_overhead(requests),
+            }
+        )
+    )
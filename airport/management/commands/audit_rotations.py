@@ -0,0 +1,56 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from airport.rotations import OVERLAP, audit_rotations
+
+
+class Command(BaseCommand):
+    help = (
+        "Report airplanes flying overlapping legs or departing from another "
+        "airport than they landed at. Fails if any are found."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date-from",
+            type=date.fromisoformat,
+            help="YYYY-MM-DD, audit only departures from this date",
+        )
+        parser.add_argument(
+            "--date-to",
+            type=date.fromisoformat,
+            help="YYYY-MM-DD, audit only departures up to this date",
+        )
+
+    def handle(self, *args, **options):
+        date_from, date_to = options["date_from"], options["date_to"]
+        if (date_from is None) != (date_to is None):
+            raise CommandError("Give both --date-from and --date-to, or neither")
+        if date_from and date_to < date_from:
+            raise CommandError("--date-to is before --date-from")
+
+        started = time.monotonic()
+        issues = audit_rotations(date_from, date_to)
+        for issue in issues:
+            leg, previous = issue.leg, issue.previous
+            if issue.kind == OVERLAP:
+                problem = (
+                    f"departs at {leg.departure_time:%Y-%m-%d %H:%M} before flight "
+                    f"{previous.flight_id} lands at "
+                    f"{previous.arrival_time:%Y-%m-%d %H:%M}"
+                )
+            else:
+                problem = (
+                    f"departs from airport {leg.source_id} but flight "
+                    f"{previous.flight_id} lands at airport {previous.destination_id}"
+                )
+            self.stdout.write(
+                f"airplane {leg.airplane_id}: flight {leg.flight_id} {problem}"
+            )
+
+        elapsed = time.monotonic() - started
+        if issues:
+            raise CommandError(f"{len(issues)} rotation issues")
+        self.stdout.write(self.style.SUCCESS(f"No rotation issues ({elapsed:.1f}s)"))
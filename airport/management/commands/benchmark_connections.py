@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from airport.load_testing import load, obtain_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Load an endpoint of a running server using the same database and "
+        "report how many PostgreSQL connections it opened per request. With "
+        "persistent connections the number drops to zero once every worker "
+        "thread has one. Behind pgbouncer, point this command at PostgreSQL "
+        "itself to count the server connections pgbouncer opens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--path", default="/api/airport/flights/")
+        parser.add_argument("--email", required=True)
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=2,
+            help="The first round also counts connections of cold workers",
+        )
+
+    def handle(self, *args, **options):
+        base_url = options["base_url"].rstrip("/")
+        url = base_url + options["path"]
+        token = obtain_token(base_url, options["email"], options["password"])
+
+        for number in range(1, options["rounds"] + 1):
+            sessions_before = self.sessions()
+            summary = load(url, token, options["requests"], options["concurrency"])
+            # Backends report their stats shortly after going idle
+            time.sleep(1.5)
+            opened = self.sessions() - sessions_before
+            self.stdout.write(
+                f"round {number}: {summary}, {opened} connections opened, "
+                f"{opened / options['requests']:.2f} per request"
+            )
+
+    @staticmethod
+    def sessions():
+        """Connections ever opened to the database, from pg_stat_database"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute(
+                "SELECT sessions FROM pg_stat_database WHERE datname = %s",
+                [connection.settings_dict["NAME"]],
+            )
+            return cursor.fetchone()[0]
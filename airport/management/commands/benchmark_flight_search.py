@@ -0,0 +1,45 @@
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand
+
+from airport.load_testing import load, obtain_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the flight search served by a WSGI and by an "
+        "ASGI server using the same database. The same view and response are "
+        "measured, so the difference is what serving it from an event loop "
+        "gains, its queries run one after another on both. Raise the user "
+        "throttle rate on both servers first, or most requests get 429."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", default="http://localhost:8000")
+        parser.add_argument("--asgi-url", default="http://localhost:8001")
+        parser.add_argument("--email", required=True)
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--source", type=int, required=True)
+        parser.add_argument("--destination", type=int, required=True)
+        parser.add_argument("--date", required=True, help="YYYY-MM-DD")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=20)
+
+    def handle(self, *args, **options):
+        params = urlencode(
+            {
+                "source": options["source"],
+                "destination": options["destination"],
+                "date": options["date"],
+            }
+        )
+        for name in ("wsgi", "asgi"):
+            base_url = options[f"{name}_url"].rstrip("/")
+            token = obtain_token(base_url, options["email"], options["password"])
+            summary = load(
+                f"{base_url}/api/airport/flights/search/?{params}",
+                token,
+                options["requests"],
+                options["concurrency"],
+            )
+            self.stdout.write(f"{name.upper()} flights search: {summary}")
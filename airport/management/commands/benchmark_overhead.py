@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare startup time and per-request middleware overhead of the "
+        "dev, test and prod settings, each measured in a fresh interpreter"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--envs", nargs="+", default=["dev", "test", "prod"]
+        )
+        parser.add_argument("--requests", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for env in options["envs"]:
+            environ = {
+                **os.environ,
+                "DJANGO_ENV": env,
+                "DJANGO_SETTINGS_MODULE": "airport_service.settings",
+            }
+            # prod refuses to start without a secret key of its own
+            environ.setdefault("SECRET_KEY", "benchmark")
+            script = (
+                "from airport.load_testing import report_overhead; "
+                f"report_overhead({options['requests']})"
+            )
+            output = subprocess.run(
+                [sys.executable, "-c", script],
+                env=environ,
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout
+            report = json.loads(output.splitlines()[-1])
+            self.stdout.write(
+                f"{env}: {report['apps']} apps, "
+                f"{report['middleware']} middleware, "
+                f"startup {report['startup'] * 1000:.0f} ms, "
+                f"{report['request'] * 1e6:.0f} us per request"
+            )
@@ -0,0 +1,80 @@
+import io
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from airport.models import City, Airport, Route, Airplane, Flight
+from airport.parsers import ORJSONParser
+from airport.renderers import ORJSONRenderer
+from airport.serializers import FlightListSerializer
+
+
+def sample_flights(count):
+    """Unsaved flights with their route and airplane, as the list view reads"""
+    departure = datetime(2024, 1, 1, 6, tzinfo=dt_timezone.utc)
+    airports = [
+        Airport(name=f"Airport {number}", closest_big_city=City(name=f"City {number}"))
+        for number in range(20)
+    ]
+    airplane = Airplane(name="Airbus A320", rows=30, seats_in_row=6)
+
+    return [
+        Flight(
+            id=number + 1,
+            route=Route(
+                source=airports[number % 20],
+                destination=airports[(number + 7) % 20],
+                distance=800,
+            ),
+            airplane=airplane,
+            departure_time=departure + timedelta(minutes=15 * number),
+            arrival_time=departure + timedelta(minutes=15 * number + 95),
+            seats_sold=number % airplane.capacity,
+        )
+        for number in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSON renderer and parser with the orjson ones on the "
+        "flight list response"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flights", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        flights = sample_flights(options["flights"])
+        data = FlightListSerializer(flights, many=True).data
+        body = JSONRenderer().render(data)
+        self.stdout.write(f"{options['flights']} flights, {len(body)} bytes")
+
+        elapsed = self.time(
+            lambda: FlightListSerializer(flights, many=True).data, options["repeat"]
+        )
+        self.stdout.write(f"serialize: {elapsed * 1000:.2f} ms")
+
+        for name, renderer in (("json", JSONRenderer()), ("orjson", ORJSONRenderer())):
+            elapsed = self.time(lambda: renderer.render(data), options["repeat"])
+            self.stdout.write(f"render {name}: {elapsed * 1000:.2f} ms")
+
+        for name, parser in (("json", JSONParser()), ("orjson", ORJSONParser())):
+            elapsed = self.time(
+                lambda: parser.parse(io.BytesIO(body)), options["repeat"]
+            )
+            self.stdout.write(f"parse {name}: {elapsed * 1000:.2f} ms")
+
+    @staticmethod
+    def time(function, repeat):
+        """Best time of the function over the repeats, in seconds"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
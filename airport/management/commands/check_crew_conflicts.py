@@ -0,0 +1,56 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from airport.crew_roster import season_conflicts
+from airport.schedules import booking_horizon
+
+
+class Command(BaseCommand):
+    help = (
+        "Report crews assigned to flights overlapping in time, among flights "
+        "departing between the dates. Fails if any are found."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date-from",
+            type=date.fromisoformat,
+            help="YYYY-MM-DD, today by default",
+        )
+        parser.add_argument(
+            "--date-to",
+            type=date.fromisoformat,
+            help="YYYY-MM-DD, the end of the booking window by default",
+        )
+
+    def handle(self, *args, **options):
+        date_from = options["date_from"] or timezone.now().date()
+        date_to = options["date_to"] or booking_horizon()
+        if date_to < date_from:
+            raise CommandError("--date-to is before --date-from")
+
+        started = time.monotonic()
+        conflicts = season_conflicts(date_from, date_to)
+        for conflict in conflicts:
+            self.stdout.write(
+                f"crew {conflict.crew_id}: flight {conflict.flight.flight_id} "
+                f"({conflict.flight.departure_time:%Y-%m-%d %H:%M} - "
+                f"{conflict.flight.arrival_time:%Y-%m-%d %H:%M}) overlaps flight "
+                f"{conflict.overlapping.flight_id} "
+                f"({conflict.overlapping.departure_time:%Y-%m-%d %H:%M} - "
+                f"{conflict.overlapping.arrival_time:%Y-%m-%d %H:%M})"
+            )
+
+        elapsed = time.monotonic() - started
+        if conflicts:
+            raise CommandError(
+                f"{len(conflicts)} crew conflicts from {date_from} to {date_to}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"No crew conflicts from {date_from} to {date_to} ({elapsed:.1f}s)"
+            )
+        )
@@ -0,0 +1,65 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from airport.exports import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    FLIGHT_EXPORT,
+    MANIFEST_EXPORT,
+    ORDER_EXPORT,
+    export_chunks,
+)
+from airport.models import Flight, Order, Ticket
+
+
+class Command(BaseCommand):
+    help = "Stream flights, orders or a flight passenger manifest to a file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["flights", "orders", "manifest"])
+        parser.add_argument(
+            "--flight",
+            type=int,
+            help="Id of the flight to export the manifest of",
+        )
+        parser.add_argument(
+            "--file-format",
+            choices=list(EXPORT_FORMATS),
+            default="csv",
+        )
+        parser.add_argument(
+            "--output",
+            help="Path of the file to write, standard output by default",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help="Number of rows fetched from the database cursor at once",
+        )
+
+    def handle(self, *args, **options):
+        kind = options["kind"]
+        if kind == "flights":
+            export = FLIGHT_EXPORT
+            queryset = Flight.objects.order_by("departure_time", "id")
+        elif kind == "orders":
+            export = ORDER_EXPORT
+            queryset = Order.objects.order_by("id")
+        else:
+            if options["flight"] is None:
+                raise CommandError("--flight is required for the manifest")
+            export = MANIFEST_EXPORT
+            queryset = Ticket.objects.filter(flight_id=options["flight"]).order_by(
+                "row", "seat"
+            )
+
+        chunks = export_chunks(
+            export, queryset, options["file_format"], options["chunk_size"]
+        )
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,49 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from airport.schedule_import import (
+    SCHEDULE_BATCH_SIZE,
+    ScheduleImporter,
+    read_schedule,
+)
+
+
+class Command(BaseCommand):
+    help = "Create or update flights from a CSV or NDJSON schedule file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--file-format",
+            choices=["csv", "ndjson"],
+            help="Format of the file, guessed from its extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=SCHEDULE_BATCH_SIZE,
+            help="Number of rows validated and written together",
+        )
+
+    def handle(self, *args, **options):
+        file_format = options["file_format"]
+        if file_format is None:
+            _, extension = os.path.splitext(options["path"])
+            file_format = "ndjson" if extension in (".ndjson", ".jsonl") else "csv"
+
+        with open(options["path"], newline="", encoding="utf-8") as schedule:
+            result = ScheduleImporter(options["batch_size"]).run(
+                read_schedule(schedule, file_format)
+            )
+
+        for error in result["errors"]:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result['created']} and updated {result['updated']} "
+                f"flights, {len(result['errors'])} rows skipped"
+            )
+        )
@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from airport.schedules import booking_horizon, materialize_schedules
+
+
+class Command(BaseCommand):
+    help = "Create Flight rows for scheduled departures entering the booking window"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Materialize this many days ahead instead of FLIGHT_BOOKING_WINDOW",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of schedules materialized per transaction",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and materialize every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            if options["days"] is None:
+                until = booking_horizon()
+            else:
+                until = timezone.now().date() + timedelta(days=options["days"])
+            materialized = materialize_schedules(
+                until, batch_size=options["batch_size"]
+            )
+            self.stdout.write(f"Materialized {materialized} schedules up to {until}")
+
+            if not interval:
+                break
+            time.sleep(interval)
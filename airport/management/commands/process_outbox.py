@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from airport.outbox import OUTBOX_BATCH_SIZE, run_workers
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox messages, such as order confirmations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help="Number of messages claimed at once",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of threads delivering messages",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and poll for messages every INTERVAL seconds",
+        )
+
+    def report(self, delivered):
+        if delivered:
+            self.stdout.write(f"Delivered {delivered} outbox messages")
+
+    def handle(self, *args, **options):
+        if options["interval"]:
+            run_workers(
+                options["workers"],
+                options["batch_size"],
+                options["interval"],
+                report=self.report,
+            )
+            return
+
+        delivered = run_workers(options["workers"], options["batch_size"])
+        self.stdout.write(f"Delivered {delivered} outbox messages")
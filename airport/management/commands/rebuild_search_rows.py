@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from airport.search_rows import SEARCH_ROW_BATCH_SIZE, rebuild_search_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild FlightSearchRow from flights, after changes that bypassed "
+        "signals such as raw SQL or queryset updates"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=SEARCH_ROW_BATCH_SIZE,
+            help="Number of rows written per query",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            rows = rebuild_search_rows(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {rows} search rows in {time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from airport.models import Flight
+from airport.search_rows import refresh_search_rows
+from airport.seat_counters import SEAT_COUNTER_BATCH_SIZE, rebuild_seat_counters
+
+
+class Command(BaseCommand):
+    help = "Recalculate Flight.seats_sold and seat maps from stored Ticket rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=SEAT_COUNTER_BATCH_SIZE,
+            help="Number of flights locked and updated at once",
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_seat_counters(Flight.objects.all(), options["batch_size"])
+        # bulk_update skips signals, so free seats of search rows are stale
+        refresh_search_rows(Flight.objects.all())
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Seat counters rebuilt for {rebuilt} flights")
+        )
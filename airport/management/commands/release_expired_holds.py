@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from airport.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Release seats held by expired reservations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and sweep every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            released = release_expired_reservations()
+            self.stdout.write(f"Released {released} expired seat holds")
+
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from airport.analytics import ROLLUP_BATCH_SIZE, rebuild_rollups, roll_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Add tickets and flights created since the last run to the "
+        "analytics rollups"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ROLLUP_BATCH_SIZE,
+            help="Number of tickets and flights rolled up per transaction",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recount the rollups one route at a time, to take refunds "
+            "and deleted flights out of them",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and roll up every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        rebuild = options["rebuild"]
+        while True:
+            started = time.monotonic()
+            if rebuild:
+                tickets, flights = rebuild_rollups(options["batch_size"])
+                rebuild = False
+            else:
+                tickets, flights = roll_up(options["batch_size"])
+            self.stdout.write(
+                f"Rolled up {tickets} tickets and {flights} flights "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,202 @@
+import multiprocessing
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from airport.caching import invalidate_model_cache
+from airport.factories import (
+    assign_crews,
+    create_airplanes,
+    create_airports,
+    create_cities,
+    create_countries,
+    create_crews,
+    create_flights,
+    create_routes,
+    create_tickets,
+    create_users,
+    crew_pools,
+)
+from airport.models import (
+    Country,
+    City,
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Crew,
+)
+from airport.route_graph import invalidate_route_graph
+
+_network = None
+
+
+def _load_network():
+    """Read the rows every flight chunk picks from, once per worker"""
+    global _network
+    connections.close_all()
+    airplanes = Airplane.objects.only("id", "rows", "seats_in_row").in_bulk()
+    _network = {
+        "routes": list(
+            Route.objects.only("id", "source_id", "destination_id", "distance")
+        ),
+        "airplanes": airplanes,
+        "crew_pools": crew_pools(airplanes.values(), Crew.objects.only("id")),
+        "users": list(get_user_model().objects.only("id")),
+    }
+
+
+def _seed_flights(chunk):
+    """Create flights of a group of airplanes with crews, orders and tickets"""
+    airplane_ids, count, seed, options = chunk
+    rng = random.Random(seed)
+    with transaction.atomic():
+        flights = create_flights(
+            _network["routes"],
+            [_network["airplanes"][airplane_id] for airplane_id in airplane_ids],
+            count,
+            rng,
+            days=options["days"],
+            load_factor=options["load_factor"],
+            batch_size=options["batch_size"],
+        )
+        assign_crews(
+            flights,
+            _network["crew_pools"],
+            options["crews_per_flight"],
+            rng,
+            batch_size=options["batch_size"],
+        )
+        tickets = create_tickets(
+            flights,
+            _network["users"],
+            rng,
+            tickets_per_order=options["tickets_per_order"],
+            batch_size=options["batch_size"],
+        )
+    return len(flights), tickets
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with a synthetic airport network, flights, "
+        "orders and tickets for load testing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--countries", type=int, default=20)
+        parser.add_argument("--cities-per-country", type=int, default=5)
+        parser.add_argument("--routes-per-airport", type=int, default=8)
+        parser.add_argument("--airplanes", type=int, default=100)
+        parser.add_argument(
+            "--crews",
+            type=int,
+            default=400,
+            help="Crews are split between the airplanes, each flies one",
+        )
+        parser.add_argument("--crews-per-flight", type=int, default=4)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--flights", type=int, default=10000)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Spread departures over this many days from now",
+        )
+        parser.add_argument(
+            "--load-factor",
+            type=float,
+            default=0.75,
+            help="Average share of sold seats per flight",
+        )
+        parser.add_argument("--tickets-per-order", type=int, default=3)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of rows per INSERT",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of flights created per transaction",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes creating flights and tickets",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["load_factor"] <= 1:
+            raise CommandError("--load-factor must be between 0 and 1")
+        if Country.objects.exists():
+            raise CommandError(
+                "The database already has airport data, run `flush` first"
+            )
+
+        started = time.monotonic()
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            countries = create_countries(options["countries"])
+            cities = create_cities(countries, options["cities_per_country"])
+            airports = create_airports(cities)
+            routes = create_routes(airports, options["routes_per_airport"], rng)
+            create_airplanes(options["airplanes"], rng)
+            create_crews(options["crews"])
+            create_users(options["users"])
+        self.stdout.write(
+            f"Created {len(airports)} airports and {len(routes)} routes"
+        )
+
+        # Chunks get disjoint airplanes, so workers never schedule
+        # two flights of the same airplane at once
+        airplane_ids = sorted(Airplane.objects.values_list("id", flat=True))
+        total = options["flights"]
+        per_chunk = max(1, options["chunk_size"] * len(airplane_ids) // max(total, 1))
+        chunks = []
+        for number, start in enumerate(range(0, len(airplane_ids), per_chunk)):
+            end = min(start + per_chunk, len(airplane_ids))
+            count = total * end // len(airplane_ids) - total * start // len(airplane_ids)
+            chunks.append(
+                (airplane_ids[start:end], count, options["seed"] + number + 1, options)
+            )
+
+        flights = tickets = 0
+        if options["workers"] > 1:
+            # Workers open their own connections, a forked one can't be shared
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            with context.Pool(options["workers"], initializer=_load_network) as pool:
+                for created in pool.imap_unordered(_seed_flights, chunks):
+                    flights, tickets = self._progress(flights, tickets, *created)
+        else:
+            _load_network()
+            for chunk in chunks:
+                flights, tickets = self._progress(
+                    flights, tickets, *_seed_flights(chunk)
+                )
+
+        # bulk_create skips post_save, so cached lists and the graph are stale
+        invalidate_route_graph()
+        for model in (Country, City, Airport, AirplaneType, Airplane, Crew):
+            invalidate_model_cache(model)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {flights} flights and {tickets} tickets "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
+
+    def _progress(self, flights, tickets, created_flights, created_tickets):
+        flights += created_flights
+        tickets += created_tickets
+        self.stdout.write(f"{flights} flights, {tickets} tickets")
+        return flights, tickets
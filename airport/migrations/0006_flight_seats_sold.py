@@ -0,0 +1,34 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_seats_sold(apps, schema_editor):
+    Flight = apps.get_model('airport', 'Flight')
+    Ticket = apps.get_model('airport', 'Ticket')
+    sold = (
+        Ticket.objects.filter(flight=OuterRef('pk'))
+        .order_by()
+        .values('flight')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Flight.objects.update(seats_sold=Coalesce(Subquery(sold), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0005_alter_flight_route_alter_route_destination_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='seats_sold',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_seats_sold, migrations.RunPython.noop),
+    ]
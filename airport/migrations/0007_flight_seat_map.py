@@ -0,0 +1,42 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:16
+
+from django.db import migrations, models
+
+
+def fill_seat_map(apps, schema_editor):
+    # The bitmap layout of airport.seat_map.SeatMap at the time of this
+    # migration, one bit per seat numbered row by row
+    Flight = apps.get_model('airport', 'Flight')
+    Ticket = apps.get_model('airport', 'Ticket')
+    flights = Flight.objects.select_related('airplane').in_bulk()
+    seat_maps = {
+        flight_id: bytearray(
+            (flight.airplane.rows * flight.airplane.seats_in_row + 7) // 8
+        )
+        for flight_id, flight in flights.items()
+    }
+    for flight_id, row, seat in Ticket.objects.values_list(
+        'flight_id', 'row', 'seat'
+    ).iterator():
+        index = (row - 1) * flights[flight_id].airplane.seats_in_row + (seat - 1)
+        seat_maps[flight_id][index >> 3] |= 1 << (index & 7)
+
+    for flight_id, seat_map in seat_maps.items():
+        flights[flight_id].seat_map = bytes(seat_map)
+    Flight.objects.bulk_update(flights.values(), ['seat_map'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0006_flight_seats_sold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='seat_map',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(fill_seat_map, migrations.RunPython.noop),
+    ]
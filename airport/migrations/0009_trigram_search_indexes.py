@@ -0,0 +1,56 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:22
+
+from django.db import migrations
+
+# Text columns searched with __icontains by the route and flight filters.
+# Django renders icontains as UPPER(column::text) LIKE UPPER(%s) on
+# PostgreSQL, so the trigram indexes are built on the same expression.
+TRIGRAM_INDEXES = (
+    ('Country', 'name'),
+    ('City', 'name'),
+    ('Airport', 'name'),
+)
+
+
+def trigram_available(connection):
+    if connection.vendor != 'postgresql':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        return cursor.fetchone() is not None
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if not trigram_available(schema_editor.connection):
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for model_name, column in TRIGRAM_INDEXES:
+        table = apps.get_model('airport', model_name)._meta.db_table
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+            f'ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for model_name, column in TRIGRAM_INDEXES:
+        table = apps.get_model('airport', model_name)._meta.db_table
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0008_reservation_seathold'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
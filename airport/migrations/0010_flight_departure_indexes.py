@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0009_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure_time'], name='airport_fli_departu_abe547_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['route', 'departure_time'], name='airport_fli_route_i_baa295_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0010_flight_departure_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='flight',
+            name='airport_fli_departu_abe547_idx',
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure_time', 'id'], name='airport_fli_departu_5be25a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', 'id'], name='airport_ord_user_id_d76b27_idx'),
+        ),
+    ]
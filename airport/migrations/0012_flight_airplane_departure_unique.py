@@ -0,0 +1,67 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:37
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_flights(apps, schema_editor):
+    # Flights of one airplane at the same time are the same flight entered
+    # twice. The copies without tickets are merged into the one holding
+    # them, keeping their crews; two copies with tickets need a person
+    Flight = apps.get_model('airport', 'Flight')
+    Membership = Flight.crews.through
+    duplicates = (
+        Flight.objects.values('airplane_id', 'departure_time')
+        .annotate(copies=Count('id'))
+        .filter(copies__gt=1)
+    )
+    conflicts = []
+    for duplicate in duplicates:
+        keeper, *copies = (
+            Flight.objects.filter(
+                airplane_id=duplicate['airplane_id'],
+                departure_time=duplicate['departure_time'],
+            )
+            .annotate(ticket_count=Count('tickets'))
+            .order_by('-ticket_count', 'id')
+        )
+        if any(copy.ticket_count for copy in copies):
+            conflicts.append([keeper.pk] + [copy.pk for copy in copies])
+            continue
+
+        copy_ids = [copy.pk for copy in copies]
+        crews = set(
+            Membership.objects.filter(flight_id__in=copy_ids).values_list(
+                'crew_id', flat=True
+            )
+        ) - set(keeper.crews.values_list('id', flat=True))
+        Membership.objects.bulk_create(
+            Membership(flight_id=keeper.pk, crew_id=crew_id) for crew_id in crews
+        )
+        Flight.objects.filter(pk__in=copy_ids).delete()
+
+    # Check the deferred foreign keys of the deleted rows now, PostgreSQL
+    # can't alter a table with pending trigger events
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    if conflicts:
+        raise RuntimeError(
+            'Flights of the same airplane and departure time all have tickets, '
+            'move the tickets to one of them before migrating: '
+            + '; '.join(', '.join(map(str, ids)) for ids in conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0011_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_flights, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='flight',
+            unique_together={('airplane', 'departure_time')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:40
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0012_flight_airplane_departure_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('days_of_week', models.CharField(max_length=7, validators=[django.core.validators.RegexValidator('^(?!.*(.).*\\1)[1-7]+$', 'Use unique ISO weekday digits from 1 (Monday) to 7 (Sunday).')])),
+                ('departure_time', models.TimeField()),
+                ('duration', models.DurationField()),
+                ('valid_from', models.DateField()),
+                ('valid_until', models.DateField()),
+                ('materialized_until', models.DateField(blank=True, editable=False, null=True)),
+                ('airplane', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='airport.airplane')),
+                ('crews', models.ManyToManyField(blank=True, related_name='schedules', to='airport.crew')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='airport.route')),
+            ],
+            options={
+                'ordering': ['valid_from', 'departure_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='flight',
+            name='schedule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='flights', to='airport.flightschedule'),
+        ),
+    ]
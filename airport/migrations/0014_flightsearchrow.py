@@ -0,0 +1,103 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:15
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+
+def fill_search_rows(apps, schema_editor):
+    Flight = apps.get_model('airport', 'Flight')
+    FlightSearchRow = apps.get_model('airport', 'FlightSearchRow')
+    capacity = F('airplane__rows') * F('airplane__seats_in_row')
+    rows = Flight.objects.values(
+        'id',
+        'route_id',
+        'airplane_id',
+        'departure_time',
+        'arrival_time',
+        row_source_id=F('route__source_id'),
+        row_destination_id=F('route__destination_id'),
+        row_source_name=F('route__source__name'),
+        row_destination_name=F('route__destination__name'),
+        row_source_city=F('route__source__closest_big_city__name'),
+        row_destination_city=F('route__destination__closest_big_city__name'),
+        row_airplane_name=F('airplane__name'),
+        row_airplane_capacity=capacity,
+        row_departure_date=TruncDate('departure_time'),
+        row_seats_available=capacity - F('seats_sold'),
+    ).iterator(chunk_size=2000)
+    FlightSearchRow.objects.bulk_create(
+        (
+            FlightSearchRow(
+                **{name.removeprefix('row_'): value for name, value in row.items()}
+            )
+            for row in rows
+        ),
+        batch_size=2000,
+    )
+
+
+# Filtered with __icontains like the airport names of 0009
+TRIGRAM_COLUMNS = ('source_name', 'destination_name')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+
+    table = apps.get_model('airport', 'FlightSearchRow')._meta.db_table
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+            f'ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    table = apps.get_model('airport', 'FlightSearchRow')._meta.db_table
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0013_flightschedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightSearchRow',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('route_id', models.BigIntegerField()),
+                ('source_id', models.BigIntegerField()),
+                ('destination_id', models.BigIntegerField()),
+                ('source_name', models.CharField(max_length=255)),
+                ('destination_name', models.CharField(max_length=255)),
+                ('source_city', models.CharField(max_length=64)),
+                ('destination_city', models.CharField(max_length=64)),
+                ('airplane_id', models.BigIntegerField()),
+                ('airplane_name', models.CharField(max_length=255)),
+                ('airplane_capacity', models.IntegerField()),
+                ('departure_time', models.DateTimeField()),
+                ('arrival_time', models.DateTimeField()),
+                ('departure_date', models.DateField()),
+                ('seats_available', models.IntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['departure_time', 'id'], name='airport_fli_departu_a7f27e_idx'), models.Index(fields=['departure_date', 'source_id', 'destination_id'], name='airport_fli_departu_cf9ba4_idx')],
+            },
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+        migrations.RunPython(fill_search_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0014_flightsearchrow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('tickets', models.PositiveIntegerField(default=0)),
+                ('airplane_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='airport.airplanetype')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='airport.route')),
+            ],
+            options={
+                'unique_together': {('hour', 'route', 'airplane_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRouteLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('flights', models.PositiveIntegerField(default=0)),
+                ('seats', models.PositiveIntegerField(default=0)),
+                ('seats_sold', models.PositiveIntegerField(default=0)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='airport.route')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'route'], name='airport_dai_date_1761f5_idx')],
+                'unique_together': {('route', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0016_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='flightsearchrow',
+            name='airport_fli_departu_cf9ba4_idx',
+        ),
+        migrations.RemoveField(
+            model_name='flightsearchrow',
+            name='departure_date',
+        ),
+    ]
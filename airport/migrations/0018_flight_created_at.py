@@ -0,0 +1,20 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0017_flightsearchrow_drop_departure_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def delete_orphan_rows(apps, schema_editor):
+    Flight = apps.get_model('airport', 'Flight')
+    FlightSearchRow = apps.get_model('airport', 'FlightSearchRow')
+    FlightSearchRow.objects.exclude(id__in=Flight.objects.values('id')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0018_flight_created_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_orphan_rows, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='flightsearchrow',
+            name='airport_fli_departu_a7f27e_idx',
+        ),
+        migrations.RenameField(
+            model_name='flightsearchrow',
+            old_name='id',
+            new_name='flight',
+        ),
+        migrations.AlterField(
+            model_name='flightsearchrow',
+            name='flight',
+            field=models.OneToOneField(db_column='id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_row', serialize=False, to='airport.flight'),
+        ),
+        migrations.AddIndex(
+            model_name='flightsearchrow',
+            index=models.Index(fields=['departure_time', 'flight'], name='airport_fli_departu_a7f27e_idx'),
+        ),
+    ]
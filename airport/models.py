@@ -2,10 +2,15 @@ import os
 import uuid
 
 from django.conf import settings
-from django.db import models
+from django.core import exceptions
+from django.core.validators import RegexValidator
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 from rest_framework.exceptions import ValidationError
 
+from .seat_map import SeatMap
+
 
 class Country(models.Model):
     name = models.CharField(max_length=64, unique=True)
@@ -69,6 +74,23 @@ class Airplane(models.Model):
     def capacity(self) -> int:
         return self.rows * self.seats_in_row
 
+    def clean(self):
+        """Reject a size leaving sold tickets without a seat"""
+        if self.pk is None:
+            return
+
+        outside = Ticket.objects.filter(flight__airplane_id=self.pk).filter(
+            models.Q(row__gt=self.rows) | models.Q(seat__gt=self.seats_in_row)
+        )
+        if outside.exists():
+            raise exceptions.ValidationError(
+                "Sold tickets have seats outside of this size"
+            )
+
+    def save(self, *args, **kwargs):
+        self.clean()
+        return super(Airplane, self).save(*args, **kwargs)
+
 
 def crew_image_file_path(instance, filename):
     _, extension = os.path.splitext(filename)
@@ -86,16 +108,158 @@ class Crew(models.Model):
         return f"{self.first_name} {self.last_name}"
 
 
+class FlightSchedule(models.Model):
+    """Recurring departures of a route, stored once instead of per flight.
+
+    ``days_of_week`` lists ISO weekdays the flight operates on, 1 is
+    Monday ("135" for Monday, Wednesday and Friday). Departure times are
+    in UTC. Occurrences up to ``materialized_until`` exist as Flight rows.
+    """
+
+    route = models.ForeignKey(
+        Route, related_name="schedules", on_delete=models.CASCADE
+    )
+    airplane = models.ForeignKey(Airplane, on_delete=models.CASCADE)
+    crews = models.ManyToManyField(Crew, related_name="schedules", blank=True)
+    days_of_week = models.CharField(
+        max_length=7,
+        validators=[
+            RegexValidator(
+                r"^(?!.*(.).*\1)[1-7]+$",
+                "Use unique ISO weekday digits from 1 (Monday) to 7 (Sunday).",
+            )
+        ],
+    )
+    departure_time = models.TimeField()
+    duration = models.DurationField()
+    valid_from = models.DateField()
+    valid_until = models.DateField()
+    materialized_until = models.DateField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ["valid_from", "departure_time"]
+
+    def __str__(self) -> str:
+        return f"{self.route} at {self.departure_time:%H:%M} on {self.days_of_week}"
+
+
 class Flight(models.Model):
     route = models.ForeignKey(Route, related_name="flights", on_delete=models.CASCADE)
     airplane = models.ForeignKey(Airplane, on_delete=models.CASCADE)
     crews = models.ManyToManyField(Crew, related_name="flights")
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
+    seats_sold = models.PositiveIntegerField(default=0, editable=False)
+    seat_map = models.BinaryField(default=bytes)
+    schedule = models.ForeignKey(
+        FlightSchedule,
+        related_name="flights",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("airplane", "departure_time")
+        indexes = [
+            models.Index(fields=["departure_time", "id"]),
+            models.Index(fields=["route", "departure_time"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.route}"
 
+    @property
+    def tickets_available(self) -> int:
+        return self.airplane.capacity - self.seats_sold
+
+    @staticmethod
+    def update_seats(flight_id, places, taken=True):
+        """Mark (row, seat) places of a flight as taken or released.
+
+        The flight row is locked while its seat map is rewritten, so
+        concurrent bookings of the same flight are applied one by one.
+        """
+        with transaction.atomic():
+            flight = (
+                Flight.objects.select_for_update(of=("self",))
+                .select_related("airplane")
+                .only(
+                    "seat_map",
+                    "seats_sold",
+                    "airplane__rows",
+                    "airplane__seats_in_row",
+                )
+                .filter(pk=flight_id)
+                .first()
+            )
+            if flight is None:
+                return
+
+            seat_map = SeatMap.for_flight(flight)
+            for row, seat in places:
+                if taken:
+                    seat_map.take(row, seat)
+                else:
+                    seat_map.release(row, seat)
+
+            # Read, modify and write back: safe only because the flight row
+            # stays locked until the transaction ends
+            if taken:
+                seats_sold = flight.seats_sold + len(places)
+            else:
+                seats_sold = max(flight.seats_sold - len(places), 0)
+
+            Flight.objects.filter(pk=flight_id).update(
+                seats_sold=seats_sold, seat_map=seat_map.to_bytes()
+            )
+            FlightSearchRow.objects.filter(pk=flight_id).update(
+                seats_available=flight.airplane.capacity - seats_sold
+            )
+
+
+class FlightSearchRow(models.Model):
+    """Denormalized copy of a flight with what the flight list shows.
+
+    The list is served from this table alone, without joins. Rows are
+    kept up to date by airport.search_rows on writes of flights, tickets
+    and the routes, airports, cities and airplanes they show. A foreign
+    key ties each row to its flight, so rows are deleted along with their
+    flights and the database refuses to keep one whose flight is gone.
+    """
+
+    flight = models.OneToOneField(
+        Flight,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        db_column="id",
+        related_name="search_row",
+    )
+    route_id = models.BigIntegerField()
+    source_id = models.BigIntegerField()
+    destination_id = models.BigIntegerField()
+    source_name = models.CharField(max_length=255)
+    destination_name = models.CharField(max_length=255)
+    source_city = models.CharField(max_length=64)
+    destination_city = models.CharField(max_length=64)
+    airplane_id = models.BigIntegerField()
+    airplane_name = models.CharField(max_length=255)
+    airplane_capacity = models.IntegerField()
+    departure_time = models.DateTimeField()
+    arrival_time = models.DateTimeField()
+    seats_available = models.IntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["departure_time", "flight"])]
+
+    def __str__(self) -> str:
+        return self.route
+
+    @property
+    def route(self) -> str:
+        return f"{self.source_city} - {self.destination_city}"
+
 
 class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -103,6 +267,7 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["user", "-created_at", "id"])]
 
     def __str__(self) -> str:
         return str(self.created_at)
@@ -157,3 +322,108 @@ class Ticket(models.Model):
         return super(Ticket, self).save(
             force_insert, force_update, using, update_fields
         )
+
+
+class Reservation(models.Model):
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return f"{self.user} (until {self.expires_at})"
+
+
+class SeatHold(models.Model):
+    reservation = models.ForeignKey(
+        Reservation, related_name="holds", on_delete=models.CASCADE
+    )
+    row = models.IntegerField()
+    seat = models.IntegerField()
+    flight = models.ForeignKey(Flight, related_name="holds", on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ("flight", "row", "seat")
+        ordering = ["row", "seat"]
+
+    def __str__(self):
+        return f"{str(self.flight)} (row: {self.row}, seat: {self.seat})"
+
+
+class DailyRouteLoad(models.Model):
+    """Flights, seats and sold seats of a route departing on a date"""
+
+    route = models.ForeignKey(Route, related_name="+", on_delete=models.CASCADE)
+    date = models.DateField()
+    flights = models.PositiveIntegerField(default=0)
+    seats = models.PositiveIntegerField(default=0)
+    seats_sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("route", "date")
+        indexes = [models.Index(fields=["date", "route"])]
+
+    def __str__(self) -> str:
+        return f"{self.route} ({self.date})"
+
+    @property
+    def load_factor(self) -> float:
+        return self.seats_sold / self.seats if self.seats else 0.0
+
+
+class HourlySales(models.Model):
+    """Tickets of a route and airplane type ordered within an hour"""
+
+    hour = models.DateTimeField()
+    route = models.ForeignKey(Route, related_name="+", on_delete=models.CASCADE)
+    airplane_type = models.ForeignKey(
+        AirplaneType, related_name="+", on_delete=models.CASCADE
+    )
+    tickets = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("hour", "route", "airplane_type")
+
+    def __str__(self) -> str:
+        return f"{self.route} ({self.hour}): {self.tickets}"
+
+
+class RollupWatermark(models.Model):
+    """Highest id of a table already added to the analytics rollups"""
+
+    name = models.CharField(max_length=32, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.last_id}"
+
+
+class OutboxMessage(models.Model):
+    """Side effect of a write, stored in the transaction of that write.
+
+    Messages are delivered at least once by the process_outbox worker,
+    see airport.outbox.
+    """
+
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["available_at", "id"],
+                condition=models.Q(failed_at__isnull=True),
+                name="airport_outbox_pending_idx",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.topic} #{self.pk}"
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Prefetch
+
+from .models import Order, Ticket
+from .outbox import outbox_handler
+
+
+def confirmation(order):
+    lines = [f"Your order #{order.pk} is confirmed.", ""]
+    for ticket in order.tickets.all():
+        lines.append(
+            f"{ticket.flight.route}, "
+            f"{ticket.flight.departure_time:%Y-%m-%d %H:%M} UTC, "
+            f"row {ticket.row}, seat {ticket.seat}"
+        )
+    return EmailMessage(
+        subject=f"Order #{order.pk} confirmation",
+        body="\n".join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[order.user.email],
+    )
+
+
+@outbox_handler("order.created")
+def send_order_confirmations(payloads):
+    """Email the tickets of the orders, over a single mail connection"""
+    orders = (
+        Order.objects.filter(pk__in=[payload["order"] for payload in payloads])
+        .select_related("user")
+        .prefetch_related(
+            Prefetch(
+                "tickets",
+                queryset=Ticket.objects.select_related(
+                    "flight__route__source__closest_big_city",
+                    "flight__route__destination__closest_big_city",
+                ).only(
+                    "order_id",
+                    "row",
+                    "seat",
+                    "flight__departure_time",
+                    "flight__route__source__closest_big_city__name",
+                    "flight__route__destination__closest_big_city__name",
+                ),
+            )
+        )
+    )
+    get_connection().send_messages([confirmation(order) for order in orders])
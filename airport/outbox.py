@@ -0,0 +1,189 @@
+import logging
+import threading
+import traceback
+from collections import defaultdict
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+OUTBOX_BATCH_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+# Functions delivering messages, by topic. A handler gets the payloads of
+# a batch of messages and either delivers all of them or raises. A failed
+# batch is retried one payload at a time, so handlers see some twice.
+HANDLERS = {}
+
+
+def outbox_handler(topic):
+    def register(handler):
+        HANDLERS[topic] = handler
+        return handler
+
+    return register
+
+
+def publish(topic, payload):
+    """Store a message for the worker, in the transaction of the caller.
+
+    The message is only seen by the worker once that transaction commits,
+    and is gone with it on a rollback.
+    """
+    return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+
+def claim(batch_size=OUTBOX_BATCH_SIZE):
+    """Lease the oldest available messages to this worker.
+
+    Rows locked by another worker are skipped, so workers never claim the
+    same message. A claimed message becomes available again once
+    OUTBOX_LEASE passes, so messages of a worker that died are retried.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(failed_at__isnull=True, available_at__lte=now)
+            .order_by("available_at", "id")[:batch_size]
+        )
+        for message in messages:
+            message.attempts += 1
+            message.available_at = now + settings.OUTBOX_LEASE
+        OutboxMessage.objects.bulk_update(messages, ["attempts", "available_at"])
+    return messages
+
+
+def retry_delay(attempts):
+    """Exponential backoff from OUTBOX_RETRY_DELAY, at most an hour"""
+    return min(settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), timedelta(hours=1))
+
+
+def _call(handler, messages):
+    """Run the handler on the messages, return the traceback if it raised"""
+    try:
+        handler([message.payload for message in messages])
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+def deliver(messages):
+    """Run the handlers of claimed messages, one call per topic.
+
+    A failed call is retried once per message, so only the messages the
+    handler fails on are held back and the rest are not sent again later.
+    Delivered messages are deleted. Failed ones are retried after a
+    backoff, or parked with failed_at set once they have been tried
+    OUTBOX_MAX_ATTEMPTS times. Messages of a topic without a handler are
+    parked right away. Returns the number of messages delivered.
+    """
+    by_topic = defaultdict(list)
+    for message in messages:
+        by_topic[message.topic].append(message)
+
+    delivered = []
+    failed = []
+    for topic, batch in by_topic.items():
+        handler = HANDLERS.get(topic)
+        if handler is None:
+            now = timezone.now()
+            for message in batch:
+                message.last_error = f"No handler for topic {topic!r}"
+                message.failed_at = now
+            failed.extend(batch)
+            continue
+
+        error = _call(handler, batch)
+        if error is None:
+            delivered.extend(message.pk for message in batch)
+            continue
+
+        now = timezone.now()
+        for message in batch:
+            if len(batch) > 1:
+                error = _call(handler, [message])
+            if error is None:
+                delivered.append(message.pk)
+                continue
+
+            message.last_error = error
+            if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                message.failed_at = now
+            else:
+                message.available_at = now + retry_delay(message.attempts)
+            failed.append(message)
+
+    OutboxMessage.objects.filter(pk__in=delivered).delete()
+    OutboxMessage.objects.bulk_update(
+        failed, ["last_error", "failed_at", "available_at"]
+    )
+    return len(delivered)
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE):
+    """Deliver available messages until there are none, return the count"""
+    delivered = 0
+    while messages := claim(batch_size):
+        delivered += deliver(messages)
+    return delivered
+
+
+def _work(batch_size, interval, stop, report):
+    delivered = 0
+    while True:
+        try:
+            count = drain(batch_size)
+        except Exception:
+            if not interval:
+                raise
+            # a polling worker outlives database errors, the next poll
+            # starts over with a fresh connection
+            logger.exception("Outbox drain failed")
+            count = 0
+        delivered += count
+        if report is not None:
+            report(count)
+        if not interval or stop.wait(interval):
+            return delivered
+        # replace the connection if it broke or outlived CONN_MAX_AGE
+        close_old_connections()
+
+
+def _work_in_thread(*args):
+    try:
+        return _work(*args)
+    finally:
+        connection.close()
+
+
+def run_workers(
+    workers=1, batch_size=OUTBOX_BATCH_SIZE, interval=0, stop=None, report=None
+):
+    """Drain the outbox from worker threads, each with its own connection.
+
+    With an interval the workers keep their thread and connection and drain
+    the outbox again every INTERVAL seconds, until stop is set. A drain
+    that raises is logged and the worker goes on with the next poll.
+    report is called with the count of every drain. Returns
+    the number of messages delivered.
+    """
+    stop = stop or threading.Event()
+    if workers <= 1:
+        return _work(batch_size, interval, stop, report)
+
+    with ThreadPoolExecutor(workers) as pool:
+        futures = [
+            pool.submit(_work_in_thread, batch_size, interval, stop, report)
+            for _ in range(workers)
+        ]
+        try:
+            wait(futures, return_when=FIRST_EXCEPTION)
+        finally:
+            stop.set()
+        return sum(future.result() for future in futures)
@@ -0,0 +1,160 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginate by the values of the last row instead of an offset.
+
+    ``ordering`` must end with a unique field, so every row has its own
+    position. A page is fetched with a ``WHERE (a, b) > (x, y)`` style
+    filter on those fields, so deep pages cost the same as the first one
+    and no total count is ever queried.
+    """
+
+    ordering = ("id",)
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        reverse, position = self.decode_cursor(request)
+        ordering = [
+            self._flip(field) if reverse else field for field in self.ordering
+        ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._after(ordering, position))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise self.invalid_cursor()
+
+        results = list(queryset[: page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = has_more if not reverse else position is not None
+        has_previous = has_more if reverse else position is not None
+        self.next_position = self._position(results[-1]) if has_next and results else None
+        self.previous_position = (
+            self._position(results[0]) if has_previous and results else None
+        )
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        return self.encode_cursor(False, self.next_position)
+
+    def get_previous_link(self):
+        return self.encode_cursor(True, self.previous_position)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            reverse, position = bool(cursor["r"]), list(cursor["p"])
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise self.invalid_cursor()
+
+        if len(position) != len(self.ordering):
+            raise self.invalid_cursor()
+        return reverse, position
+
+    def invalid_cursor(self):
+        return ValidationError(
+            {self.cursor_query_param: self.invalid_cursor_message}
+        )
+
+    def encode_cursor(self, reverse, position):
+        if position is None:
+            return None
+
+        cursor = json.dumps({"r": int(reverse), "p": position}, default=str)
+        encoded = base64.urlsafe_b64encode(cursor.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _position(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip("-"))
+            position.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return position
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _after(ordering, position):
+        """Filter rows placed after the position in the given ordering"""
+        conditions = []
+        for index, field in enumerate(ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition = Q(**{f"{field.lstrip('-')}__{lookup}": position[index]})
+            for previous, value in zip(ordering[:index], position):
+                condition &= Q(**{previous.lstrip("-"): value})
+            conditions.append(condition)
+        return reduce(or_, conditions)
@@ -0,0 +1,34 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Types orjson can't encode, or would encode unlike DRF (datetimes), are
+# handed to DRF's encoder, so both renderers produce the same values
+_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson, several times faster on big lists.
+
+    Output matches JSONRenderer with the default settings: compact, not
+    ASCII escaped, datetimes, Decimals and UUIDs encoded as DRF does.
+    Requested indentation is always two spaces, the only one orjson has.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        option = ORJSON_OPTIONS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=_encoder.default, option=option)
+
+        # Same as JSONRenderer, these are valid JSON but not valid JavaScript
+        if b"\xe2\x80" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return ret
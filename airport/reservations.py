@@ -0,0 +1,123 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Flight, Reservation, SeatHold, Ticket
+
+
+class SeatConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Requested seats are not available."
+    default_code = "seat_conflict"
+
+    def __init__(self, detail=None, code=None, seats=None):
+        super().__init__(detail, code)
+        if seats:
+            self.detail = {"detail": self.detail, "seats": seats}
+
+
+def places_filter(places):
+    """Build a filter matching (flight_id, row, seat) places"""
+    return reduce(
+        or_,
+        (
+            Q(flight_id=flight_id, row=row, seat=seat)
+            for flight_id, row, seat in places
+        ),
+    )
+
+
+def lock_flights(flight_ids):
+    """Lock flight rows for the current transaction, in id order.
+
+    Concurrent bookings of a flight queue behind each other for the short
+    seat check instead of failing, and the id order keeps bookings of
+    several flights from deadlocking. Real conflicts are found by the
+    seat check under the lock, with the unique constraint on tickets as a
+    last resort.
+    """
+    list(
+        Flight.objects.select_for_update(of=("self",))
+        .filter(pk__in=set(flight_ids))
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def find_conflicts(places, user):
+    """Return places already sold or held by another user's active reservation"""
+    if not places:
+        return []
+
+    query = places_filter(places)
+    taken = set(Ticket.objects.filter(query).values_list("flight_id", "row", "seat"))
+    taken.update(
+        SeatHold.objects.filter(query, reservation__expires_at__gt=timezone.now())
+        .exclude(reservation__user=user)
+        .values_list("flight_id", "row", "seat")
+    )
+    return [place for place in places if place in taken]
+
+
+def raise_on_conflicts(places, user):
+    conflicts = find_conflicts(places, user)
+    if conflicts:
+        raise SeatConflict(
+            seats=[
+                {"flight": flight_id, "row": row, "seat": seat}
+                for flight_id, row, seat in conflicts
+            ]
+        )
+
+
+def hold_seats(user, places):
+    """Hold places for the user until the reservation expires"""
+    with transaction.atomic():
+        lock_flights(flight_id for flight_id, _, _ in places)
+        release_expired_holds(flight_id for flight_id, _, _ in places)
+        raise_on_conflicts(places, user)
+        SeatHold.objects.filter(
+            places_filter(places), reservation__user=user
+        ).delete()
+
+        reservation = Reservation.objects.create(
+            user=user, expires_at=timezone.now() + settings.SEAT_HOLD_TTL
+        )
+        SeatHold.objects.bulk_create(
+            SeatHold(reservation=reservation, flight_id=flight_id, row=row, seat=seat)
+            for flight_id, row, seat in places
+        )
+        return reservation
+
+
+def claim_seats(user, places):
+    """Check places before they are sold and drop the user's own holds on them.
+
+    Must be called inside the transaction that creates the tickets.
+    """
+    if not places:
+        return
+
+    lock_flights(flight_id for flight_id, _, _ in places)
+    raise_on_conflicts(places, user)
+    SeatHold.objects.filter(places_filter(places), reservation__user=user).delete()
+
+
+def release_expired_holds(flight_ids):
+    """Delete expired holds of the flights so their seats can be held again"""
+    SeatHold.objects.filter(
+        flight_id__in=set(flight_ids),
+        reservation__expires_at__lte=timezone.now(),
+    ).delete()
+
+
+def release_expired_reservations():
+    """Delete expired reservations with their holds, return the number of holds"""
+    _, deleted = Reservation.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted.get(SeatHold._meta.label, 0)
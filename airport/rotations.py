@@ -0,0 +1,199 @@
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+
+from .date_ranges import departure_range
+from .models import Flight
+
+Leg = namedtuple(
+    "Leg",
+    (
+        "airplane_id",
+        "flight_id",
+        "departure_time",
+        "arrival_time",
+        "source_id",
+        "destination_id",
+    ),
+)
+RotationIssue = namedtuple("RotationIssue", ("kind", "leg", "previous"))
+
+OVERLAP = "overlap"
+POSITION = "position"
+
+LEG_FIELDS = (
+    "airplane_id",
+    "id",
+    "departure_time",
+    "arrival_time",
+    "route__source_id",
+    "route__destination_id",
+)
+
+
+def adjacent_legs(airplane_id, departure_time, flight_id=None):
+    """The legs of the airplane departing last before and first after the time.
+
+    Both halves are index scans of one row on (airplane, departure_time),
+    sent as a single UNION query.
+    """
+    legs = Flight.objects.filter(airplane_id=airplane_id)
+    if flight_id is not None:
+        legs = legs.exclude(pk=flight_id)
+    legs = legs.values_list(*LEG_FIELDS)
+
+    previous = legs.filter(departure_time__lt=departure_time).order_by(
+        "-departure_time"
+    )[:1]
+    following = legs.filter(departure_time__gte=departure_time).order_by(
+        "departure_time"
+    )[:1]
+
+    before = after = None
+    for leg in previous.union(following, all=True):
+        leg = Leg(*leg)
+        if leg.departure_time < departure_time:
+            before = leg
+        else:
+            after = leg
+    return before, after
+
+
+def rotation_errors(airplane_id, route, departure_time, arrival_time, flight_id=None):
+    """Messages on why the airplane can't fly the route at that time.
+
+    The airplane must not be flying another leg, must depart from the
+    airport its previous leg lands at, and land where its next leg
+    departs from. The first and last legs of an airplane are free.
+    """
+    before, after = adjacent_legs(airplane_id, departure_time, flight_id)
+    errors = []
+    for leg in (before, after):
+        if (
+            leg
+            and leg.departure_time < arrival_time
+            and leg.arrival_time > departure_time
+        ):
+            errors.append(
+                f"Airplane is on flight {leg.flight_id} from "
+                f"{leg.departure_time:%Y-%m-%d %H:%M} to "
+                f"{leg.arrival_time:%Y-%m-%d %H:%M}."
+            )
+
+    if before and before.destination_id != route.source_id:
+        errors.append(
+            f"Airplane lands at airport {before.destination_id} with flight "
+            f"{before.flight_id} before, not at airport {route.source_id}."
+        )
+    if after and after.source_id != route.destination_id:
+        errors.append(
+            f"Airplane departs from airport {after.source_id} with flight "
+            f"{after.flight_id} next, not from airport {route.destination_id}."
+        )
+    return errors
+
+
+def overlapping_legs(legs):
+    """Messages on new legs the airplanes can't fly, by position in the list.
+
+    Legs are (airplane_id, departure_time, arrival_time) tuples. A leg is
+    refused when it overlaps a stored flight of its airplane or a leg of
+    the list departing before it. A stored flight with the airplane and
+    departure time of a leg is the one the leg replaces, so it is not
+    checked. Stored flights are read in one query, and each leg takes a
+    binary search over them, even where they already overlap each other.
+    """
+    if not legs:
+        return {}
+
+    keys = {(airplane_id, departure_time) for airplane_id, departure_time, _ in legs}
+    stored = Flight.objects.filter(
+        airplane_id__in={airplane_id for airplane_id, _, _ in legs},
+        departure_time__lt=max(arrival_time for _, _, arrival_time in legs),
+        arrival_time__gt=min(departure_time for _, departure_time, _ in legs),
+    ).order_by("airplane_id", "departure_time")
+
+    # Per airplane, departures of its stored flights and the flight landing
+    # last among those departing up to each of them
+    departures = defaultdict(list)
+    landing_last = defaultdict(list)
+    for airplane_id, flight_id, departure_time, arrival_time in stored.values_list(
+        "airplane_id", "id", "departure_time", "arrival_time"
+    ):
+        if (airplane_id, departure_time) in keys:
+            continue
+        latest = landing_last[airplane_id]
+        if not latest or arrival_time > latest[-1][2]:
+            latest.append((flight_id, departure_time, arrival_time))
+        else:
+            latest.append(latest[-1])
+        departures[airplane_id].append(departure_time)
+
+    errors = {}
+    accepted = {}
+    by_departure = sorted(range(len(legs)), key=lambda position: legs[position][:2])
+    for position in by_departure:
+        airplane_id, departure_time, arrival_time = legs[position]
+        before = bisect_left(departures[airplane_id], arrival_time)
+        flight = landing_last[airplane_id][before - 1] if before else None
+        if flight and flight[2] > departure_time:
+            errors[position] = (
+                f"Airplane is on flight {flight[0]} from "
+                f"{flight[1]:%Y-%m-%d %H:%M} to {flight[2]:%Y-%m-%d %H:%M}."
+            )
+            continue
+
+        earlier = accepted.get(airplane_id)
+        if earlier and earlier[1] > departure_time:
+            errors[position] = (
+                f"Airplane is on another new flight from "
+                f"{earlier[0]:%Y-%m-%d %H:%M} to {earlier[1]:%Y-%m-%d %H:%M}."
+            )
+            continue
+
+        if not earlier or arrival_time > earlier[1]:
+            accepted[airplane_id] = (departure_time, arrival_time)
+    return errors
+
+
+def audit_legs(legs):
+    """Find overlapping and discontinuous legs in one pass.
+
+    Legs must come sorted by airplane and departure time. A leg departing
+    before the airplane lands from its earlier legs is an overlap, one
+    departing from another airport than the previous leg lands at is a
+    position issue.
+    """
+    issues = []
+    previous = latest = None
+    for leg in legs:
+        leg = Leg(*leg)
+        if previous is None or previous.airplane_id != leg.airplane_id:
+            previous = latest = leg
+            continue
+
+        if leg.departure_time < latest.arrival_time:
+            issues.append(RotationIssue(OVERLAP, leg, latest))
+        if leg.source_id != previous.destination_id:
+            issues.append(RotationIssue(POSITION, leg, previous))
+        previous = leg
+        if leg.arrival_time > latest.arrival_time:
+            latest = leg
+    return issues
+
+
+def audit_rotations(date_from=None, date_to=None, chunk_size=10000):
+    """Rotation issues of every airplane, of all flights or those departing
+    between the dates. Rows stream in the order of the unique index on
+    (airplane, departure_time), so nothing is sorted in memory.
+    """
+    flights = Flight.objects.using(settings.STREAMING_DB_ALIAS)
+    if date_from is not None:
+        flights = flights.filter(**departure_range(date_from, date_to))
+    legs = (
+        flights.order_by("airplane_id", "departure_time")
+        .values_list(*LEG_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    return audit_legs(legs)
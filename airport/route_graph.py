@@ -0,0 +1,206 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Airport, Route
+
+ROUTE_GRAPH_VERSION_KEY = "airport:route_graph_version"
+
+# Virtual nodes joining every source airport and every destination airport,
+# so searches between cities run as a single source to single target search.
+START = "start"
+FINISH = "finish"
+
+_graph = None
+_graph_version = None
+_graph_built_at = None
+_graph_lock = threading.Lock()
+
+
+class RouteGraph:
+    """Directed graph of airports connected by routes.
+
+    Edges are (source_id, destination_id, route_id, distance) tuples.
+    """
+
+    def __init__(self, routes, airports):
+        self.airports = {
+            airport_id: {"name": name, "city": city_id}
+            for airport_id, name, city_id in airports
+        }
+        self.city_airports = defaultdict(set)
+        for airport_id, airport in self.airports.items():
+            self.city_airports[airport["city"]].add(airport_id)
+
+        self.adjacency = defaultdict(list)
+        for route_id, source_id, destination_id, distance in routes:
+            self.adjacency[source_id].append(
+                (source_id, destination_id, route_id, distance)
+            )
+
+    @classmethod
+    def from_db(cls) -> "RouteGraph":
+        return cls(
+            Route.objects.values_list("id", "source_id", "destination_id", "distance"),
+            Airport.objects.values_list("id", "name", "closest_big_city_id"),
+        )
+
+    def _edges(self, node, sources, targets):
+        """Edges leaving the node. Paths leave START to any source, end at
+        the first target they reach and never come back to a source."""
+        if node == START:
+            return [(START, airport_id, None, 0) for airport_id in sources]
+
+        if node in targets:
+            return [(node, FINISH, None, 0)]
+
+        return [
+            edge for edge in self.adjacency.get(node, []) if edge[1] not in sources
+        ]
+
+    @staticmethod
+    def _weight(edge, by):
+        if edge[2] is None:
+            return 0
+        return edge[3] if by == "distance" else 1
+
+    def _shortest_path(self, start, sources, targets, by, removed_edges, removed_nodes):
+        """Dijkstra from start to FINISH, return (cost, edges) or None"""
+        counter = itertools.count()
+        queue = [(0, next(counter), start)]
+        best = {start: 0}
+        previous = {}
+
+        while queue:
+            cost, _, node = heapq.heappop(queue)
+            if node == FINISH:
+                path = []
+                while node != start:
+                    edge = previous[node]
+                    path.append(edge)
+                    node = edge[0]
+                return cost, path[::-1]
+
+            if cost > best.get(node, cost):
+                continue
+
+            for edge in self._edges(node, sources, targets):
+                next_node = edge[1]
+                if next_node in removed_nodes or edge[:3] in removed_edges:
+                    continue
+
+                next_cost = cost + self._weight(edge, by)
+                if next_cost < best.get(next_node, next_cost + 1):
+                    best[next_node] = next_cost
+                    previous[next_node] = edge
+                    heapq.heappush(queue, (next_cost, next(counter), next_node))
+
+        return None
+
+    def shortest_paths(self, sources, targets, k=3, by="distance"):
+        """Return up to k loopless paths from any source to any target.
+
+        Paths are found with Yen's algorithm on top of Dijkstra and
+        ranked by total distance or by number of legs.
+        """
+        sources, targets = set(sources), set(targets)
+        first = self._shortest_path(START, sources, targets, by, set(), set())
+        if first is None:
+            return []
+
+        found = [first]
+        candidates = []
+        seen = {tuple(edge[:3] for edge in first[1])}
+        counter = itertools.count()
+
+        while len(found) < k:
+            _, last_path = found[-1]
+            for index in range(len(last_path)):
+                spur_node = last_path[index][0]
+                root = last_path[:index]
+                root_keys = [edge[:3] for edge in root]
+
+                removed_edges = {
+                    path[index][:3]
+                    for _, path in found
+                    if [edge[:3] for edge in path[:index]] == root_keys
+                }
+                removed_nodes = {edge[0] for edge in root}
+
+                spur = self._shortest_path(
+                    spur_node, sources, targets, by, removed_edges, removed_nodes
+                )
+                if spur is None:
+                    continue
+
+                path = root + spur[1]
+                key = tuple(edge[:3] for edge in path)
+                if key in seen:
+                    continue
+
+                seen.add(key)
+                cost = sum(self._weight(edge, by) for edge in path)
+                heapq.heappush(candidates, (cost, next(counter), path))
+
+            if not candidates:
+                break
+
+            cost, _, path = heapq.heappop(candidates)
+            found.append((cost, path))
+
+        return [self._itinerary(path) for _, path in found]
+
+    def _itinerary(self, path):
+        legs = [
+            {
+                "id": route_id,
+                "source": self.airports[source_id]["name"],
+                "destination": self.airports[destination_id]["name"],
+                "distance": distance,
+            }
+            for source_id, destination_id, route_id, distance in path
+            if route_id is not None
+        ]
+        return {
+            "distance": sum(leg["distance"] for leg in legs),
+            "legs": len(legs),
+            "routes": legs,
+        }
+
+
+def get_route_graph() -> RouteGraph:
+    """Return the route graph of this process, rebuilt when routes change.
+
+    Route writes bump a version in the Django cache, which other processes
+    see when that cache is shared (Redis). Each process also rebuilds its
+    graph once it is ROUTE_GRAPH_TTL seconds old, so with a per-process
+    cache other workers serve stale routes for at most that long.
+    """
+    global _graph, _graph_version, _graph_built_at
+
+    version = cache.get_or_set(ROUTE_GRAPH_VERSION_KEY, uuid.uuid4().hex, None)
+    if not _is_current(version):
+        with _graph_lock:
+            if not _is_current(version):
+                _graph = RouteGraph.from_db()
+                _graph_version = version
+                _graph_built_at = time.monotonic()
+    return _graph
+
+
+def _is_current(version):
+    return (
+        _graph is not None
+        and _graph_version == version
+        and time.monotonic() - _graph_built_at < settings.ROUTE_GRAPH_TTL
+    )
+
+
+def invalidate_route_graph() -> None:
+    cache.set(ROUTE_GRAPH_VERSION_KEY, uuid.uuid4().hex, None)
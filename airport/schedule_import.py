@@ -0,0 +1,381 @@
+import csv
+import json
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+
+from .crew_roster import Assignment, new_conflicts
+from .models import Airport, Airplane, Crew, Route, Flight
+from .rotations import overlapping_legs
+from .route_graph import invalidate_route_graph
+from .search_rows import refresh_search_rows
+from .serializers import ScheduleRowSerializer
+
+SCHEDULE_BATCH_SIZE = 1000
+
+StoredFlight = namedtuple("StoredFlight", ("id", "route", "arrival_time", "seats_sold"))
+
+
+def read_schedule(lines, file_format):
+    """Yield schedule rows as dicts from CSV or NDJSON lines.
+
+    In CSV, empty cells are left out and crews are ids separated by ``;``.
+    An NDJSON line that is not valid JSON is yielded as None, so it is
+    reported as a row error instead of aborting the import.
+    """
+    if file_format == "csv":
+        for row in csv.DictReader(lines):
+            row = {
+                name: value.strip()
+                for name, value in row.items()
+                if isinstance(name, str) and isinstance(value, str) and value.strip()
+            }
+            if "crews" in row:
+                row["crews"] = [pk for pk in row["crews"].split(";") if pk.strip()]
+            yield row
+        return
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+class ScheduleImporter:
+    """Create or update flights from schedule rows, batch by batch.
+
+    Airports, airplanes, routes and crews are read once into lookup maps,
+    so a batch is validated and written with a fixed number of queries.
+    Flights are matched by airplane and departure time. Rows moving a
+    flight with sold tickets, overlapping another leg of the airplane or
+    a flight of one of their crews are errors too. Rows with errors are
+    reported and skipped, the rest of their batch is imported. A file that
+    can't be read past some row is imported up to that row.
+    """
+
+    def __init__(self, batch_size=SCHEDULE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.airports = self._ids_by_name(Airport)
+        self.airplanes = self._ids_by_name(Airplane)
+        self.routes = {}
+        for route_id, source_id, destination_id in Route.objects.order_by(
+            "id"
+        ).values_list("id", "source_id", "destination_id"):
+            self.routes.setdefault((source_id, destination_id), route_id)
+        self.crews = set(Crew.objects.values_list("id", flat=True))
+        self.new_routes = {}
+        self.seen = {}
+        self.routes_created = False
+        self.result = {"created": 0, "updated": 0, "errors": []}
+
+    @staticmethod
+    def _ids_by_name(model):
+        ids = defaultdict(list)
+        for pk, name in model.objects.values_list("id", "name"):
+            ids[name].append(pk)
+        return ids
+
+    def run(self, rows):
+        batch = []
+        number = 0
+        try:
+            for number, row in enumerate(rows, start=1):
+                batch.append((number, row))
+                if len(batch) == self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+        except (UnicodeDecodeError, csv.Error) as error:
+            # Batches are committed one by one, so the rows read so far are
+            # imported and the result tells where reading stopped
+            self.error(number + 1, {"file": [f"Could not read the file: {error}"]})
+        if batch:
+            self.import_batch(batch)
+
+        if self.routes_created:
+            invalidate_route_graph()
+        self.result["errors"].sort(key=lambda error: error["row"])
+        return self.result
+
+    def import_batch(self, batch):
+        flights = [
+            flight
+            for flight in (self.resolve(number, row) for number, row in batch)
+            if flight is not None
+        ]
+        if not flights:
+            return
+
+        with transaction.atomic():
+            stored = self.stored_flights(flights)
+            flights = self.check_booked(flights, stored)
+            flights = self.check_rotations(flights)
+            flights = self.check_crews(flights, stored)
+            if not flights:
+                return
+
+            self.create_routes(flights)
+            Flight.objects.bulk_create(
+                [
+                    Flight(
+                        route_id=self.routes[flight["route"]],
+                        airplane_id=flight["airplane_id"],
+                        departure_time=flight["departure_time"],
+                        arrival_time=flight["arrival_time"],
+                    )
+                    for flight in flights
+                ],
+                update_conflicts=True,
+                unique_fields=["airplane", "departure_time"],
+                update_fields=["route", "arrival_time"],
+            )
+            self.set_crews(flights)
+            refresh_search_rows(self.flights_of(flights))
+
+        updated = sum(self.key(flight) in stored for flight in flights)
+        self.result["updated"] += updated
+        self.result["created"] += len(flights) - updated
+
+    def resolve(self, number, row):
+        """Validate a row and map its names to ids, or record its errors"""
+        if not isinstance(row, dict):
+            return self.error(number, {"non_field_errors": ["Expected a JSON object."]})
+
+        serializer = ScheduleRowSerializer(data=row)
+        if not serializer.is_valid():
+            return self.error(number, serializer.errors)
+
+        data = serializer.validated_data
+        errors = {}
+        source_id = self.lookup(self.airports, "source", data, errors)
+        destination_id = self.lookup(self.airports, "destination", data, errors)
+        airplane_id = self.lookup(self.airplanes, "airplane", data, errors)
+
+        crews = data.get("crews")
+        unknown = sorted(set(crews or ()) - self.crews)
+        if unknown:
+            errors["crews"] = [f"Crew {pk} does not exist." for pk in unknown]
+
+        route = (source_id, destination_id)
+        if None not in route and route not in self.routes:
+            if "distance" in data:
+                self.new_routes.setdefault(route, data["distance"])
+            elif route not in self.new_routes:
+                errors["distance"] = [
+                    "Route does not exist, distance is required to create it."
+                ]
+
+        key = (airplane_id, data["departure_time"])
+        if key in self.seen:
+            errors["non_field_errors"] = [
+                f"Airplane already departs at this time in row {self.seen[key]}."
+            ]
+
+        if errors:
+            return self.error(number, errors)
+
+        self.seen[key] = number
+        return {
+            "row": number,
+            "route": route,
+            "airplane_id": airplane_id,
+            "departure_time": data["departure_time"],
+            "arrival_time": data["arrival_time"],
+            "crews": crews,
+        }
+
+    @staticmethod
+    def lookup(ids_by_name, field, data, errors):
+        ids = ids_by_name.get(data[field], [])
+        if len(ids) == 1:
+            return ids[0]
+
+        model = "Airplane" if field == "airplane" else "Airport"
+        if ids:
+            errors[field] = [f"{model} name {data[field]!r} is not unique."]
+        else:
+            errors[field] = [f"{model} {data[field]!r} does not exist."]
+        return None
+
+    def error(self, number, errors):
+        self.result["errors"].append({"row": number, "errors": errors})
+        return None
+
+    def create_routes(self, flights):
+        missing = {
+            flight["route"] for flight in flights if flight["route"] not in self.routes
+        }
+        if not missing:
+            return
+
+        routes = Route.objects.bulk_create(
+            Route(
+                source_id=source_id,
+                destination_id=destination_id,
+                distance=self.new_routes[(source_id, destination_id)],
+            )
+            for source_id, destination_id in missing
+        )
+        for route in routes:
+            self.routes[(route.source_id, route.destination_id)] = route.pk
+        self.routes_created = True
+
+    @staticmethod
+    def flights_of(flights):
+        """Stored flights with the airplanes or departure times of the flights,
+        a superset of the flights themselves"""
+        return Flight.objects.filter(
+            airplane_id__in={flight["airplane_id"] for flight in flights},
+            departure_time__in={flight["departure_time"] for flight in flights},
+        )
+
+    @staticmethod
+    def key(flight):
+        return flight["airplane_id"], flight["departure_time"]
+
+    def stored_flights(self, flights):
+        """Map (airplane_id, departure_time) of the flights to stored ones"""
+        keys = {self.key(flight) for flight in flights}
+        stored = self.flights_of(flights).values_list(
+            "airplane_id",
+            "departure_time",
+            "id",
+            "route__source_id",
+            "route__destination_id",
+            "arrival_time",
+            "seats_sold",
+        )
+        return {
+            (airplane_id, departure_time): StoredFlight(
+                pk, (source_id, destination_id), arrival_time, seats_sold
+            )
+            for (
+                airplane_id,
+                departure_time,
+                pk,
+                source_id,
+                destination_id,
+                arrival_time,
+                seats_sold,
+            ) in stored
+            if (airplane_id, departure_time) in keys
+        }
+
+    def check_booked(self, flights, stored):
+        """Leave out rows changing the route or arrival of sold flights"""
+        allowed = []
+        for flight in flights:
+            current = stored.get(self.key(flight))
+            if (
+                current
+                and current.seats_sold
+                and (current.route, current.arrival_time)
+                != (flight["route"], flight["arrival_time"])
+            ):
+                self.error(
+                    flight["row"],
+                    {
+                        "non_field_errors": [
+                            f"Flight {current.id} has sold tickets, its route "
+                            "and arrival time can't change."
+                        ]
+                    },
+                )
+            else:
+                allowed.append(flight)
+        return allowed
+
+    def check_rotations(self, flights):
+        """Leave out rows overlapping another leg of their airplane"""
+        overlaps = overlapping_legs(
+            [
+                (
+                    flight["airplane_id"],
+                    flight["departure_time"],
+                    flight["arrival_time"],
+                )
+                for flight in flights
+            ]
+        )
+        for position, message in overlaps.items():
+            self.error(flights[position]["row"], {"non_field_errors": [message]})
+        return [
+            flight
+            for position, flight in enumerate(flights)
+            if position not in overlaps
+        ]
+
+    def check_crews(self, flights, stored):
+        """Leave out rows whose crews fly another flight at their time.
+
+        Stored flights of rows without crews keep theirs, at the new time.
+        """
+        replaced = [stored[key].id for key in map(self.key, flights) if key in stored]
+        kept_crews = defaultdict(list)
+        if any(flight["crews"] is None for flight in flights):
+            for flight_id, crew_id in Flight.crews.through.objects.filter(
+                flight_id__in=replaced
+            ).values_list("flight_id", "crew_id"):
+                kept_crews[flight_id].append(crew_id)
+
+        positions = {}
+        assignments = []
+        for position, flight in enumerate(flights):
+            current = stored.get(self.key(flight))
+            flight_id = current.id if current else ("row", flight["row"])
+            positions[flight_id] = position
+            crews = flight["crews"]
+            if crews is None:
+                crews = kept_crews[flight_id] if current else ()
+            assignments.extend(
+                Assignment(
+                    crew_id, flight_id, flight["departure_time"], flight["arrival_time"]
+                )
+                for crew_id in set(crews)
+            )
+
+        errors = defaultdict(list)
+        for conflict in new_conflicts(assignments, replaced):
+            other = conflict.overlapping
+            errors[positions[conflict.flight.flight_id]].append(
+                f"Crew {conflict.crew_id} is on another flight from "
+                f"{other.departure_time:%Y-%m-%d %H:%M} to "
+                f"{other.arrival_time:%Y-%m-%d %H:%M}."
+            )
+        for position, messages in errors.items():
+            self.error(flights[position]["row"], {"crews": messages})
+        return [
+            flight for position, flight in enumerate(flights) if position not in errors
+        ]
+
+    def flight_ids(self, flights):
+        """Map (airplane_id, departure_time) of the flights to stored ids"""
+        keys = {(flight["airplane_id"], flight["departure_time"]) for flight in flights}
+        stored = self.flights_of(flights).values_list(
+            "airplane_id", "departure_time", "id"
+        )
+        return {
+            (airplane_id, departure_time): pk
+            for airplane_id, departure_time, pk in stored
+            if (airplane_id, departure_time) in keys
+        }
+
+    def set_crews(self, flights):
+        """Replace crews of flights whose rows list them, in two queries"""
+        flights = [flight for flight in flights if flight["crews"] is not None]
+        if not flights:
+            return
+
+        ids = self.flight_ids(flights)
+        through = Flight.crews.through
+        through.objects.filter(flight_id__in=ids.values()).delete()
+        through.objects.bulk_create(
+            through(
+                flight_id=ids[(flight["airplane_id"], flight["departure_time"])],
+                crew_id=crew_id,
+            )
+            for flight in flights
+            for crew_id in set(flight["crews"])
+        )
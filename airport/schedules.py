@@ -0,0 +1,256 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .crew_roster import Assignment, new_conflicts
+from .date_ranges import departure_range
+from .models import Flight, FlightSchedule
+from .rotations import overlapping_legs
+from .search_rows import refresh_flight, refresh_search_rows
+
+
+class DepartureConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The airplane already has another flight at this time."
+    default_code = "departure_conflict"
+
+
+def booking_horizon():
+    """Last date whose scheduled flights must exist as Flight rows"""
+    return (timezone.now() + settings.FLIGHT_BOOKING_WINDOW).date()
+
+
+def occurrences(schedule, date_from, date_to):
+    """Yield departure times of the schedule between the dates, inclusive"""
+    weekdays = {int(day) for day in schedule.days_of_week}
+    day = max(date_from, schedule.valid_from)
+    last = min(date_to, schedule.valid_until)
+    while day <= last:
+        if day.isoweekday() in weekdays:
+            yield datetime.combine(
+                day, schedule.departure_time, tzinfo=dt_timezone.utc
+            )
+        day += timedelta(days=1)
+
+
+def is_occurrence(schedule, departure_time):
+    departure_time = departure_time.astimezone(dt_timezone.utc)
+    return departure_time in occurrences(
+        schedule, departure_time.date(), departure_time.date()
+    )
+
+
+def scheduled_flight(schedule, departure_time):
+    return Flight(
+        route_id=schedule.route_id,
+        airplane_id=schedule.airplane_id,
+        schedule=schedule,
+        departure_time=departure_time,
+        arrival_time=departure_time + schedule.duration,
+    )
+
+
+def copy_crews(schedules, flights):
+    """Give flights the crews of their schedules, skipping existing pairs.
+
+    Flights are (id, schedule_id, departure_time, arrival_time) tuples. A
+    crew already flying at the time of a flight is left out of it.
+    """
+    through = Flight.crews.through
+    crews = {schedule.pk: schedule.crews.all() for schedule in schedules}
+    assignments = [
+        Assignment(crew.pk, flight_id, departure_time, arrival_time)
+        for flight_id, schedule_id, departure_time, arrival_time in flights
+        for crew in crews[schedule_id]
+    ]
+    busy = {
+        (conflict.crew_id, conflict.flight.flight_id)
+        for conflict in new_conflicts(assignments)
+    }
+    through.objects.bulk_create(
+        (
+            through(flight_id=assignment.flight_id, crew_id=assignment.crew_id)
+            for assignment in assignments
+            if assignment[:2] not in busy
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def free_flights(flights):
+    """The flights whose airplane is not flying another leg at their time"""
+    overlaps = overlapping_legs(
+        [
+            (flight.airplane_id, flight.departure_time, flight.arrival_time)
+            for flight in flights
+        ]
+    )
+    return [
+        flight for position, flight in enumerate(flights) if position not in overlaps
+    ]
+
+
+def materialize_schedules(until=None, schedules=None, batch_size=100):
+    """Create Flight rows for scheduled departures up to the date, in bulk.
+
+    Only departures after what a schedule already materialized and not in
+    the past are created. Occurrences departing with or overlapping
+    another flight of the airplane are skipped, as are crews flying
+    elsewhere then. Returns the number of schedules brought up to the
+    date.
+    """
+    until = until or booking_horizon()
+    today = timezone.now().date()
+    if schedules is None:
+        schedules = FlightSchedule.objects.all()
+    schedules = list(
+        schedules.filter(valid_until__gte=today)
+        .exclude(materialized_until__gte=until)
+        .prefetch_related("crews")
+    )
+
+    for start in range(0, len(schedules), batch_size):
+        batch = schedules[start:start + batch_size]
+        with transaction.atomic():
+            first_days = []
+            flights = []
+            for schedule in batch:
+                first_day = today
+                if schedule.materialized_until:
+                    first_day = max(
+                        today, schedule.materialized_until + timedelta(days=1)
+                    )
+                first_days.append(first_day)
+                flights.extend(
+                    scheduled_flight(schedule, departure_time)
+                    for departure_time in occurrences(schedule, first_day, until)
+                )
+            Flight.objects.bulk_create(free_flights(flights), ignore_conflicts=True)
+
+            created = Flight.objects.filter(
+                schedule__in=batch, **departure_range(min(first_days), until)
+            )
+            copy_crews(
+                batch,
+                created.values_list(
+                    "id", "schedule_id", "departure_time", "arrival_time"
+                ),
+            )
+            refresh_search_rows(created)
+
+            for schedule in batch:
+                schedule.materialized_until = until
+            FlightSchedule.objects.bulk_update(batch, ["materialized_until"])
+
+    return len(schedules)
+
+
+def materialize_departure(schedule, departure_time):
+    """Return the Flight of a scheduled departure, creating it if needed.
+
+    Raises DepartureConflict when the airplane has another flight then.
+    """
+    with transaction.atomic():
+        flight = scheduled_flight(schedule, departure_time)
+        if not free_flights([flight]):
+            raise DepartureConflict()
+
+        Flight.objects.bulk_create([flight], ignore_conflicts=True)
+        flight = Flight.objects.get(
+            airplane_id=schedule.airplane_id, departure_time=departure_time
+        )
+        if flight.schedule_id != schedule.pk:
+            raise DepartureConflict()
+
+        copy_crews(
+            [schedule],
+            [(flight.pk, schedule.pk, flight.departure_time, flight.arrival_time)],
+        )
+        refresh_flight(flight.pk)
+    return flight
+
+
+def reschedule(schedule):
+    """Bring the future flights of an edited schedule in line with it.
+
+    Flights without sold or held seats are deleted and materialized again.
+    Booked flights keep their departure: those still on an occurrence of
+    the schedule's route and airplane get its duration and crews, unless
+    the new duration overlaps the next leg of the airplane. The others are
+    kept as flights of their own, without the schedule.
+    """
+    with transaction.atomic():
+        future = Flight.objects.filter(
+            schedule=schedule, departure_time__gt=timezone.now()
+        )
+        future.filter(seats_sold=0, holds__isnull=True).delete()
+
+        kept = []
+        detached = []
+        for flight in future.only("id", "route_id", "airplane_id", "departure_time"):
+            if (
+                flight.route_id == schedule.route_id
+                and flight.airplane_id == schedule.airplane_id
+                and is_occurrence(schedule, flight.departure_time)
+            ):
+                flight.arrival_time = flight.departure_time + schedule.duration
+                kept.append(flight)
+            else:
+                detached.append(flight.pk)
+        free = {flight.pk for flight in free_flights(kept)}
+        detached.extend(flight.pk for flight in kept if flight.pk not in free)
+        kept = [flight for flight in kept if flight.pk in free]
+        Flight.objects.bulk_update(kept, ["arrival_time"])
+        Flight.objects.filter(pk__in=detached).update(schedule=None)
+        Flight.crews.through.objects.filter(flight__in=kept).delete()
+        copy_crews(
+            [schedule],
+            [
+                (flight.pk, schedule.pk, flight.departure_time, flight.arrival_time)
+                for flight in kept
+            ],
+        )
+        refresh_search_rows(
+            Flight.objects.filter(pk__in=[flight.pk for flight in kept] + detached)
+        )
+
+        schedule.materialized_until = None
+        schedule.save(update_fields=["materialized_until"])
+        materialize_schedules(schedules=FlightSchedule.objects.filter(pk=schedule.pk))
+
+
+def scheduled_departures(schedules, date_from, date_to):
+    """Departures of the schedules between the dates, sorted by time.
+
+    Occurrences are computed from the schedules, and only flights already
+    materialized in the range are read, to show their free seats and ids.
+    """
+    flights = {
+        (flight.schedule_id, flight.departure_time): flight
+        for flight in Flight.objects.filter(
+            schedule__in=schedules, **departure_range(date_from, date_to)
+        ).only("id", "schedule_id", "departure_time", "seats_sold")
+    }
+
+    departures = []
+    for schedule in schedules:
+        capacity = schedule.airplane.capacity
+        for departure_time in occurrences(schedule, date_from, date_to):
+            flight = flights.get((schedule.pk, departure_time))
+            departures.append(
+                {
+                    "schedule": schedule,
+                    "flight": flight.pk if flight else None,
+                    "departure_time": departure_time,
+                    "arrival_time": departure_time + schedule.duration,
+                    "tickets_available": capacity - flight.seats_sold
+                    if flight
+                    else capacity,
+                }
+            )
+    departures.sort(key=lambda departure: departure["departure_time"])
+    return departures
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Flight, FlightSearchRow
+
+SEARCH_ROW_BATCH_SIZE = 2000
+
+# FlightSearchRow fields and the Flight lookups they copy
+SEARCH_ROW_VALUES = {
+    "route_id": F("route_id"),
+    "source_id": F("route__source_id"),
+    "destination_id": F("route__destination_id"),
+    "source_name": F("route__source__name"),
+    "destination_name": F("route__destination__name"),
+    "source_city": F("route__source__closest_big_city__name"),
+    "destination_city": F("route__destination__closest_big_city__name"),
+    "airplane_id": F("airplane_id"),
+    "airplane_name": F("airplane__name"),
+    "airplane_capacity": F("airplane__rows") * F("airplane__seats_in_row"),
+    "departure_time": F("departure_time"),
+    "arrival_time": F("arrival_time"),
+    "seats_available": F("airplane__rows") * F("airplane__seats_in_row")
+    - F("seats_sold"),
+}
+
+
+def refresh_search_rows(flights, batch_size=SEARCH_ROW_BATCH_SIZE):
+    """Upsert search rows of the flights from one joined read, batch by batch.
+
+    The read runs in a transaction, so its server-side cursor works through
+    pgbouncer in transaction mode too.
+    """
+    with transaction.atomic(using=flights.db, savepoint=False):
+        rows = (
+            flights.order_by()
+            .values(
+                "id",
+                **{f"row_{name}": value for name, value in SEARCH_ROW_VALUES.items()},
+            )
+            .iterator(chunk_size=batch_size)
+        )
+        batch = []
+        for row in rows:
+            batch.append(
+                FlightSearchRow(
+                    flight_id=row["id"],
+                    **{name: row[f"row_{name}"] for name in SEARCH_ROW_VALUES},
+                )
+            )
+            if len(batch) == batch_size:
+                _upsert(batch)
+                batch = []
+        if batch:
+            _upsert(batch)
+
+
+def _upsert(rows):
+    FlightSearchRow.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["flight"],
+        update_fields=list(SEARCH_ROW_VALUES),
+    )
+
+
+def refresh_flight(flight_id):
+    refresh_search_rows(Flight.objects.filter(pk=flight_id))
+
+
+def rebuild_search_rows(batch_size=SEARCH_ROW_BATCH_SIZE):
+    """Bring every search row in line with the flights, return their count"""
+    refresh_search_rows(Flight.objects.using(settings.STREAMING_DB_ALIAS), batch_size)
+    return FlightSearchRow.objects.count()
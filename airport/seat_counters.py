@@ -0,0 +1,52 @@
+from itertools import groupby
+
+from django.db import transaction
+
+from .models import Flight, Ticket
+from .seat_map import SeatMap
+
+SEAT_COUNTER_BATCH_SIZE = 1000
+
+
+def rebuild_seat_counters(flights, batch_size=SEAT_COUNTER_BATCH_SIZE):
+    """Recount seats_sold and seat maps of the flights from their tickets.
+
+    Each batch of flights is locked like in Flight.update_seats and its
+    tickets are read under the lock, so a booking committing meanwhile is
+    either counted or applied after the batch, never overwritten. Search
+    rows are not refreshed. Returns the number of flights.
+    """
+    flight_ids = list(flights.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(flight_ids), batch_size):
+        with transaction.atomic():
+            _rebuild_batch(flight_ids[start:start + batch_size])
+    return len(flight_ids)
+
+
+def _rebuild_batch(flight_ids):
+    flights = {
+        flight.pk: flight
+        for flight in Flight.objects.select_for_update(of=("self",))
+        .select_related("airplane")
+        .only("airplane__rows", "airplane__seats_in_row")
+        .filter(pk__in=flight_ids)
+        .order_by("id")
+    }
+    for flight in flights.values():
+        flight.seat_map = b""
+        flight.seats_sold = 0
+
+    tickets = (
+        Ticket.objects.filter(flight_id__in=flights)
+        .order_by("flight_id")
+        .values_list("flight_id", "row", "seat")
+    )
+    for flight_id, places in groupby(tickets, key=lambda ticket: ticket[0]):
+        flight = flights[flight_id]
+        seat_map = SeatMap.for_flight(flight)
+        for _, row, seat in places:
+            seat_map.take(row, seat)
+            flight.seats_sold += 1
+        flight.seat_map = seat_map.to_bytes()
+
+    Flight.objects.bulk_update(flights.values(), ["seats_sold", "seat_map"])
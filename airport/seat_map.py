@@ -0,0 +1,60 @@
+class SeatMap:
+    """Seat occupancy of a flight packed into one bit per seat.
+
+    Seats are numbered row by row, so the bit of (row, seat) lives at
+    ``(row - 1) * seats_in_row + (seat - 1)``.
+    """
+
+    def __init__(self, rows: int, seats_in_row: int, data: bytes = b"") -> None:
+        self.rows = rows
+        self.seats_in_row = seats_in_row
+        size = (rows * seats_in_row + 7) // 8
+        self._bits = bytearray(bytes(data)[:size].ljust(size, b"\x00"))
+
+    @classmethod
+    def for_flight(cls, flight) -> "SeatMap":
+        return cls(
+            flight.airplane.rows, flight.airplane.seats_in_row, flight.seat_map
+        )
+
+    def _position(self, row: int, seat: int) -> tuple[int, int]:
+        index = (row - 1) * self.seats_in_row + (seat - 1)
+        return index >> 3, 1 << (index & 7)
+
+    def is_taken(self, row: int, seat: int) -> bool:
+        byte, mask = self._position(row, seat)
+        return bool(self._bits[byte] & mask)
+
+    def take(self, row: int, seat: int) -> None:
+        byte, mask = self._position(row, seat)
+        self._bits[byte] |= mask
+
+    def release(self, row: int, seat: int) -> None:
+        byte, mask = self._position(row, seat)
+        self._bits[byte] &= ~mask
+
+    def taken_places(self) -> list[tuple[int, int]]:
+        places = []
+        for byte_index, byte in enumerate(self._bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (1 << bit):
+                    index = byte_index * 8 + bit
+                    places.append(
+                        (index // self.seats_in_row + 1, index % self.seats_in_row + 1)
+                    )
+        return places
+
+    def to_rows(self) -> list[str]:
+        """Render every row as a string of "1" (taken) and "0" (free) seats"""
+        return [
+            "".join(
+                "1" if self.is_taken(row, seat) else "0"
+                for seat in range(1, self.seats_in_row + 1)
+            )
+            for row in range(1, self.rows + 1)
+        ]
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
@@ -1,7 +1,11 @@
-from django.db import transaction
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ErrorDetail, ValidationError
 from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator
 
 from .models import (
     Country,
@@ -12,9 +16,19 @@ from .models import (
     Crew,
     Route,
     Flight,
+    FlightSchedule,
+    FlightSearchRow,
     Order,
     Ticket,
+    Reservation,
+    SeatHold,
+    DailyRouteLoad,
 )
+from .crew_roster import overlapping_assignments
+from .outbox import publish
+from .reservations import SeatConflict, claim_seats, hold_seats
+from .rotations import rotation_errors
+from .seat_map import SeatMap
 
 
 class CountrySerializer(serializers.ModelSerializer):
@@ -106,6 +120,50 @@ class FlightSerializer(serializers.ModelSerializer):
         model = Flight
         fields = ("id", "route", "airplane", "crews", "departure_time", "arrival_time")
 
+    def validate(self, attrs):
+        data = super(FlightSerializer, self).validate(attrs=attrs)
+        instance = self.instance
+        departure_time = attrs.get(
+            "departure_time", getattr(instance, "departure_time", None)
+        )
+        arrival_time = attrs.get(
+            "arrival_time", getattr(instance, "arrival_time", None)
+        )
+        if arrival_time <= departure_time:
+            raise ValidationError(
+                {"arrival_time": "Arrival time must be after departure time."}
+            )
+
+        errors = {}
+        flight_id = getattr(instance, "pk", None)
+        airplane = attrs.get("airplane", getattr(instance, "airplane", None))
+        route = attrs.get("route", getattr(instance, "route", None))
+        airplane_errors = rotation_errors(
+            airplane.pk, route, departure_time, arrival_time, flight_id
+        )
+        if airplane_errors:
+            errors["airplane"] = airplane_errors
+
+        if "crews" in attrs:
+            crew_ids = [crew.pk for crew in attrs["crews"]]
+        else:
+            crew_ids = [crew.pk for crew in instance.crews.all()] if instance else []
+        overlapping = overlapping_assignments(
+            crew_ids, departure_time, arrival_time, flight_id
+        )
+        if overlapping:
+            errors["crews"] = [
+                f"Crew {assignment.crew_id} is already on flight "
+                f"{assignment.flight_id} from "
+                f"{assignment.departure_time:%Y-%m-%d %H:%M} to "
+                f"{assignment.arrival_time:%Y-%m-%d %H:%M}."
+                for assignment in overlapping
+            ]
+
+        if errors:
+            raise ValidationError(errors)
+        return data
+
 
 class FlightListSerializer(FlightSerializer):
     route = serializers.CharField(source="route.__str__", read_only=True)
@@ -130,7 +188,244 @@ class FlightListSerializer(FlightSerializer):
         )
 
 
+class FlightSearchRowSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="flight_id")
+    departure_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
+    arrival_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
+    tickets_available = serializers.IntegerField(source="seats_available")
+
+    class Meta:
+        model = FlightSearchRow
+        fields = (
+            "id",
+            "route",
+            "airplane_name",
+            "airplane_capacity",
+            "tickets_available",
+            "departure_time",
+            "arrival_time",
+        )
+
+
+class ItinerarySerializer(serializers.Serializer):
+    stops = serializers.IntegerField(read_only=True)
+    departure_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M", read_only=True)
+    arrival_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M", read_only=True)
+    flights = FlightListSerializer(many=True, read_only=True)
+
+
+class FlightScheduleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FlightSchedule
+        fields = (
+            "id",
+            "route",
+            "airplane",
+            "crews",
+            "days_of_week",
+            "departure_time",
+            "duration",
+            "valid_from",
+            "valid_until",
+            "materialized_until",
+        )
+
+    def validate(self, attrs):
+        valid_from = attrs.get("valid_from", getattr(self.instance, "valid_from", None))
+        valid_until = attrs.get(
+            "valid_until", getattr(self.instance, "valid_until", None)
+        )
+        if valid_from and valid_until and valid_until < valid_from:
+            raise ValidationError(
+                {"valid_until": "Validity must not end before it starts."}
+            )
+        return attrs
+
+
+class FlightScheduleListSerializer(FlightScheduleSerializer):
+    route = serializers.CharField(source="route.__str__", read_only=True)
+    airplane_name = serializers.CharField(source="airplane.name", read_only=True)
+
+    class Meta:
+        model = FlightSchedule
+        fields = (
+            "id",
+            "route",
+            "airplane_name",
+            "days_of_week",
+            "departure_time",
+            "duration",
+            "valid_from",
+            "valid_until",
+        )
+
+
+class ScheduledDepartureSerializer(serializers.Serializer):
+    schedule = serializers.IntegerField(source="schedule.pk")
+    flight = serializers.IntegerField(allow_null=True)
+    route = serializers.CharField(source="schedule.route.__str__")
+    airplane_name = serializers.CharField(source="schedule.airplane.name")
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    tickets_available = serializers.IntegerField()
+
+
+class MaterializeDepartureSerializer(serializers.Serializer):
+    departure_time = serializers.DateTimeField()
+
+
+class CrewAssignmentSerializer(serializers.Serializer):
+    flight = serializers.IntegerField(source="flight_id")
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+
+
+class CrewConflictSerializer(serializers.Serializer):
+    crew = serializers.IntegerField(source="crew_id")
+    flight = CrewAssignmentSerializer()
+    overlapping = CrewAssignmentSerializer()
+
+
+class DailyRouteLoadSerializer(serializers.ModelSerializer):
+    route = serializers.IntegerField(source="route_id")
+    route_name = serializers.CharField(source="route.__str__", read_only=True)
+    load_factor = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DailyRouteLoad
+        fields = (
+            "date",
+            "route",
+            "route_name",
+            "flights",
+            "seats",
+            "seats_sold",
+            "load_factor",
+        )
+
+
+class AirplaneTypeSalesSerializer(serializers.Serializer):
+    airplane_type = serializers.IntegerField(source="airplane_type_id")
+    name = serializers.CharField()
+    tickets = serializers.IntegerField()
+
+
+class RouteSalesSerializer(serializers.Serializer):
+    route = serializers.IntegerField(source="route_id")
+    name = serializers.CharField()
+    tickets = serializers.IntegerField()
+
+
+class ScheduleRowSerializer(serializers.Serializer):
+    """One flight of an imported schedule, airports and airplane by name"""
+
+    source = serializers.CharField()
+    destination = serializers.CharField()
+    distance = serializers.IntegerField(required=False, min_value=1)
+    airplane = serializers.CharField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    crews = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        if attrs["arrival_time"] <= attrs["departure_time"]:
+            raise ValidationError(
+                {"arrival_time": "Arrival time must be after departure time."}
+            )
+        return attrs
+
+
+class ScheduleImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv")
+
+
+class ScheduleImportResultSerializer(serializers.Serializer):
+    created = serializers.IntegerField()
+    updated = serializers.IntegerField()
+    errors = serializers.ListField(child=serializers.DictField())
+
+
+class PreloadedFlightField(PrimaryKeyRelatedField):
+    """Resolve the flight from the batch preloaded by the parent list"""
+
+    def to_internal_value(self, data):
+        flights = getattr(self.parent, "flights", None)
+        if flights:
+            try:
+                return flights[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class PreloadedFlightListSerializer(serializers.ListSerializer):
+    """Load flights of all items with their airplanes in one query"""
+
+    def to_internal_value(self, data):
+        self.child.flights = self._load_flights(data)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def _load_flights(data):
+        if not isinstance(data, list):
+            return {}
+
+        flight_ids = set()
+        for item in data:
+            try:
+                flight_ids.add(int(item["flight"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        return Flight.objects.select_related("airplane").in_bulk(flight_ids)
+
+
+class TicketBulkSerializer(PreloadedFlightListSerializer):
+    """Validate a list of tickets with a fixed number of queries.
+
+    A seat listed twice in the list is reported like UniqueTogetherValidator
+    would. Seats sold or held by others are checked once the flights are
+    locked, by claim_seats, and reported as 409.
+    """
+
+    def to_internal_value(self, data):
+        tickets = super().to_internal_value(data)
+
+        unique_message = UniqueTogetherValidator.message.format(
+            field_names=", ".join(Ticket._meta.unique_together[0])
+        )
+        errors = []
+        seen = set()
+        for ticket in tickets:
+            place = (ticket["flight"].id, ticket["row"], ticket["seat"])
+            if place in seen:
+                errors.append(
+                    {
+                        api_settings.NON_FIELD_ERRORS_KEY: [
+                            ErrorDetail(unique_message, code="unique")
+                        ]
+                    }
+                )
+            else:
+                errors.append({})
+            seen.add(place)
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        return tickets
+
+
 class TicketSerializer(serializers.ModelSerializer):
+    flight = PreloadedFlightField(queryset=Flight.objects.select_related("airplane"))
+
+    def get_validators(self):
+        if isinstance(self.parent, TicketBulkSerializer):
+            return []
+
+        return super().get_validators()
+
     def validate(self, attrs):
         data = super(TicketSerializer, self).validate(attrs=attrs)
         Ticket.validate_ticket(
@@ -141,6 +436,7 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = ("id", "row", "seat", "flight")
+        list_serializer_class = TicketBulkSerializer
 
 
 class TicketListSerializer(TicketSerializer):
@@ -159,7 +455,8 @@ class FlightDetailSerializer(serializers.ModelSerializer):
     crews = CrewSerializer(many=True, read_only=True)
     departure_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
     arrival_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M")
-    taken_places = TicketSeatsSerializer(source="tickets", many=True, read_only=True)
+    taken_places = serializers.SerializerMethodField()
+    seat_map = serializers.SerializerMethodField()
 
     class Meta:
         model = Flight
@@ -171,8 +468,39 @@ class FlightDetailSerializer(serializers.ModelSerializer):
             "departure_time",
             "arrival_time",
             "taken_places",
+            "seat_map",
         )
 
+    def to_representation(self, instance):
+        # Decoded once, read by both taken_places and seat_map
+        self._seat_map = SeatMap.for_flight(instance)
+        return super().to_representation(instance)
+
+    def get_taken_places(self, obj):
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in self._seat_map.taken_places()
+        ]
+
+    def get_seat_map(self, obj):
+        return self._seat_map.to_rows()
+
+
+class FlightSeatMapSerializer(serializers.ModelSerializer):
+    rows = serializers.IntegerField(source="airplane.rows", read_only=True)
+    seats_in_row = serializers.IntegerField(
+        source="airplane.seats_in_row", read_only=True
+    )
+    tickets_available = serializers.IntegerField(read_only=True)
+    seats = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Flight
+        fields = ("id", "rows", "seats_in_row", "tickets_available", "seats")
+
+    def get_seats(self, obj):
+        return SeatMap.for_flight(obj).to_rows()
+
 
 class OrderSerializer(serializers.ModelSerializer):
     tickets = TicketSerializer(many=True, read_only=False, allow_null=False)
@@ -185,11 +513,74 @@ class OrderSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         with transaction.atomic():
             tickets_data = validated_data.pop("tickets")
+            claim_seats(
+                validated_data["user"],
+                [
+                    (ticket_data["flight"].id, ticket_data["row"], ticket_data["seat"])
+                    for ticket_data in tickets_data
+                ],
+            )
             order = Order.objects.create(**validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(order=order, **ticket_data)
+            try:
+                with transaction.atomic():
+                    tickets = Ticket.objects.bulk_create(
+                        Ticket(order=order, **ticket_data)
+                        for ticket_data in tickets_data
+                    )
+            except IntegrityError:
+                raise SeatConflict()
+
+            places = defaultdict(list)
+            for ticket in tickets:
+                places[ticket.flight_id].append((ticket.row, ticket.seat))
+            for flight_id in sorted(places):
+                Flight.update_seats(flight_id, places[flight_id])
+            publish("order.created", {"order": order.pk})
+
             return order
 
 
 class OrderListSerializer(OrderSerializer):
     tickets = TicketListSerializer(many=True, read_only=True)
+
+
+class SeatHoldSerializer(serializers.ModelSerializer):
+    flight = PreloadedFlightField(queryset=Flight.objects.select_related("airplane"))
+
+    def validate(self, attrs):
+        data = super(SeatHoldSerializer, self).validate(attrs=attrs)
+        Ticket.validate_ticket(
+            attrs["row"], attrs["seat"], attrs["flight"].airplane, ValidationError
+        )
+        return data
+
+    class Meta:
+        model = SeatHold
+        fields = ("id", "row", "seat", "flight")
+        # conflicts with other holds and sold seats are reported as 409 on create
+        validators = []
+        list_serializer_class = PreloadedFlightListSerializer
+
+
+class ReservationSerializer(serializers.ModelSerializer):
+    holds = SeatHoldSerializer(many=True, allow_empty=False)
+
+    class Meta:
+        model = Reservation
+        fields = ("id", "holds", "created_at", "expires_at")
+        read_only_fields = ("created_at", "expires_at")
+
+    def validate_holds(self, holds):
+        places = [(hold["flight"].id, hold["row"], hold["seat"]) for hold in holds]
+        if len(set(places)) != len(places):
+            raise ValidationError("The same seat can not be held twice.")
+        return holds
+
+    def create(self, validated_data):
+        return hold_seats(
+            validated_data["user"],
+            [
+                (hold["flight"].id, hold["row"], hold["seat"])
+                for hold in validated_data["holds"]
+            ],
+        )
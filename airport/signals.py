@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .caching import invalidate_model_cache
+from .models import (
+    Country,
+    City,
+    Airport,
+    AirplaneType,
+    Airplane,
+    Crew,
+    Route,
+    Flight,
+    Ticket,
+)
+from .route_graph import invalidate_route_graph
+from .search_rows import refresh_flight, refresh_search_rows
+from .seat_counters import rebuild_seat_counters
+
+
+def invalidate_after_commit(invalidate):
+    """Invalidate right away for this transaction and again once it commits,
+    so readers in other processes can't cache the uncommitted state"""
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Ticket)
+def take_seat(sender, instance, created, **kwargs):
+    if created:
+        Flight.update_seats(instance.flight_id, [(instance.row, instance.seat)])
+
+
+@receiver(post_delete, sender=Ticket)
+def release_seat(sender, instance, **kwargs):
+    Flight.update_seats(
+        instance.flight_id, [(instance.row, instance.seat)], taken=False
+    )
+
+
+@receiver(pre_save, sender=Airplane)
+def note_airplane_resize(sender, instance, **kwargs):
+    instance.resized = (
+        instance.pk is not None
+        and Airplane.objects.filter(pk=instance.pk)
+        .exclude(rows=instance.rows, seats_in_row=instance.seats_in_row)
+        .exists()
+    )
+
+
+@receiver(post_save, sender=Airplane)
+def rebuild_resized_seat_maps(sender, instance, **kwargs):
+    # Seat bits are placed by the airplane size, so they move with it
+    if instance.resized:
+        rebuild_seat_counters(Flight.objects.filter(airplane_id=instance.pk))
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+def reset_route_graph(sender, **kwargs):
+    invalidate_after_commit(invalidate_route_graph)
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+@receiver(post_save, sender=AirplaneType)
+@receiver(post_delete, sender=AirplaneType)
+@receiver(post_save, sender=Airplane)
+@receiver(post_delete, sender=Airplane)
+@receiver(post_save, sender=Crew)
+@receiver(post_delete, sender=Crew)
+def reset_reference_cache(sender, **kwargs):
+    invalidate_after_commit(lambda: invalidate_model_cache(sender))
+
+
+@receiver(post_save, sender=Flight)
+def refresh_flight_search_row(sender, instance, **kwargs):
+    refresh_flight(instance.pk)
+
+
+# Names and sizes shown in search rows, by the sender whose rows they are
+SEARCH_ROW_SOURCES = {
+    Route: lambda pk: Q(route_id=pk),
+    Airport: lambda pk: Q(route__source_id=pk) | Q(route__destination_id=pk),
+    City: lambda pk: Q(route__source__closest_big_city_id=pk)
+    | Q(route__destination__closest_big_city_id=pk),
+    Airplane: lambda pk: Q(airplane_id=pk),
+}
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_save, sender=Airport)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=Airplane)
+def refresh_shown_search_rows(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_rows(
+            Flight.objects.filter(SEARCH_ROW_SOURCES[sender](instance.pk))
+        )
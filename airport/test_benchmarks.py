@@ -0,0 +1,425 @@
+"""Query-count budgets and latency report for every API endpoint.
+
+The dataset size and the number of timed requests per endpoint come from
+environment variables, so the same suite guards query counts in regular
+test runs and produces comparable reports on a big dataset:
+
+    BENCHMARK_FLIGHTS=5000 BENCHMARK_ITERATIONS=20 \\
+    BENCHMARK_REPORT=benchmark.json python manage.py test airport.test_benchmarks
+
+The report maps every endpoint to its query count and p50/p95 latency in
+milliseconds, so reports of two commits can be diffed.
+"""
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from airport.analytics import roll_up
+from airport.factories import create_dataset
+from airport.models import (
+    City,
+    Airport,
+    AirplaneType,
+    Airplane,
+    Crew,
+    Flight,
+    FlightSchedule,
+    Order,
+    Ticket,
+    Reservation,
+    SeatHold,
+)
+
+BENCHMARK_FLIGHTS = int(os.environ.get("BENCHMARK_FLIGHTS", 200))
+BENCHMARK_ITERATIONS = int(os.environ.get("BENCHMARK_ITERATIONS", 3))
+BENCHMARK_REPORT = os.environ.get("BENCHMARK_REPORT")
+
+PASSWORD = "benchmark-pass"
+
+
+def api_endpoints():
+    """Return (url name, method) of every endpoint under /api/airport and /api/user"""
+    endpoints = set()
+    for prefix in ("api/airport/", "api/user/"):
+        resolver = next(
+            pattern
+            for pattern in get_resolver().url_patterns
+            if isinstance(pattern, URLResolver) and str(pattern.pattern) == prefix
+        )
+        for pattern in resolver.url_patterns:
+            if not isinstance(pattern, URLPattern):
+                continue
+
+            callback = pattern.callback
+            actions = getattr(callback, "actions", None)
+            if actions:
+                methods = actions.keys()
+            else:
+                view_class = callback.view_class
+                methods = [
+                    method
+                    for method in view_class.http_method_names
+                    if hasattr(view_class, method)
+                ]
+            endpoints.update(
+                (f"{resolver.namespace}:{pattern.name}", method.upper())
+                for method in methods
+                if method not in ("head", "options")
+            )
+    return endpoints
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def sample_image():
+    image_file = io.BytesIO()
+    Image.new("RGB", (10, 10)).save(image_file, format="PNG")
+    image_file.name = "crew.png"
+    image_file.seek(0)
+    return image_file
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class EndpointBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = create_dataset(flights=BENCHMARK_FLIGHTS)
+
+        cls.user = get_user_model().objects.create_user("user@test.com", PASSWORD)
+        cls.admin = get_user_model().objects.create_superuser("admin@test.com", PASSWORD)
+
+        cls.flight = Flight.objects.select_related(
+            "route__source", "route__destination", "airplane"
+        ).first()
+        departure_time = timezone.now() + timedelta(days=1)
+        cls.empty_flight = Flight.objects.create(
+            route=cls.flight.route,
+            airplane=Airplane.objects.order_by("-rows").first(),
+            departure_time=departure_time,
+            arrival_time=departure_time + timedelta(hours=2),
+        )
+        cls.city = City.objects.first()
+        cls.crew = Crew.objects.first()
+        cls.schedule = FlightSchedule.objects.create(
+            route=cls.flight.route,
+            airplane=cls.empty_flight.airplane,
+            days_of_week="1234567",
+            departure_time=departure_time.time(),
+            duration=timedelta(hours=2),
+            valid_from=departure_time.date() + timedelta(days=2),
+            valid_until=departure_time.date() + timedelta(days=365),
+        )
+        cls.schedule.crews.add(cls.crew)
+        cls.edited_schedule = FlightSchedule.objects.create(
+            route=cls.flight.route,
+            airplane=cls.empty_flight.airplane,
+            days_of_week="7",
+            departure_time=departure_time.time(),
+            duration=timedelta(hours=2),
+            valid_from=departure_time.date() + timedelta(days=400),
+            valid_until=departure_time.date() + timedelta(days=500),
+        )
+
+        for flight in Flight.objects.all()[:5]:
+            order = Order.objects.create(user=cls.user)
+            for seat in range(1, flight.airplane.seats_in_row + 1):
+                Ticket.objects.create(
+                    order=order, flight=flight, row=flight.airplane.rows, seat=seat
+                )
+        reservation = Reservation.objects.create(
+            user=cls.user, expires_at=timezone.now() + timedelta(hours=1)
+        )
+        SeatHold.objects.create(
+            reservation=reservation, flight=cls.empty_flight, row=1, seat=4
+        )
+        with override_settings(ANALYTICS_ROLLUP_DELAY=timedelta(0)):
+            roll_up()
+
+    def setUp(self):
+        cache.clear()
+        throttle = mock.patch(
+            "rest_framework.throttling.SimpleRateThrottle.allow_request",
+            return_value=True,
+        )
+        throttle.start()
+        self.addCleanup(throttle.stop)
+
+        self.client = APIClient()
+
+    def endpoints(self):
+        """(url name, method, user, prepare, query budget) for every endpoint.
+
+        ``prepare`` gets the iteration number and returns the url kwargs and
+        the request payload; it runs before the request is measured.
+        """
+        flight = self.flight
+        route = flight.route
+        empty_flight = self.empty_flight
+
+        def reservation(iteration):
+            reservation = Reservation.objects.create(
+                user=self.user, expires_at=timezone.now() + timedelta(minutes=5)
+            )
+            SeatHold.objects.create(
+                reservation=reservation, flight=empty_flight, row=iteration + 1, seat=3
+            )
+            return {"pk": reservation.pk}, None
+
+        def new_flight(iteration):
+            # A spare airplane, so the legs posted don't break a rotation
+            airplane = Airplane.objects.create(
+                name=f"Spare airplane {iteration}",
+                rows=10,
+                seats_in_row=4,
+                airplane_type_id=flight.airplane.airplane_type_id,
+            )
+            return {}, {
+                "route": route.pk,
+                "airplane": airplane.pk,
+                "crews": [self.crew.pk],
+                "departure_time": flight.departure_time
+                + timedelta(days=400 + iteration),
+                "arrival_time": flight.arrival_time + timedelta(days=400 + iteration),
+            }
+
+        def schedule(iteration):
+            rows = [
+                json.dumps({
+                    "source": route.source.name,
+                    "destination": route.destination.name,
+                    "airplane": flight.airplane.name,
+                    "departure_time": (
+                        flight.departure_time + timedelta(days=500 + day)
+                    ).isoformat(),
+                    "arrival_time": (
+                        flight.arrival_time + timedelta(days=500 + day)
+                    ).isoformat(),
+                    "crews": [self.crew.pk],
+                })
+                for day in range(iteration * 10, iteration * 10 + 10)
+            ]
+            schedule_file = io.BytesIO("\n".join(rows).encode())
+            schedule_file.name = "schedule.ndjson"
+            return {}, {"file": schedule_file, "file_format": "ndjson"}
+
+        def schedule_data(iteration):
+            return {
+                "route": route.pk,
+                "airplane": empty_flight.airplane_id,
+                "crews": [self.crew.pk],
+                "days_of_week": "246",
+                "departure_time": f"{iteration % 24:02d}:05",
+                "duration": "03:00:00",
+                "valid_from": timezone.now().date().isoformat(),
+                "valid_until": (timezone.now() + timedelta(days=90)).date().isoformat(),
+            }
+
+        def refresh_token(iteration):
+            response = APIClient().post(
+                reverse("user:token_obtain_pair"),
+                {"email": self.user.email, "password": PASSWORD},
+            )
+            return {}, {"refresh": response.data["refresh"]}
+
+        def access_token(iteration):
+            _, data = refresh_token(iteration)
+            return {}, {"token": APIClient().post(
+                reverse("user:token_refresh"), data
+            ).data["access"]}
+
+        return [
+            ("airport:api-root", "GET", self.user, None, 0),
+            ("airport:country-list", "GET", self.user, None, 1),
+            ("airport:country-list", "POST", self.admin,
+             lambda i: ({}, {"name": f"New country {i}"}), 5),
+            ("airport:city-list", "GET", self.user, None, 1),
+            ("airport:city-list", "POST", self.admin,
+             lambda i: ({}, {"name": f"New city {i}", "country": self.city.country_id}), 5),
+            ("airport:airport-list", "GET", self.user, None, 1),
+            ("airport:airport-list", "POST", self.admin,
+             lambda i: ({}, {"name": f"New airport {i}", "closest_big_city": self.city.pk}), 5),
+            ("airport:airplanetype-list", "GET", self.user, None, 1),
+            ("airport:airplanetype-list", "POST", self.admin,
+             lambda i: ({}, {"name": f"New type {i}"}), 4),
+            ("airport:airplane-list", "GET", self.user, None, 1),
+            ("airport:airplane-list", "POST", self.admin,
+             lambda i: ({}, {
+                 "name": f"New airplane {i}",
+                 "rows": 10,
+                 "seats_in_row": 4,
+                 "airplane_type": AirplaneType.objects.first().pk,
+             }), 5),
+            ("airport:crew-list", "GET", self.user, None, 1),
+            ("airport:crew-list", "POST", self.admin,
+             lambda i: ({}, {"first_name": "New", "last_name": f"Crew {i}"}), 4),
+            ("airport:crew-upload-image", "POST", self.admin,
+             lambda i: ({"pk": self.crew.pk}, {"image": sample_image()}), 5),
+            ("airport:crew-conflicts", "GET", self.admin, None, 2),
+            ("airport:route-list", "GET", self.user, None, 1),
+            ("airport:route-list", "POST", self.admin,
+             lambda i: ({}, {
+                 "source": route.source_id,
+                 "destination": route.destination_id,
+                 "distance": 100 + i,
+             }), 7),
+            ("airport:route-detail", "GET", self.user,
+             lambda i: ({"pk": route.pk}, None), 1),
+            ("airport:route-connections", "GET", self.user,
+             lambda i: ({}, {
+                 "source": route.source_id,
+                 "destination_city": Airport.objects.last().closest_big_city_id,
+                 "k": 5,
+             }), 2),
+            ("airport:flight-list", "GET", self.user, None, 1),
+            ("airport:flight-list", "POST", self.admin, new_flight, 12),
+            ("airport:flight-import", "POST", self.admin, schedule, 15),
+            ("airport:flight-search", "GET", self.user,
+             lambda i: ({}, {
+                 "source": route.source_id,
+                 "destination_city": route.destination.closest_big_city_id,
+                 "date": flight.departure_time.date().isoformat(),
+             }), 5),
+            ("airport:flight-detail", "GET", self.user,
+             lambda i: ({"pk": flight.pk}, None), 2),
+            ("airport:flight-seat-map", "GET", self.user,
+             lambda i: ({"pk": flight.pk}, None), 2),
+            ("airport:flight-itineraries", "GET", self.user,
+             lambda i: ({}, {
+                 "source": route.source_id,
+                 "destination": route.destination_id,
+                 "date": flight.departure_time.date().isoformat(),
+             }), 5),
+            ("airport:flight-export", "GET", self.admin, None, 1),
+            ("airport:flight-manifest", "GET", self.admin,
+             lambda i: ({"pk": flight.pk}, {"file_format": "ndjson"}), 3),
+            ("airport:flightschedule-list", "GET", self.user, None, 2),
+            ("airport:flightschedule-list", "POST", self.admin,
+             lambda i: ({}, schedule_data(i)), 19),
+            ("airport:flightschedule-detail", "GET", self.user,
+             lambda i: ({"pk": self.schedule.pk}, None), 2),
+            ("airport:flightschedule-detail", "PUT", self.admin,
+             lambda i: ({"pk": self.edited_schedule.pk}, schedule_data(i)), 25),
+            ("airport:flightschedule-detail", "PATCH", self.admin,
+             lambda i: ({"pk": self.edited_schedule.pk}, {"days_of_week": "12345"}), 28),
+            ("airport:flightschedule-departures", "GET", self.user,
+             lambda i: ({}, {
+                 "source": route.source_id,
+                 "date_from": self.schedule.valid_from.isoformat(),
+                 "date_to": self.schedule.valid_until.isoformat(),
+             }), 3),
+            ("airport:flightschedule-materialize", "POST", self.user,
+             lambda i: ({"pk": self.schedule.pk}, {
+                 "departure_time": datetime.combine(
+                     self.schedule.valid_until - timedelta(days=i),
+                     self.schedule.departure_time,
+                     tzinfo=dt_timezone.utc,
+                 ),
+             }), 13),
+            ("airport:order-list", "GET", self.user, None, 2),
+            ("airport:order-list", "POST", self.user,
+             lambda i: ({}, {
+                 "tickets": [{"row": i + 1, "seat": 1, "flight": empty_flight.pk}],
+                 "created_at": timezone.now().strftime("%Y-%m-%d %H:%M"),
+             }), 19),
+            ("airport:order-export", "GET", self.admin, None, 1),
+            ("airport:reservation-list", "GET", self.user, None, 2),
+            ("airport:reservation-list", "POST", self.user,
+             lambda i: ({}, {
+                 "holds": [{"row": i + 1, "seat": 2, "flight": empty_flight.pk}],
+             }), 12),
+            ("airport:reservation-detail", "DELETE", self.user, reservation, 4),
+            ("airport:analytics-load-factor", "GET", self.admin, None, 1),
+            ("airport:analytics-airplane-types", "GET", self.admin, None, 1),
+            ("airport:analytics-top-routes", "GET", self.admin, None, 1),
+            ("user:create", "POST", None,
+             lambda i: ({}, {"email": f"new{i}@test.com", "password": PASSWORD}), 2),
+            ("user:token_obtain_pair", "POST", None,
+             lambda i: ({}, {"email": self.user.email, "password": PASSWORD}), 2),
+            ("user:token_refresh", "POST", None, refresh_token, 0),
+            ("user:token_verify", "POST", None, access_token, 0),
+            ("user:manage", "GET", self.user, None, 0),
+            ("user:manage", "PUT", self.user,
+             lambda i: ({}, {"email": self.user.email, "password": PASSWORD}), 3),
+            ("user:manage", "PATCH", self.user,
+             lambda i: ({}, {"password": PASSWORD}), 2),
+        ]
+
+    def measure(self, url_name, method, user, prepare):
+        queries, timings = [], []
+        for iteration in range(BENCHMARK_ITERATIONS):
+            kwargs, data = prepare(iteration) if prepare else ({}, None)
+            url = reverse(url_name, kwargs=kwargs)
+            self.client.force_authenticate(user)
+            if user is None:
+                self.client.logout()
+            else:
+                self.client.force_login(user)
+            request = getattr(self.client, method.lower())
+            request_format = (
+                "multipart" if url_name.endswith(("upload-image", "import")) else "json"
+            )
+
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                if method == "GET":
+                    response = request(url, data)
+                else:
+                    response = request(url, data, format=request_format)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            self.assertLess(
+                response.status_code,
+                300,
+                f"{method} {url}: {getattr(response, 'data', None)}",
+            )
+            queries.append(len(context.captured_queries))
+
+        return {
+            "queries": max(queries),
+            "p50_ms": round(percentile(timings, 0.5), 2),
+            "p95_ms": round(percentile(timings, 0.95), 2),
+        }
+
+    def test_every_endpoint_has_a_budget(self):
+        covered = {(url_name, method) for url_name, method, *_ in self.endpoints()}
+
+        self.assertEqual(api_endpoints() - covered, set())
+
+    def test_endpoints_stay_within_query_budget(self):
+        report = {}
+        for url_name, method, user, prepare, budget in self.endpoints():
+            result = self.measure(url_name, method, user, prepare)
+            result["query_budget"] = budget
+            report[f"{method} {url_name}"] = result
+
+        if BENCHMARK_REPORT:
+            with open(BENCHMARK_REPORT, "w") as report_file:
+                json.dump(
+                    {"dataset": self.dataset, "endpoints": report},
+                    report_file,
+                    indent=2,
+                    sort_keys=True,
+                )
+
+        for endpoint, result in report.items():
+            with self.subTest(endpoint=endpoint):
+                self.assertLessEqual(result["queries"], result["query_budget"])
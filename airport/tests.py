@@ -1,3 +1,2321 @@
-from django.test import TestCase
+import codecs
+import csv
+import importlib
+import io
+import json
+import os
+import threading
+import uuid
+from base64 import urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.backends.utils import CursorWrapper
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, F, QuerySet, Sum
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.throttling import UserRateThrottle
+
+from airport.models import (
+    Country,
+    City,
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Crew,
+    Flight,
+    FlightSchedule,
+    FlightSearchRow,
+    Order,
+    Ticket,
+    Reservation,
+    SeatHold,
+    DailyRouteLoad,
+    HourlySales,
+    OutboxMessage,
+    RollupWatermark,
+)
+from airport.analytics import rebuild_rollups, roll_up
+from airport.crew_roster import (
+    ASSIGNMENT_FIELDS,
+    Assignment,
+    season_conflicts,
+    sweep_conflicts,
+)
+from airport.outbox import HANDLERS, claim, drain, publish, run_workers
+from airport.parsers import ORJSONParser
+from airport.renderers import ORJSONRenderer
+from airport.reservations import lock_flights
+from airport.rotations import audit_rotations
+from airport.route_graph import RouteGraph, get_route_graph
+from airport.schedule_import import ScheduleImporter, read_schedule
+from airport.schedules import booking_horizon, is_occurrence, occurrences
+from airport.seat_counters import rebuild_seat_counters
+from airport.seat_map import SeatMap
+from airport.serializers import FlightSerializer, TicketSerializer
+
+FLIGHT_URL = reverse("airport:flight-list")
+ORDER_URL = reverse("airport:order-list")
+RESERVATION_URL = reverse("airport:reservation-list")
+
+
+def sample_flight(number, **params):
+    country = Country.objects.create(name=f"Country {number}")
+    source = Airport.objects.create(
+        name=f"Source {number}",
+        closest_big_city=City.objects.create(name=f"From {number}", country=country),
+    )
+    destination = Airport.objects.create(
+        name=f"Destination {number}",
+        closest_big_city=City.objects.create(name=f"To {number}", country=country),
+    )
+    departure_time = timezone.make_aware(datetime(2023, 9, 12, 10)) + timedelta(
+        days=number
+    )
+    defaults = {
+        "route": Route.objects.create(
+            source=source, destination=destination, distance=500
+        ),
+        "airplane": Airplane.objects.create(
+            name=f"Airplane {number}",
+            rows=20,
+            seats_in_row=6,
+            airplane_type=AirplaneType.objects.create(name=f"Type {number}"),
+        ),
+        "departure_time": departure_time,
+        "arrival_time": departure_time + timedelta(hours=2),
+    }
+    defaults.update(params)
+
+    return Flight.objects.create(**defaults)
+
+
+class OrderHistoryQueriesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.client.force_authenticate(self.user)
+
+    def create_orders(self, orders, tickets_per_order):
+        for number in range(orders):
+            order = Order.objects.create(user=self.user)
+            for seat in range(1, tickets_per_order + 1):
+                Ticket.objects.create(
+                    order=order,
+                    flight=sample_flight(Flight.objects.count()),
+                    row=1,
+                    seat=seat,
+                )
+
+    def test_order_list_query_count_does_not_grow_with_tickets(self):
+        self.create_orders(orders=1, tickets_per_order=1)
+        with self.assertNumQueries(2):
+            res = self.client.get(ORDER_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.create_orders(orders=5, tickets_per_order=4)
+        with self.assertNumQueries(2):
+            res = self.client.get(ORDER_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 6)
+
+        flight = res.data["results"][0]["tickets"][0]["flight"]
+        self.assertEqual(flight["route"], "From 17 - To 17")
+        self.assertEqual(flight["airplane_capacity"], 120)
+        self.assertEqual(flight["tickets_available"], 119)
+
+    def test_order_list_shows_only_own_orders(self):
+        other = get_user_model().objects.create_user("other@test.com", "testpass")
+        Order.objects.create(user=other)
+        self.create_orders(orders=2, tickets_per_order=1)
+
+        res = self.client.get(ORDER_URL)
+
+        self.assertEqual(len(res.data["results"]), 2)
+
+
+class SeatCounterTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.flight = sample_flight(1)
+        self.order = Order.objects.create(user=self.user)
+
+    def seats_sold(self):
+        self.flight.refresh_from_db()
+        return self.flight.seats_sold
+
+    def test_tickets_keep_counter_up_to_date(self):
+        ticket = Ticket.objects.create(
+            order=self.order, flight=self.flight, row=1, seat=1
+        )
+        Ticket.objects.create(order=self.order, flight=self.flight, row=1, seat=2)
+
+        self.assertEqual(self.seats_sold(), 2)
+        self.assertEqual(self.flight.tickets_available, 118)
+
+        ticket.delete()
+
+        self.assertEqual(self.seats_sold(), 1)
+
+    def test_rebuild_seat_counters_fixes_drift(self):
+        Ticket.objects.create(order=self.order, flight=self.flight, row=2, seat=3)
+        Flight.objects.filter(pk=self.flight.pk).update(seats_sold=50, seat_map=b"")
+
+        call_command("rebuild_seat_counters", stdout=io.StringIO())
+
+        self.assertEqual(self.seats_sold(), 1)
+        self.assertEqual(SeatMap.for_flight(self.flight).taken_places(), [(2, 3)])
+        self.assertEqual(
+            FlightSearchRow.objects.get(pk=self.flight.pk).seats_available, 119
+        )
+
+    def test_rebuild_seat_counters_locks_each_batch(self):
+        other = sample_flight(2)
+        Ticket.objects.create(order=self.order, flight=other, row=1, seat=1)
+        Flight.objects.update(seats_sold=0, seat_map=b"")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                rebuild_seat_counters(Flight.objects.all(), batch_size=1), 2
+            )
+
+        locks = [query["sql"] for query in queries if "FOR UPDATE" in query["sql"]]
+        self.assertEqual(len(locks), 2)
+        self.assertEqual(self.seats_sold(), 0)
+        other.refresh_from_db()
+        self.assertEqual(other.seats_sold, 1)
+        self.assertEqual(SeatMap.for_flight(other).taken_places(), [(1, 1)])
+
+
+class SeatMapTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight(1)
+        order = Order.objects.create(user=self.user)
+        for row, seat in ((1, 1), (3, 6), (20, 6)):
+            Ticket.objects.create(order=order, flight=self.flight, row=row, seat=seat)
+
+    def test_take_release_and_bytes_round_trip(self):
+        seat_map = SeatMap(rows=3, seats_in_row=3)
+        seat_map.take(1, 2)
+        seat_map.take(3, 3)
+        seat_map.release(1, 2)
+        seat_map.take(2, 1)
+
+        copy = SeatMap(3, 3, seat_map.to_bytes())
+
+        self.assertEqual(len(seat_map.to_bytes()), 2)
+        self.assertEqual(copy.taken_places(), [(2, 1), (3, 3)])
+        self.assertEqual(copy.to_rows(), ["000", "100", "001"])
+
+    def test_seat_map_endpoint(self):
+        res = self.client.get(
+            reverse("airport:flight-seat-map", args=[self.flight.pk])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["tickets_available"], 117)
+        self.assertEqual(res.data["seats"][0], "100000")
+        self.assertEqual(res.data["seats"][2], "000001")
+        self.assertEqual(res.data["seats"][19], "000001")
+
+    def test_flight_detail_lists_taken_places(self):
+        res = self.client.get(reverse("airport:flight-detail", args=[self.flight.pk]))
+
+        self.assertEqual(
+            res.data["taken_places"],
+            [{"row": 1, "seat": 1}, {"row": 3, "seat": 6}, {"row": 20, "seat": 6}],
+        )
+        self.assertEqual(res.data["seat_map"][2], "000001")
+
+    def test_migration_builds_the_same_bitmap(self):
+        self.flight.refresh_from_db()
+        seat_map = bytes(self.flight.seat_map)
+        Flight.objects.update(seat_map=b"")
+        migration = importlib.import_module("airport.migrations.0007_flight_seat_map")
+
+        migration.fill_seat_map(django_apps, None)
+
+        self.flight.refresh_from_db()
+        self.assertEqual(bytes(self.flight.seat_map), seat_map)
+
+    def test_resizing_the_airplane_moves_taken_seats(self):
+        airplane = self.flight.airplane
+        airplane.rows, airplane.seats_in_row = 21, 8
+
+        airplane.save()
+
+        self.flight.refresh_from_db()
+        self.assertEqual(
+            SeatMap.for_flight(self.flight).taken_places(),
+            [(1, 1), (3, 6), (20, 6)],
+        )
+        self.assertEqual(self.flight.seats_sold, 3)
+        self.assertEqual(
+            FlightSearchRow.objects.get(pk=self.flight.pk).seats_available, 165
+        )
+
+    def test_airplane_cannot_lose_sold_seats(self):
+        airplane = self.flight.airplane
+        airplane.seats_in_row = 5
+
+        with self.assertRaises(ValidationError):
+            airplane.save()
+
+        airplane.refresh_from_db()
+        self.assertEqual(airplane.seats_in_row, 6)
+
+
+class DuplicateFlightMigrationTests(TransactionTestCase):
+    migrate_from = [("airport", "0011_keyset_pagination_indexes")]
+    migrate_to = [("airport", "0012_flight_airplane_departure_unique")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.migrate_from)
+        self.apps = self.executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        call_command("flush", interactive=False, verbosity=0)
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.migrate_to)
+
+    def flights(self, copies):
+        Flight = self.apps.get_model("airport", "Flight")
+        country = self.apps.get_model("airport", "Country").objects.create(
+            name="Country"
+        )
+        city = self.apps.get_model("airport", "City").objects.create(
+            name="City", country=country
+        )
+        airport = self.apps.get_model("airport", "Airport").objects.create(
+            name="Airport", closest_big_city=city
+        )
+        route = self.apps.get_model("airport", "Route").objects.create(
+            source=airport, destination=airport, distance=100
+        )
+        airplane = self.apps.get_model("airport", "Airplane").objects.create(
+            name="Airplane",
+            rows=1,
+            seats_in_row=2,
+            airplane_type=self.apps.get_model(
+                "airport", "AirplaneType"
+            ).objects.create(name="Type"),
+        )
+        departure = datetime(2023, 9, 12, 10, tzinfo=dt_timezone.utc)
+        return [
+            Flight.objects.create(
+                route=route,
+                airplane=airplane,
+                departure_time=departure,
+                arrival_time=departure + timedelta(hours=2),
+            )
+            for _ in range(copies)
+        ]
+
+    def sell(self, flight, seat):
+        Order = self.apps.get_model("airport", "Order")
+        self.apps.get_model("airport", "Ticket").objects.create(
+            order=Order.objects.create(
+                user_id=get_user_model().objects.get_or_create(
+                    email="user@test.com"
+                )[0].pk
+            ),
+            flight=flight,
+            row=1,
+            seat=seat,
+        )
+
+    def test_copies_are_merged_into_the_flight_with_tickets(self):
+        first, sold, third = self.flights(3)
+        self.sell(sold, 1)
+        Crew = self.apps.get_model("airport", "Crew")
+        first.crews.add(Crew.objects.create(first_name="A", last_name="A"))
+        third.crews.add(Crew.objects.create(first_name="B", last_name="B"))
+
+        self.migrate()
+
+        Flight = self.apps.get_model("airport", "Flight")
+        self.assertEqual(list(Flight.objects.values_list("id", flat=True)), [sold.pk])
+        self.assertEqual(
+            sorted(sold.crews.values_list("first_name", flat=True)), ["A", "B"]
+        )
+        self.assertEqual(sold.tickets.count(), 1)
+
+    def test_copies_with_tickets_stop_the_migration(self):
+        first, second = self.flights(2)
+        self.sell(first, 1)
+        self.sell(second, 2)
+
+        with self.assertRaisesMessage(RuntimeError, f"{first.pk}, {second.pk}"):
+            self.migrate()
+
+
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flights = [sample_flight(1), sample_flight(2)]
+
+    def tickets(self, *places):
+        return [
+            {"flight": self.flights[flight].pk, "row": row, "seat": seat}
+            for flight, row, seat in places
+        ]
+
+    def order(self, *places):
+        return self.client.post(
+            ORDER_URL,
+            {"tickets": self.tickets(*places), "created_at": "2023-09-01 10:00"},
+            format="json",
+        )
+
+    def test_tickets_of_an_order_are_booked_together(self):
+        res = self.order((0, 1, 1), (0, 1, 2), (1, 5, 5))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ticket.objects.count(), 3)
+        self.flights[0].refresh_from_db()
+        self.assertEqual(self.flights[0].seats_sold, 2)
+
+    def test_duplicate_seats_are_reported_per_ticket(self):
+        res = self.order((0, 1, 1), (1, 1, 1), (0, 1, 1))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["tickets"],
+            [
+                {},
+                {},
+                {
+                    "non_field_errors": [
+                        "The fields flight, row, seat must make a unique set."
+                    ]
+                },
+            ],
+        )
+        self.assertEqual(res.data["tickets"][2]["non_field_errors"][0].code, "unique")
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_seats_out_of_range_are_rejected(self):
+        res = self.order((0, 21, 1))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("row", res.data["tickets"][0])
+
+    def test_validation_queries_do_not_grow_with_tickets(self):
+        places = [(number % 2, number // 6 + 1, number % 6 + 1) for number in range(30)]
+        serializer = TicketSerializer(data=self.tickets(*places), many=True)
+
+        # flights with airplanes, sold seats are checked under the lock
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.other = get_user_model().objects.create_user("other@test.com", "testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight(1)
+
+    def hold(self, client, seat):
+        return client.post(
+            RESERVATION_URL,
+            {"holds": [{"flight": self.flight.pk, "row": 1, "seat": seat}]},
+            format="json",
+        )
+
+    def order(self, client, seat):
+        return client.post(
+            ORDER_URL,
+            {
+                "tickets": [{"flight": self.flight.pk, "row": 1, "seat": seat}],
+                "created_at": "2023-09-01 10:00",
+            },
+            format="json",
+        )
+
+    def other_client(self):
+        client = APIClient()
+        client.force_authenticate(self.other)
+        return client
+
+    def test_held_seat_is_a_conflict_for_others(self):
+        res = self.hold(self.client, seat=1)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.order(self.other_client(), seat=1)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            res.data["seats"], [{"flight": self.flight.pk, "row": 1, "seat": 1}]
+        )
+        self.assertEqual(self.hold(self.other_client(), 1).status_code, 409)
+
+    def test_holder_orders_the_seat_and_drops_the_hold(self):
+        self.hold(self.client, seat=1)
+
+        res = self.order(self.client, seat=1)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_sold_seat_is_a_conflict(self):
+        self.order(self.client, seat=1)
+
+        res = self.order(self.other_client(), seat=1)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.hold(self.other_client(), 1).status_code, 409)
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_expired_hold_does_not_block(self):
+        self.hold(self.client, seat=1)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.hold(self.other_client(), 1).status_code, 201)
+        self.assertEqual(SeatHold.objects.get().reservation.user, self.other)
+        res = self.client.get(RESERVATION_URL)
+        self.assertEqual(res.data, [])
+
+    def test_release_expired_holds_command(self):
+        self.hold(self.client, seat=1)
+        self.hold(self.client, seat=2)
+        Reservation.objects.filter(holds__seat=1).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        out = io.StringIO()
+
+        call_command("release_expired_holds", stdout=out)
+
+        self.assertIn("Released 1 expired seat holds", out.getvalue())
+        self.assertEqual(list(SeatHold.objects.values_list("seat", flat=True)), [2])
+
+    def test_cancelled_reservation_frees_the_seat(self):
+        reservation = self.hold(self.client, seat=1).data["id"]
+
+        res = self.client.delete(
+            reverse("airport:reservation-detail", args=[reservation])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.order(self.other_client(), 1).status_code, 201)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    def test_booking_waits_for_a_concurrent_one_instead_of_failing(self):
+        user = get_user_model().objects.create_user("user@test.com", "testpass")
+        flight = sample_flight(1)
+        client = APIClient()
+        client.force_authenticate(user)
+        responses = []
+
+        def book():
+            try:
+                responses.append(
+                    client.post(
+                        ORDER_URL,
+                        {
+                            "tickets": [{"flight": flight.pk, "row": 1, "seat": 2}],
+                            "created_at": "2023-09-01 10:00",
+                        },
+                        format="json",
+                    )
+                )
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            lock_flights([flight.pk])
+            booking = threading.Thread(target=book)
+            booking.start()
+            booking.join(0.5)
+            self.assertTrue(booking.is_alive())
+        booking.join()
+
+        self.assertEqual(responses[0].status_code, status.HTTP_201_CREATED)
+
+
+class NameFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("user@test.com", "testpass")
+        )
+        self.flight = sample_flight(1)
+        self.route = self.flight.route
+        self.back = Route.objects.create(
+            source=self.route.destination, destination=self.route.source, distance=500
+        )
+
+    def test_city_to_filters_by_destination_city(self):
+        res = self.client.get(reverse("airport:route-list"), {"city_to": "to 1"})
+
+        self.assertEqual(
+            [route["id"] for route in res.data["results"]], [self.route.pk]
+        )
+
+        res = self.client.get(reverse("airport:route-list"), {"city_from": "to 1"})
+
+        self.assertEqual(
+            [route["id"] for route in res.data["results"]], [self.back.pk]
+        )
+
+    def test_airport_filters_ignore_case(self):
+        sample_flight(2)
+
+        res = self.client.get(
+            reverse("airport:flight-list"),
+            {"airport_from": "SOURCE 1", "airport_to": "destination"},
+        )
+
+        self.assertEqual(
+            [flight["id"] for flight in res.data["results"]], [self.flight.pk]
+        )
+
+    def test_name_filters_can_use_trigram_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                self.skipTest("pg_trgm is not installed")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        plan = Airport.objects.filter(name__icontains="ource").explain()
+        self.assertIn("airport_airport_name_trgm", plan)
+
+        plan = City.objects.filter(name__icontains="rom").explain()
+        self.assertIn("airport_city_name_trgm", plan)
+
+
+class DepartureRangeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("user@test.com", "testpass")
+        )
+        self.morning = sample_flight(1)
+        self.midnight = sample_flight(
+            2, departure_time=datetime(2023, 9, 14, tzinfo=dt_timezone.utc)
+        )
+        self.next_day = sample_flight(
+            3, departure_time=self.morning.departure_time + timedelta(days=1)
+        )
+
+    def flights(self, **params):
+        res = self.client.get(reverse("airport:flight-list"), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [flight["id"] for flight in res.data["results"]]
+
+    def test_date_is_a_half_open_day(self):
+        self.assertEqual(self.flights(date="2023-09-13"), [self.morning.pk])
+        self.assertEqual(
+            self.flights(date="2023-09-14"), [self.midnight.pk, self.next_day.pk]
+        )
+
+    def test_date_from_and_date_to(self):
+        self.assertEqual(
+            self.flights(date_from="2023-09-13T12:00", date_to="2023-09-14"),
+            [self.midnight.pk, self.next_day.pk],
+        )
+        self.assertEqual(
+            self.flights(date_to="2023-09-14T00:00"), [self.morning.pk]
+        )
+        self.assertEqual(
+            self.flights(date_from="2023-09-14", date_to="2023-09-14T06:00"),
+            [self.midnight.pk],
+        )
+
+    def test_invalid_input_is_rejected(self):
+        for params in (
+            {"date": "2023-09-13T10:00"},
+            {"date": "2023-13-01"},
+            {"date_from": "tomorrow"},
+            {"date_to": "2023-09-14T25:00"},
+        ):
+            res = self.client.get(reverse("airport:flight-list"), params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertEqual(list(res.data), list(params))
+
+
+class RouteGraphTests(TestCase):
+    # City 1 has airports 1 and 2, city 2 has airports 3 and 4, 5 is a hub
+    AIRPORTS = [(1, "A1", 1), (2, "A2", 1), (3, "B3", 2), (4, "B4", 2), (5, "H5", 3)]
+    ROUTES = [
+        (10, 1, 3, 100),
+        (11, 2, 4, 80),
+        (12, 1, 5, 50),
+        (13, 5, 3, 40),
+        (14, 2, 5, 10),
+    ]
+
+    def setUp(self):
+        self.graph = RouteGraph(self.ROUTES, self.AIRPORTS)
+
+    def route_ids(self, itineraries):
+        return [
+            [leg["id"] for leg in itinerary["routes"]] for itinerary in itineraries
+        ]
+
+    def test_k_shortest_paths_between_cities(self):
+        itineraries = self.graph.shortest_paths(
+            self.graph.city_airports[1], self.graph.city_airports[2], k=4
+        )
+
+        self.assertEqual(
+            self.route_ids(itineraries), [[14, 13], [11], [12, 13], [10]]
+        )
+        self.assertEqual(
+            [itinerary["distance"] for itinerary in itineraries], [50, 80, 90, 100]
+        )
+        self.assertEqual(itineraries[0]["routes"][0]["source"], "A2")
+
+    def test_paths_by_number_of_legs(self):
+        itineraries = self.graph.shortest_paths({1, 2}, {3, 4}, k=3, by="legs")
+
+        self.assertEqual([itinerary["legs"] for itinerary in itineraries], [1, 1, 2])
+
+    def test_paths_stay_between_source_and_target_airports(self):
+        graph = RouteGraph(
+            self.ROUTES + [(15, 3, 4, 5), (16, 1, 2, 1)], self.AIRPORTS
+        )
+
+        itineraries = graph.shortest_paths({1, 2}, {3, 4}, k=10)
+
+        # Virtual start and finish legs are not returned, and no path goes
+        # on from a target or back to a source airport
+        self.assertEqual(
+            self.route_ids(itineraries), [[14, 13], [11], [12, 13], [10]]
+        )
+
+    def test_unreachable_target(self):
+        self.assertEqual(self.graph.shortest_paths({3}, {1}), [])
+
+    def test_graph_is_rebuilt_after_route_changes(self):
+        flight = sample_flight(1)
+        graph = get_route_graph()
+        self.assertIs(get_route_graph(), graph)
+
+        Route.objects.create(
+            source=flight.route.destination,
+            destination=flight.route.source,
+            distance=1,
+        )
+
+        rebuilt = get_route_graph()
+        self.assertIsNot(rebuilt, graph)
+        self.assertEqual(len(rebuilt.adjacency[flight.route.destination_id]), 1)
+
+    def test_graph_expires_without_shared_invalidation(self):
+        graph = get_route_graph()
+
+        with override_settings(ROUTE_GRAPH_TTL=0):
+            self.assertIsNot(get_route_graph(), graph)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("user@test.com", "testpass")
+        )
+        self.flights = [sample_flight(number) for number in range(5)]
+        # two flights at the same time, ordered by id
+        Flight.objects.filter(pk=self.flights[3].pk).update(
+            departure_time=self.flights[2].departure_time
+        )
+
+    def page(self, url, **params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_forward_and_backward(self):
+        first = self.page(FLIGHT_URL, page_size=2)
+        second = self.page(first["next"])
+        third = self.page(second["next"])
+
+        self.assertEqual(
+            [
+                [flight["id"] for flight in page["results"]]
+                for page in (first, second, third)
+            ],
+            [
+                [self.flights[0].pk, self.flights[1].pk],
+                [self.flights[2].pk, self.flights[3].pk],
+                [self.flights[4].pk],
+            ],
+        )
+        self.assertIsNone(first["previous"])
+        self.assertIsNone(third["next"])
+        self.assertEqual(self.page(third["previous"])["results"], second["results"])
+        self.assertEqual(self.page(second["previous"])["results"], first["results"])
+
+    def test_tampered_cursor(self):
+        for cursor in (
+            "not a cursor",
+            urlsafe_b64encode(b'{"r": 0, "p": [1]}').decode(),
+            urlsafe_b64encode(b'{"r": 0, "p": ["tomorrow", 1]}').decode(),
+        ):
+            res = self.client.get(FLIGHT_URL, {"cursor": cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, cursor)
+            self.assertEqual(res.data, {"cursor": "Invalid cursor"})
+
+
+class CachedListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("user@test.com", "testpass")
+        )
+        self.city = City.objects.create(
+            name="City", country=Country.objects.create(name="Country")
+        )
+        Airport.objects.create(name="Airport", closest_big_city=self.city)
+
+    def test_not_modified(self):
+        url = reverse("airport:airport-list")
+        etag = self.client.get(url)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code,
+            status.HTTP_200_OK,
+        )
+
+    def test_writes_invalidate_lists_of_the_model(self):
+        airports = reverse("airport:airport-list")
+        airplane_types = reverse("airport:airplanetype-list")
+        etag = self.client.get(airports)["ETag"]
+        self.client.get(airplane_types)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.name = "Renamed"
+            self.city.save()
+
+        res = self.client.get(airports, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["closest_big_city"], "Renamed")
+        with self.assertNumQueries(0):
+            self.client.get(airplane_types)
+
+    @override_settings(ALLOWED_HOSTS=["testserver", "cdn.test"])
+    def test_absolute_urls_are_cached_per_origin(self):
+        Crew.objects.create(first_name="A", last_name="B", image="crew/a.jpg")
+        url = reverse("airport:crew-list")
+
+        images = [
+            self.client.get(url, **headers).data[0]["image"]
+            for headers in ({}, {"HTTP_HOST": "cdn.test"}, {"secure": True})
+        ]
+
+        self.assertEqual(
+            images,
+            [
+                "http://testserver/media/crew/a.jpg",
+                "http://cdn.test/media/crew/a.jpg",
+                "https://testserver/media/crew/a.jpg",
+            ],
+        )
+
+
+class ItineraryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("user@test.com", "testpass")
+        )
+        country = Country.objects.create(name="Country")
+        self.airports = [
+            Airport.objects.create(
+                name=name,
+                closest_big_city=City.objects.create(name=name, country=country),
+            )
+            for name in ("A", "B", "C")
+        ]
+        self.airplane = Airplane.objects.create(
+            name="Airplane",
+            rows=1,
+            seats_in_row=2,
+            airplane_type=AirplaneType.objects.create(name="Type"),
+        )
+        self.direct = self.flight("A", "C", "10:00", "12:00")
+        self.first_leg = self.flight("A", "B", "08:00", "09:00")
+        self.connection = self.flight("B", "C", "10:00", "11:00")
+        self.short_layover = self.flight("B", "C", "09:30", "10:30")
+        self.long_layover = self.flight("B", "C", "15:30", "16:30")
+
+    def flight(self, source, destination, departure, arrival):
+        source, destination = (
+            self.airports["ABC".index(name)] for name in (source, destination)
+        )
+        route, _ = Route.objects.get_or_create(
+            source=source, destination=destination, defaults={"distance": 100}
+        )
+        departure, arrival = (
+            datetime.fromisoformat(f"2023-09-12T{moment}+00:00")
+            for moment in (departure, arrival)
+        )
+        return Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name=f"Airplane {Flight.objects.count()}",
+                rows=1,
+                seats_in_row=2,
+                airplane_type=self.airplane.airplane_type,
+            ),
+            departure_time=departure,
+            arrival_time=arrival,
+        )
+
+    def search(self, **params):
+        params = {
+            "source": self.airports[0].pk,
+            "destination": self.airports[2].pk,
+            "date": "2023-09-12",
+            **params,
+        }
+        return self.client.get(reverse("airport:flight-itineraries"), params)
+
+    def flight_ids(self, res):
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [
+            [flight["id"] for flight in itinerary["flights"]] for itinerary in res.data
+        ]
+
+    def test_connections_respect_default_layover_bounds(self):
+        self.assertEqual(
+            self.flight_ids(self.search()),
+            [[self.first_leg.pk, self.connection.pk], [self.direct.pk]],
+        )
+
+    def test_custom_layover_bounds(self):
+        res = self.search(min_layover=20, max_layover=420)
+
+        self.assertEqual(
+            self.flight_ids(res),
+            [
+                [self.first_leg.pk, self.short_layover.pk],
+                [self.first_leg.pk, self.connection.pk],
+                [self.direct.pk],
+                [self.first_leg.pk, self.long_layover.pk],
+            ],
+        )
+        self.assertEqual(
+            self.flight_ids(self.search(max_stops=0)), [[self.direct.pk]]
+        )
+
+    def test_full_flights_are_skipped(self):
+        Flight.objects.filter(pk=self.connection.pk).update(seats_sold=2)
+
+        self.assertEqual(self.flight_ids(self.search()), [[self.direct.pk]])
+
+    def test_one_query_per_leg(self):
+        self.search()
+
+        # the route graph is cached, A-B-C has two legs at most
+        with self.assertNumQueries(2):
+            self.search(max_stops=2)
+
+    def test_invalid_params(self):
+        for params in (
+            {"min_layover": 120, "max_layover": 60},
+            {"max_stops": 3},
+            {"date": "2023-09-12T08:00"},
+        ):
+            self.assertEqual(self.search(**params).status_code, 400, params)
+
+
+class SeedAirportTests(TransactionTestCase):
+    def seed(self, **options):
+        call_command(
+            "seed_airport",
+            countries=2,
+            cities_per_country=2,
+            routes_per_airport=2,
+            airplanes=4,
+            crews=20,
+            users=10,
+            flights=40,
+            load_factor=0.5,
+            chunk_size=10,
+            stdout=io.StringIO(),
+            **options,
+        )
+
+    def assert_seeded(self):
+        self.assertEqual(Airport.objects.count(), 4)
+        self.assertEqual(Flight.objects.count(), 40)
+        self.assertEqual(FlightSearchRow.objects.count(), 40)
+        self.assertEqual(Flight.crews.through.objects.count(), 160)
+        self.assertEqual(
+            sweep_conflicts(
+                Flight.crews.through.objects.values_list(*ASSIGNMENT_FIELDS)
+            ),
+            [],
+        )
+        sold = Flight.objects.aggregate(
+            sold=Sum("seats_sold"),
+            seats=Sum(F("airplane__rows") * F("airplane__seats_in_row")),
+        )
+        self.assertEqual(Ticket.objects.count(), sold["sold"])
+        self.assertAlmostEqual(sold["sold"] / sold["seats"], 0.5, delta=0.1)
+        self.assertFalse(
+            Flight.objects.annotate(ticket_count=Count("tickets"))
+            .exclude(ticket_count=F("seats_sold"))
+            .exists()
+        )
+
+    def test_seed(self):
+        self.seed()
+
+        self.assert_seeded()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_seed_in_workers(self):
+        with mock.patch.object(
+            connections, "close_all", wraps=connections.close_all
+        ) as close_all:
+            self.seed(workers=2)
+
+        # the parent connection is closed before the pool forks
+        close_all.assert_called()
+        self.assert_seeded()
+
+
+@override_settings(FLIGHT_BOOKING_WINDOW=timedelta(days=7))
+class FlightScheduleTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpass"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        flight = sample_flight(0)
+        self.route, self.airplane = flight.route, flight.airplane
+        self.crew = Crew.objects.create(first_name="A", last_name="B")
+        self.today = timezone.now().date()
+        self.horizon = booking_horizon()
+
+    def create_schedule(self):
+        res = self.client.post(
+            reverse("airport:flightschedule-list"),
+            {
+                "route": self.route.pk,
+                "airplane": self.airplane.pk,
+                "crews": [self.crew.pk],
+                "days_of_week": "1234567",
+                "departure_time": "10:00",
+                "duration": "02:00:00",
+                "valid_from": self.today + timedelta(days=1),
+                "valid_until": self.today + timedelta(days=30),
+            },
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return FlightSchedule.objects.get(pk=res.data["id"])
+
+    def edit(self, schedule, **fields):
+        res = self.client.patch(
+            reverse("airport:flightschedule-detail", args=[schedule.pk]), fields
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def departure(self, days, hour=10):
+        return datetime.combine(
+            self.today + timedelta(days=days), time(hour), dt_timezone.utc
+        )
+
+    def sell(self, flight):
+        Ticket.objects.create(
+            order=Order.objects.create(user=self.user), flight=flight, row=1, seat=1
+        )
+
+    def test_occurrences(self):
+        schedule = FlightSchedule(
+            days_of_week="135",
+            departure_time=time(10),
+            valid_from=date(2023, 9, 11),
+            valid_until=date(2023, 9, 17),
+        )
+
+        self.assertEqual(
+            [
+                moment.day
+                for moment in occurrences(
+                    schedule, date(2023, 9, 1), date(2023, 9, 30)
+                )
+            ],
+            [11, 13, 15],
+        )
+        self.assertTrue(
+            is_occurrence(
+                schedule, datetime(2023, 9, 13, 10, tzinfo=dt_timezone.utc)
+            )
+        )
+        self.assertFalse(
+            is_occurrence(
+                schedule, datetime(2023, 9, 14, 10, tzinfo=dt_timezone.utc)
+            )
+        )
+
+    def test_create_materializes_up_to_the_horizon(self):
+        schedule = self.create_schedule()
+
+        flights = schedule.flights.order_by("departure_time")
+        self.assertEqual(
+            [flight.departure_time for flight in flights],
+            [
+                self.departure(days)
+                for days in range(1, (self.horizon - self.today).days + 1)
+            ],
+        )
+        self.assertEqual(schedule.materialized_until, self.horizon)
+        self.assertEqual(list(flights[0].crews.all()), [self.crew])
+        self.assertTrue(FlightSearchRow.objects.filter(pk=flights[0].pk).exists())
+
+    def test_edit_moves_unsold_flights(self):
+        schedule = self.create_schedule()
+        sold = schedule.flights.get(departure_time=self.departure(2))
+        self.sell(sold)
+
+        self.edit(schedule, departure_time="12:00")
+
+        days = range(1, (self.horizon - self.today).days + 1)
+        self.assertEqual(
+            sorted(schedule.flights.values_list("departure_time", flat=True)),
+            [self.departure(day, hour=12) for day in days],
+        )
+        sold.refresh_from_db()
+        self.assertIsNone(sold.schedule_id)
+        self.assertEqual(sold.departure_time, self.departure(2))
+
+    def test_edit_updates_booked_occurrences(self):
+        schedule = self.create_schedule()
+        sold = schedule.flights.get(departure_time=self.departure(2))
+        self.sell(sold)
+        other = Crew.objects.create(first_name="C", last_name="D")
+
+        self.edit(schedule, duration="03:00:00", crews=[other.pk])
+
+        sold.refresh_from_db()
+        self.assertEqual(sold.schedule_id, schedule.pk)
+        self.assertEqual(sold.arrival_time, self.departure(2, hour=13))
+        self.assertEqual(list(sold.crews.all()), [other])
+        self.assertFalse(
+            schedule.flights.exclude(
+                arrival_time=F("departure_time") + timedelta(hours=3)
+            ).exists()
+        )
+
+    def test_edit_queries_do_not_grow_with_the_window(self):
+        counts = []
+        for days in (7, 21):
+            with override_settings(FLIGHT_BOOKING_WINDOW=timedelta(days=days)):
+                schedule = self.create_schedule()
+                with CaptureQueriesContext(connection) as queries:
+                    self.edit(schedule, duration="01:00:00")
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_departures(self):
+        self.create_schedule()
+        last_day = self.horizon + timedelta(days=2)
+
+        res = self.client.get(
+            reverse("airport:flightschedule-departures"),
+            {"date_from": self.today, "date_to": last_day},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), (last_day - self.today).days)
+        self.assertIsNotNone(res.data[0]["flight"])
+        self.assertEqual(
+            [departure["flight"] for departure in res.data[-2:]], [None, None]
+        )
+
+    def test_materialize(self):
+        schedule = self.create_schedule()
+        url = reverse("airport:flightschedule-materialize", args=[schedule.pk])
+        departure = self.departure((self.horizon - self.today).days + 3)
+
+        first = self.client.post(url, {"departure_time": departure})
+        again = self.client.post(url, {"departure_time": departure})
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data["id"], again.data["id"])
+        self.assertEqual(
+            Flight.objects.get(pk=first.data["id"]).schedule_id, schedule.pk
+        )
+        res = self.client.post(
+            url, {"departure_time": departure + timedelta(minutes=5)}
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_materialize_over_another_flight(self):
+        schedule = self.create_schedule()
+        departure = self.departure((self.horizon - self.today).days + 3)
+        sample_flight(1, airplane=self.airplane, departure_time=departure)
+
+        res = self.client.post(
+            reverse("airport:flightschedule-materialize", args=[schedule.pk]),
+            {"departure_time": departure},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(
+            schedule.flights.filter(departure_time=departure).exists()
+        )
+
+    def test_occurrences_overlapping_other_flights_are_skipped(self):
+        sample_flight(
+            1,
+            airplane=self.airplane,
+            departure_time=self.departure(3, hour=9),
+            arrival_time=self.departure(3, hour=11),
+        )
+
+        schedule = self.create_schedule()
+
+        self.assertFalse(
+            schedule.flights.filter(departure_time=self.departure(3)).exists()
+        )
+        self.assertTrue(
+            schedule.flights.filter(departure_time=self.departure(4)).exists()
+        )
+        res = self.client.post(
+            reverse("airport:flightschedule-materialize", args=[schedule.pk]),
+            {"departure_time": self.departure(3)},
+        )
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+    def test_busy_crews_are_left_out_of_materialized_flights(self):
+        busy = sample_flight(
+            1,
+            departure_time=self.departure(3, hour=9),
+            arrival_time=self.departure(3, hour=11),
+        )
+        busy.crews.add(self.crew)
+
+        schedule = self.create_schedule()
+
+        self.assertFalse(
+            schedule.flights.get(departure_time=self.departure(3)).crews.exists()
+        )
+        self.assertEqual(
+            list(schedule.flights.get(departure_time=self.departure(4)).crews.all()),
+            [self.crew],
+        )
+
+
+class FlightSearchViewTests(TestCase):
+    url = reverse("airport:flight-search")
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight(1)
+        self.params = {
+            "source": self.flight.route.source_id,
+            "destination_city": self.flight.route.destination.closest_big_city_id,
+            "date": "2023-09-13",
+        }
+
+    def test_search(self):
+        res = self.client.get(self.url, self.params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/json")
+        self.assertEqual(
+            [flight["id"] for flight in res.data["flights"]], [self.flight.pk]
+        )
+        self.assertEqual(res.data["flights"][0]["tickets_available"], 120)
+        self.assertEqual(
+            [airport["id"] for airport in res.data["airports"]["destination"]],
+            [self.flight.route.destination_id],
+        )
+
+    def test_invalid_params(self):
+        for params in (
+            {**self.params, "date": "2023-09-13T10:00"},
+            {"source": self.params["source"], "date": "2023-09-13"},
+            {**self.params, "limit": "many"},
+        ):
+            res = self.client.get(self.url, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_authentication_is_required(self):
+        self.client.force_authenticate(None)
+
+        res = self.client.get(self.url, self.params)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def access_token(self):
+        return self.client.post(
+            reverse("user:token_obtain_pair"),
+            {"email": "user@test.com", "password": "testpass"},
+        ).data["access"]
+
+    def test_jwt(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access_token()}")
+
+        self.assertEqual(
+            client.get(self.url, self.params).status_code, status.HTTP_200_OK
+        )
+
+    async def test_asgi(self):
+        token = await sync_to_async(self.access_token)()
+
+        res = await AsyncClient().get(
+            self.url, self.params, AUTHORIZATION=f"Bearer {token}"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()["flights"]), 1)
+
+    async def test_queries_run_one_after_another_on_one_thread(self):
+        execute = CursorWrapper.execute
+        threads = set()
+        running = []
+        overlapping = []
+
+        def record(cursor, *args, **kwargs):
+            threads.add(threading.get_ident())
+            overlapping.append(bool(running))
+            running.append(cursor)
+            try:
+                return execute(cursor, *args, **kwargs)
+            finally:
+                running.remove(cursor)
+
+        token = await sync_to_async(self.access_token)()
+        with mock.patch.object(CursorWrapper, "execute", record):
+            res = await AsyncClient().get(
+                self.url, self.params, AUTHORIZATION=f"Bearer {token}"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(len(overlapping), 3)
+        self.assertFalse(any(overlapping))
+        self.assertEqual(len(threads), 1)
+
+    def test_requests_are_throttled(self):
+        rates = {"user": "2/day", "anon": "2/day"}
+        with mock.patch.object(UserRateThrottle, "THROTTLE_RATES", rates):
+            statuses = [
+                self.client.get(self.url, self.params).status_code for _ in range(3)
+            ]
+
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class ScheduleImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser("admin@test.com", "testpass")
+        )
+        country = Country.objects.create(name="Country")
+        for name in ("Kyiv", "Lviv", "Odesa"):
+            Airport.objects.create(
+                name=name,
+                closest_big_city=City.objects.create(name=name, country=country),
+            )
+        self.airplane = Airplane.objects.create(
+            name="UR-1",
+            rows=1,
+            seats_in_row=2,
+            airplane_type=AirplaneType.objects.create(name="Type"),
+        )
+        self.crews = [
+            Crew.objects.create(first_name=name, last_name=name) for name in "AB"
+        ]
+
+    def row(self, **fields):
+        return {
+            "source": "Kyiv",
+            "destination": "Lviv",
+            "distance": 500,
+            "airplane": "UR-1",
+            "departure_time": "2023-09-12T10:00:00Z",
+            "arrival_time": "2023-09-12T11:00:00Z",
+            **fields,
+        }
+
+    def upload(self, content, file_format="csv"):
+        res = self.client.post(
+            reverse("airport:flight-import"),
+            {
+                "file": SimpleUploadedFile(f"schedule.{file_format}", content.encode()),
+                "file_format": file_format,
+            },
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def ndjson(self, *rows):
+        return self.upload(
+            "\n".join(json.dumps(row) for row in rows), file_format="ndjson"
+        )
+
+    def test_csv_rows_are_created_then_updated(self):
+        content = (
+            "source,destination,distance,airplane,departure_time,arrival_time\n"
+            "Kyiv,Lviv,500,UR-1,2023-09-12T10:00Z,{}\n"
+            "Lviv,Kyiv,500,UR-1,2023-09-12T13:00Z,2023-09-12T14:00Z\n"
+        )
+
+        created = self.upload(content.format("2023-09-12T11:00Z"))
+        updated = self.upload(content.format("2023-09-12T11:30Z"))
+
+        self.assertEqual(created, {"created": 2, "updated": 0, "errors": []})
+        self.assertEqual(updated, {"created": 0, "updated": 2, "errors": []})
+        self.assertEqual(Route.objects.count(), 2)
+        self.assertEqual(
+            Flight.objects.order_by("departure_time").first().arrival_time,
+            datetime(2023, 9, 12, 11, 30, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(FlightSearchRow.objects.count(), 2)
+
+    def test_crews_are_replaced_only_when_listed(self):
+        first, second = self.crews
+        self.ndjson(self.row(crews=[first.pk]))
+        flight = Flight.objects.get()
+
+        self.ndjson(self.row(crews=[second.pk, second.pk]))
+        self.assertEqual(list(flight.crews.all()), [second])
+
+        self.ndjson(self.row())
+        self.assertEqual(list(flight.crews.all()), [second])
+
+    def test_row_errors(self):
+        result = self.ndjson(
+            self.row(source="Dnipro"),
+            self.row(airplane="UR-2"),
+            self.row(crews=[0]),
+            {
+                name: value
+                for name, value in self.row(destination="Odesa").items()
+                if name != "distance"
+            },
+            self.row(),
+            self.row(arrival_time="2023-09-12T12:00:00Z"),
+        )
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(
+            [(error["row"], list(error["errors"])) for error in result["errors"]],
+            [
+                (1, ["source"]),
+                (2, ["airplane"]),
+                (3, ["crews"]),
+                (4, ["distance"]),
+                (6, ["non_field_errors"]),
+            ],
+        )
+        self.assertEqual(
+            result["errors"][0]["errors"]["source"],
+            ["Airport 'Dnipro' does not exist."],
+        )
+        self.assertEqual(
+            result["errors"][1]["errors"]["airplane"],
+            ["Airplane 'UR-2' does not exist."],
+        )
+        self.assertEqual(
+            result["errors"][3]["errors"]["distance"],
+            ["Route does not exist, distance is required to create it."],
+        )
+        self.assertEqual(
+            result["errors"][4]["errors"]["non_field_errors"],
+            ["Airplane already departs at this time in row 5."],
+        )
+
+    def test_rows_before_an_unreadable_line_are_imported(self):
+        lines = codecs.iterdecode(
+            iter([json.dumps(self.row()).encode() + b"\n", b"\xff\n"]), "utf-8"
+        )
+
+        result = ScheduleImporter(batch_size=1).run(read_schedule(lines, "ndjson"))
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(result["errors"][0]["row"], 2)
+        self.assertIn("file", result["errors"][0]["errors"])
+        self.assertEqual(Flight.objects.count(), 1)
+
+    def test_rows_overlapping_other_legs_are_errors(self):
+        self.ndjson(self.row())
+        flight = Flight.objects.get()
+
+        result = self.ndjson(
+            self.row(
+                departure_time="2023-09-12T10:30:00Z",
+                arrival_time="2023-09-12T11:30:00Z",
+            ),
+            self.row(
+                source="Lviv",
+                destination="Kyiv",
+                departure_time="2023-09-12T13:00:00Z",
+                arrival_time="2023-09-12T15:00:00Z",
+            ),
+            self.row(
+                departure_time="2023-09-12T14:00:00Z",
+                arrival_time="2023-09-12T16:00:00Z",
+            ),
+        )
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual([error["row"] for error in result["errors"]], [1, 3])
+        self.assertEqual(
+            result["errors"][0]["errors"]["non_field_errors"],
+            [
+                f"Airplane is on flight {flight.pk} "
+                "from 2023-09-12 10:00 to 2023-09-12 11:00."
+            ],
+        )
+        self.assertEqual(
+            result["errors"][1]["errors"]["non_field_errors"],
+            [
+                "Airplane is on another new flight "
+                "from 2023-09-12 13:00 to 2023-09-12 15:00."
+            ],
+        )
+
+    def test_sold_flights_keep_their_route_and_arrival(self):
+        self.ndjson(self.row())
+        flight = Flight.objects.get()
+        Ticket.objects.create(
+            order=Order.objects.create(user=get_user_model().objects.get()),
+            flight=flight,
+            row=1,
+            seat=1,
+        )
+
+        moved = self.ndjson(self.row(arrival_time="2023-09-12T12:00:00Z"))
+        same = self.ndjson(self.row(crews=[self.crews[0].pk]))
+
+        self.assertEqual(moved["updated"], 0)
+        self.assertEqual(
+            moved["errors"][0]["errors"]["non_field_errors"],
+            [
+                f"Flight {flight.pk} has sold tickets, "
+                "its route and arrival time can't change."
+            ],
+        )
+        self.assertEqual(same, {"created": 0, "updated": 1, "errors": []})
+        flight.refresh_from_db()
+        self.assertEqual(
+            flight.arrival_time, datetime(2023, 9, 12, 11, tzinfo=dt_timezone.utc)
+        )
+
+    def test_rows_with_busy_crews_are_errors(self):
+        crew = self.crews[0]
+        Airplane.objects.create(
+            name="UR-2",
+            rows=1,
+            seats_in_row=2,
+            airplane_type=self.airplane.airplane_type,
+        )
+        self.ndjson(self.row(crews=[crew.pk]))
+        later = {
+            "departure_time": "2023-09-12T12:00:00Z",
+            "arrival_time": "2023-09-12T13:00:00Z",
+        }
+        self.ndjson(self.row(airplane="UR-2", crews=[crew.pk], **later))
+
+        busy = self.ndjson(
+            self.row(
+                airplane="UR-2",
+                departure_time="2023-09-12T10:30:00Z",
+                arrival_time="2023-09-12T11:30:00Z",
+                crews=[crew.pk],
+            )
+        )
+        moved = self.ndjson(self.row(arrival_time="2023-09-12T12:30:00Z"))
+
+        self.assertEqual(busy["created"], 0)
+        self.assertEqual(
+            busy["errors"][0]["errors"]["crews"],
+            [
+                f"Crew {crew.pk} is on another flight "
+                "from 2023-09-12 10:00 to 2023-09-12 11:00."
+            ],
+        )
+        self.assertEqual(moved["updated"], 0)
+        self.assertEqual(
+            moved["errors"][0]["errors"]["crews"],
+            [
+                f"Crew {crew.pk} is on another flight "
+                "from 2023-09-12 12:00 to 2023-09-12 13:00."
+            ],
+        )
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    def setUp(self):
+        with mock.patch.dict(os.environ, {"SECRET_KEY": "production"}):
+            self.prod = importlib.reload(
+                importlib.import_module("airport_service.settings.prod")
+            )
+
+    def test_debug_tools_are_not_loaded(self):
+        self.assertFalse(self.prod.DEBUG)
+        self.assertFalse(self.prod.DEBUG_TOOLBAR)
+        self.assertNotIn("debug_toolbar", self.prod.INSTALLED_APPS)
+        self.assertFalse(
+            any(path.startswith("debug_toolbar.") for path in self.prod.MIDDLEWARE)
+        )
+
+    def test_only_json_is_rendered(self):
+        self.assertEqual(
+            self.prod.REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"],
+            ["airport.renderers.ORJSONRenderer"],
+        )
+
+    def test_streaming_reads_bypass_pgbouncer(self):
+        self.assertEqual(self.prod.STREAMING_DB_ALIAS, "default")
+
+        environ = {"SECRET_KEY": "production", "DB_POOLER": "pgbouncer"}
+        with mock.patch.dict(os.environ, environ):
+            prod = importlib.reload(self.prod)
+
+        databases = prod.DATABASES
+        self.assertEqual(prod.STREAMING_DB_ALIAS, "direct")
+        self.assertEqual(databases["direct"]["HOST"], "db")
+        self.assertEqual(databases["direct"]["NAME"], databases["default"]["NAME"])
+        self.assertNotIn("DISABLE_SERVER_SIDE_CURSORS", databases["default"])
+
+
+class ORJSONTests(SimpleTestCase):
+    data = {
+        "id": 1,
+        "departure_time": datetime(2023, 9, 12, 10, 30, 5, 123456, dt_timezone.utc),
+        "date": date(2023, 9, 12),
+        "duration": timedelta(hours=2),
+        "distance": Decimal("512.50"),
+        "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "label": gettext_lazy("Airport"),
+        "name": "Zürich\u2028",
+        "seats": {1: [1, 2], 2: []},
+        "tickets": ({"row": 1, "seat": 2},),
+        "empty": None,
+    }
+
+    def test_renders_as_drf_json_renderer(self):
+        self.assertEqual(
+            ORJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+
+    def test_parses_rendered_json(self):
+        rendered = ORJSONRenderer().render(self.data)
+
+        parsed = ORJSONParser().parse(io.BytesIO(rendered))
+
+        self.assertEqual(parsed["departure_time"], "2023-09-12T10:30:05.123456Z")
+        self.assertEqual(parsed["distance"], 512.5)
+        self.assertEqual(parsed["seats"], {"1": [1, 2], "2": []})
+
+    def test_parses_other_encodings(self):
+        parsed = ORJSONParser().parse(
+            io.BytesIO('{"name": "Zürich"}'.encode("latin-1")),
+            parser_context={"encoding": "latin-1"},
+        )
+
+        self.assertEqual(parsed, {"name": "Zürich"})
+
+    def test_invalid_json_is_a_parse_error(self):
+        for body in (b'{"id": ', b'{"id": NaN}'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+
+class CrewConflictTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpass"
+        )
+        self.client.force_authenticate(self.admin)
+        self.crew = Crew.objects.create(first_name="Jane", last_name="Doe")
+        self.flight = sample_flight(1)
+        self.flight.crews.add(self.crew)
+
+    def flight_data(self, departure_time, hours=2):
+        return {
+            "route": self.flight.route_id,
+            "airplane": Airplane.objects.create(
+                name="Spare airplane",
+                rows=10,
+                seats_in_row=4,
+                airplane_type=self.flight.airplane.airplane_type,
+            ).pk,
+            "crews": [self.crew.pk],
+            "departure_time": departure_time,
+            "arrival_time": departure_time + timedelta(hours=hours),
+        }
+
+    def test_overlapping_flight_is_rejected(self):
+        res = self.client.post(
+            reverse("airport:flight-list"),
+            self.flight_data(self.flight.departure_time + timedelta(hours=1)),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f"flight {self.flight.pk}", res.data["crews"][0])
+
+    def test_flight_departing_on_arrival_is_accepted(self):
+        res = self.client.post(
+            reverse("airport:flight-list"),
+            self.flight_data(self.flight.arrival_time),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_flight_does_not_conflict_with_itself(self):
+        serializer = FlightSerializer(
+            self.flight,
+            data={"arrival_time": self.flight.arrival_time + timedelta(hours=1)},
+            partial=True,
+        )
+
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_sweep_reports_each_overlapping_flight(self):
+        start = timezone.make_aware(datetime(2024, 1, 1))
+        hour = timedelta(hours=1)
+        assignments = [
+            Assignment(1, 3, start + 3 * hour, start + 4 * hour),
+            Assignment(1, 1, start, start + 5 * hour),
+            Assignment(1, 2, start + hour, start + 2 * hour),
+            Assignment(1, 4, start + 5 * hour, start + 6 * hour),
+            Assignment(2, 5, start + hour, start + 2 * hour),
+        ]
+
+        conflicts = sweep_conflicts(assignments)
+
+        self.assertEqual(
+            [(conflict.flight.flight_id, conflict.overlapping.flight_id)
+             for conflict in conflicts],
+            [(2, 1), (3, 1)],
+        )
+
+    def test_conflicts_endpoint(self):
+        overlapping = sample_flight(
+            3,
+            departure_time=self.flight.departure_time + timedelta(minutes=30),
+            arrival_time=self.flight.arrival_time + timedelta(minutes=30),
+        )
+        overlapping.crews.add(self.crew)
+        day = self.flight.departure_time.date().isoformat()
+
+        res = self.client.get(
+            reverse("airport:crew-conflicts"), {"date_from": day, "date_to": day}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]["crew"], self.crew.pk)
+        self.assertEqual(res.data[0]["flight"]["flight"], overlapping.pk)
+        self.assertEqual(res.data[0]["overlapping"]["flight"], self.flight.pk)
+
+
+    def test_conflicts_with_flights_departing_earlier(self):
+        start = self.flight.departure_time
+        earlier = sample_flight(
+            3,
+            departure_time=start - timedelta(hours=11),
+            arrival_time=start + timedelta(hours=1),
+        )
+        earlier.crews.add(self.crew)
+        # in the air at midnight too, but overlapping outside the range
+        before = sample_flight(
+            4,
+            departure_time=start - timedelta(hours=12),
+            arrival_time=start - timedelta(hours=9, minutes=30),
+        )
+        before.crews.add(self.crew)
+
+        conflicts = season_conflicts(start.date(), start.date())
+
+        self.assertEqual(
+            [
+                (conflict.flight.flight_id, conflict.overlapping.flight_id)
+                for conflict in conflicts
+            ],
+            [(self.flight.pk, earlier.pk)],
+        )
+
+
+class RotationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser("admin@test.com", "testpass")
+        )
+        self.flight = sample_flight(1)
+        self.back = Route.objects.create(
+            source=self.flight.route.destination,
+            destination=self.flight.route.source,
+            distance=500,
+        )
+        self.crew = Crew.objects.create(first_name="John", last_name="Doe")
+
+    def post_leg(self, route, departure_time):
+        return self.client.post(
+            reverse("airport:flight-list"),
+            {
+                "route": route.pk,
+                "airplane": self.flight.airplane_id,
+                "crews": [self.crew.pk],
+                "departure_time": departure_time,
+                "arrival_time": departure_time + timedelta(hours=2),
+            },
+        )
+
+    def test_return_leg_is_accepted(self):
+        res = self.post_leg(self.back, self.flight.arrival_time + timedelta(hours=1))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_overlapping_leg_is_rejected(self):
+        res = self.post_leg(self.back, self.flight.arrival_time - timedelta(hours=1))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f"flight {self.flight.pk}", res.data["airplane"][0])
+
+    def test_leg_from_another_airport_is_rejected(self):
+        res = self.post_leg(
+            self.flight.route, self.flight.arrival_time + timedelta(hours=1)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data["airplane"]), 1)
+
+    def test_leg_before_must_land_where_next_departs(self):
+        res = self.post_leg(
+            self.flight.route, self.flight.departure_time - timedelta(hours=4)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.post_leg(self.back, self.flight.departure_time - timedelta(hours=4))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_audit_finds_overlaps_and_position_issues(self):
+        Flight.objects.create(
+            route=self.flight.route,
+            airplane=self.flight.airplane,
+            departure_time=self.flight.arrival_time - timedelta(hours=1),
+            arrival_time=self.flight.arrival_time + timedelta(hours=1),
+        )
+
+        issues = audit_rotations()
+
+        self.assertEqual(
+            sorted(issue.kind for issue in issues), ["overlap", "position"]
+        )
+        for issue in issues:
+            self.assertEqual(issue.previous.flight_id, self.flight.pk)
+
+
+class FlightSearchRowTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight(1)
+
+    def row(self):
+        return FlightSearchRow.objects.get(pk=self.flight.pk)
+
+    def test_row_follows_flight(self):
+        row = self.row()
+
+        self.assertEqual(row.route, "From 1 - To 1")
+        self.assertEqual(row.airplane_capacity, 120)
+        self.assertEqual(row.seats_available, 120)
+        self.assertEqual(row.departure_time, self.flight.departure_time)
+
+        self.flight.delete()
+
+        self.assertFalse(FlightSearchRow.objects.exists())
+
+    def test_row_cannot_outlive_its_flight(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM airport_flight WHERE id = %s", [self.flight.pk]
+                )
+            connection.check_constraints()
+
+        Flight.objects.filter(pk=self.flight.pk).delete()
+
+        self.assertFalse(FlightSearchRow.objects.exists())
+
+    def test_row_follows_ticket_sales(self):
+        order = Order.objects.create(user=self.user)
+        ticket = Ticket.objects.create(order=order, flight=self.flight, row=1, seat=1)
+
+        self.assertEqual(self.row().seats_available, 119)
+
+        ticket.delete()
+
+        self.assertEqual(self.row().seats_available, 120)
+
+    def test_row_follows_renamed_airport_and_city(self):
+        source = self.flight.route.source
+        source.name = "Renamed"
+        source.save()
+        source.closest_big_city.name = "Elsewhere"
+        source.closest_big_city.save()
+
+        row = self.row()
+        self.assertEqual(row.source_name, "Renamed")
+        self.assertEqual(row.route, "Elsewhere - To 1")
+
+    def test_list_is_served_from_rows(self):
+        sample_flight(2)
+        FlightSearchRow.objects.filter(pk=self.flight.pk).update(seats_available=7)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                reverse("airport:flight-list"), {"airport_from": "source 1"}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [flight["id"] for flight in res.data["results"]], [self.flight.pk]
+        )
+        self.assertEqual(res.data["results"][0]["tickets_available"], 7)
+        self.assertEqual(res.data["results"][0]["route"], "From 1 - To 1")
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@test.com", "testpass", first_name="Ann", last_name="Lee"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser("admin@test.com", "testpass")
+        )
+        self.flight = sample_flight(1)
+        self.order = Order.objects.create(user=self.user)
+        Ticket.objects.create(order=self.order, flight=self.flight, row=2, seat=3)
+        Order.objects.filter(pk=self.order.pk).update(
+            created_at=timezone.make_aware(datetime(2023, 9, 1, 10, 30))
+        )
+
+    def export(self, *args):
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            call_command("export_data", *args)
+        return stdout.getvalue()
+
+    def test_flights_csv(self):
+        lines = self.export("flights").splitlines()
+
+        self.assertEqual(
+            lines,
+            [
+                "id,source,destination,distance,airplane,departure_time,"
+                "arrival_time,capacity,seats_sold",
+                f"{self.flight.pk},Source 1,Destination 1,500,Airplane 1,"
+                "2023-09-13T10:00:00Z,2023-09-13T12:00:00Z,120,1",
+            ],
+        )
+
+    def test_orders_ndjson(self):
+        lines = self.export("orders", "--file-format", "ndjson").splitlines()
+
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [
+                {
+                    "id": self.order.pk,
+                    "created_at": "2023-09-01T10:30:00Z",
+                    "user": "user@test.com",
+                    "tickets": 1,
+                }
+            ],
+        )
+
+    def test_csv_and_ndjson_agree_on_values(self):
+        rows = list(csv.DictReader(io.StringIO(self.export("orders"))))
+        records = [
+            json.loads(line)
+            for line in self.export("orders", "--file-format", "ndjson").splitlines()
+        ]
+
+        self.assertEqual(
+            rows,
+            [{key: str(value) for key, value in record.items()} for record in records],
+        )
+
+    def test_manifest_endpoint(self):
+        url = reverse("airport:flight-manifest", args=[self.flight.pk])
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "text/csv")
+        self.assertEqual(
+            res["Content-Disposition"],
+            f'attachment; filename="manifest-{self.flight.pk}.csv"',
+        )
+        self.assertEqual(
+            b"".join(res.streaming_content).decode().splitlines(),
+            [
+                "row,seat,order,ordered_at,email,first_name,last_name",
+                f"2,3,{self.order.pk},2023-09-01T10:30:00Z,user@test.com,Ann,Lee",
+            ],
+        )
+
+    def test_manifest_needs_a_flight(self):
+        with self.assertRaisesMessage(CommandError, "--flight is required"):
+            self.export("manifest")
+
+    @override_settings(STREAMING_DB_ALIAS="replica")
+    def test_rows_are_read_from_streaming_alias(self):
+        aliases = []
+        using = QuerySet.using
+
+        def record_alias(queryset, alias):
+            aliases.append(alias)
+            return using(queryset, "default")
+
+        with mock.patch.object(QuerySet, "using", record_alias):
+            lines = self.export("flights").splitlines()
+
+        self.assertEqual(aliases, ["replica"])
+        self.assertEqual(len(lines), 2)
+
+
+@override_settings(ANALYTICS_ROLLUP_DELAY=timedelta(0))
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser("admin@test.com", "testpass")
+        )
+        self.flight = sample_flight(1)
+
+    def sell(self, *seats):
+        order = Order.objects.create(user=self.user)
+        for seat in seats:
+            Ticket.objects.create(order=order, flight=self.flight, row=1, seat=seat)
+
+    def test_only_new_tickets_are_rolled_up(self):
+        self.sell(1, 2)
+
+        self.assertEqual(roll_up(), (2, 1))
+
+        self.sell(3)
+
+        self.assertEqual(roll_up(), (1, 0))
+        load = DailyRouteLoad.objects.get()
+        self.assertEqual(
+            (load.date, load.flights, load.seats, load.seats_sold),
+            (date(2023, 9, 13), 1, 120, 3),
+        )
+        self.assertEqual(load.load_factor, 0.025)
+        self.assertEqual(HourlySales.objects.get().tickets, 3)
+
+    def test_recent_rows_wait_for_the_delay(self):
+        self.sell(1)
+
+        with override_settings(ANALYTICS_ROLLUP_DELAY=timedelta(minutes=1)):
+            self.assertEqual(roll_up(), (0, 0))
+
+        self.assertEqual(roll_up(), (1, 1))
+
+    def test_flights_committed_late_are_not_skipped(self):
+        # created first, but committed after the flight below was rolled up
+        late = sample_flight(2)
+        Flight.objects.filter(pk=late.pk).update(created_at=timezone.now())
+        Flight.objects.filter(pk=self.flight.pk).update(
+            created_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        with override_settings(ANALYTICS_ROLLUP_DELAY=timedelta(minutes=1)):
+            self.assertEqual(roll_up(), (0, 1))
+
+        self.assertEqual(roll_up(), (0, 1))
+        self.assertEqual(DailyRouteLoad.objects.count(), 2)
+
+    def test_rebuild_drops_refunded_tickets(self):
+        self.sell(1, 2)
+        roll_up()
+        Ticket.objects.filter(seat=2).delete()
+
+        self.assertEqual(rebuild_rollups(), (1, 1))
+
+        self.assertEqual(DailyRouteLoad.objects.get().seats_sold, 1)
+        self.assertEqual(HourlySales.objects.get().tickets, 1)
+
+    def test_rebuild_matches_roll_up(self):
+        self.sell(1, 2)
+        other = sample_flight(2)
+        Ticket.objects.create(
+            order=Order.objects.create(user=self.user), flight=other, row=1, seat=1
+        )
+        roll_up()
+        loads = DailyRouteLoad.objects.order_by("route").values_list(
+            "route", "date", "flights", "seats", "seats_sold"
+        )
+        sales = HourlySales.objects.order_by("route").values_list(
+            "hour", "route", "airplane_type", "tickets"
+        )
+        rolled_up = list(loads), list(sales)
+
+        self.assertEqual(rebuild_rollups(), (3, 2))
+
+        self.assertEqual((list(loads.all()), list(sales.all())), rolled_up)
+
+    def test_interrupted_rebuild_goes_on_from_the_last_route(self):
+        other = sample_flight(2)
+        for flight in (self.flight, other):
+            Ticket.objects.create(
+                order=Order.objects.create(user=self.user), flight=flight, row=1, seat=1
+            )
+        roll_up()
+        Ticket.objects.all().delete()
+        RollupWatermark.objects.create(name="rebuild", last_id=self.flight.route_id)
+
+        self.assertEqual(rebuild_rollups(), (0, 1))
+
+        self.assertEqual(
+            dict(DailyRouteLoad.objects.values_list("route", "seats_sold")),
+            {self.flight.route_id: 1, other.route_id: 0},
+        )
+        self.assertEqual(RollupWatermark.objects.get(name="rebuild").last_id, 0)
+
+    def test_endpoints(self):
+        self.sell(1, 2)
+        roll_up()
+
+        res = self.client.get(
+            reverse("airport:analytics-load-factor"), {"date_from": "2023-09-13"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["seats_sold"], 2)
+        self.assertEqual(res.data["results"][0]["route_name"], "From 1 - To 1")
+
+        res = self.client.get(reverse("airport:analytics-top-routes"))
+        self.assertEqual(
+            res.data,
+            [{"route": self.flight.route_id, "name": "From 1 - To 1", "tickets": 2}],
+        )
+
+        res = self.client.get(reverse("airport:analytics-airplane-types"))
+        self.assertEqual(res.data[0]["tickets"], 2)
+
+    def test_endpoints_are_admin_only(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(reverse("airport:analytics-top-routes"))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@test.com", "testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight(1)
+
+    def order(self, seat):
+        return self.client.post(
+            ORDER_URL,
+            {
+                "tickets": [{"row": 1, "seat": seat, "flight": self.flight.pk}],
+                "created_at": "2023-09-01 10:00",
+            },
+            format="json",
+        )
+
+    def test_order_confirmation_is_sent_by_the_worker(self):
+        res = self.order(seat=1)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.topic, "order.created")
+        self.assertEqual(message.payload, {"order": res.data["id"]})
+
+        self.assertEqual(drain(), 1)
+
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(mail.outbox[0].to, ["user@test.com"])
+        self.assertIn(
+            "From 1 - To 1, 2023-09-13 10:00 UTC, row 1, seat 1", mail.outbox[0].body
+        )
+
+    def test_rejected_order_publishes_nothing(self):
+        self.order(seat=1)
+
+        res = self.order(seat=1)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_claimed_messages_are_leased(self):
+        publish("order.created", {"order": 0})
+
+        self.assertEqual(len(claim()), 1)
+        self.assertEqual(claim(), [])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_delivery_is_retried_then_parked(self):
+        failing = mock.Mock(side_effect=RuntimeError("mail server down"))
+        publish("test", {})
+
+        with mock.patch.dict(HANDLERS, {"test": failing}):
+            self.assertEqual(drain(), 0)
+            message = OutboxMessage.objects.get()
+            self.assertEqual(message.attempts, 1)
+            self.assertIn("mail server down", message.last_error)
+            self.assertIsNone(message.failed_at)
+            self.assertEqual(claim(), [])
+
+            OutboxMessage.objects.update(available_at=timezone.now())
+            drain()
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.attempts, 2)
+        self.assertIsNotNone(message.failed_at)
+        self.assertEqual(failing.call_count, 2)
+
+    def test_failed_batch_is_retried_per_message(self):
+        def send(payloads):
+            if any(payload["bad"] for payload in payloads):
+                raise ValueError("bad payload")
+
+        handler = mock.Mock(side_effect=send)
+        for bad in (False, True, False):
+            publish("test", {"bad": bad})
+
+        with mock.patch.dict(HANDLERS, {"test": handler}):
+            self.assertEqual(drain(), 2)
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.payload, {"bad": True})
+        self.assertEqual(message.attempts, 1)
+        self.assertIn("bad payload", message.last_error)
+        self.assertEqual(handler.call_count, 4)
+
+    def test_message_without_handler_is_parked(self):
+        publish("unknown", {})
+        publish("test", {})
+
+        with mock.patch.dict(HANDLERS, {"test": mock.Mock()}):
+            self.assertEqual(drain(), 1)
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.topic, "unknown")
+        self.assertEqual(message.attempts, 1)
+        self.assertIsNotNone(message.failed_at)
+        self.assertEqual(message.last_error, "No handler for topic 'unknown'")
+
+
+class OutboxWorkerTests(TransactionTestCase):
+    def poll(self, workers, polls):
+        stop = threading.Event()
+        counts = []
+        lock = threading.Lock()
+
+        def report(delivered):
+            with lock:
+                counts.append(delivered)
+                if len(counts) == 1:
+                    publish("test", {})
+                if len(counts) >= polls:
+                    stop.set()
+
+        for _ in range(2):
+            publish("test", {})
+        with mock.patch.dict(HANDLERS, {"test": mock.Mock()}):
+            delivered = run_workers(
+                workers, interval=0.01, stop=stop, report=report
+            )
+        return delivered, counts
+
+    def test_worker_polls_until_stopped(self):
+        delivered, counts = self.poll(workers=1, polls=2)
+
+        self.assertEqual(delivered, 3)
+        self.assertEqual(counts, [2, 1])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_worker_threads_are_started_once(self):
+        with mock.patch(
+            "airport.outbox.ThreadPoolExecutor", wraps=ThreadPoolExecutor
+        ) as pool:
+            delivered, counts = self.poll(workers=2, polls=6)
+
+        self.assertEqual(delivered, 3)
+        self.assertGreaterEqual(len(counts), 6)
+        pool.assert_called_once_with(2)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_worker_keeps_polling_after_an_error(self):
+        errors = [DatabaseError("connection lost")]
+
+        def flaky_claim(batch_size):
+            if errors:
+                raise errors.pop()
+            return claim(batch_size)
+
+        with mock.patch("airport.outbox.claim", side_effect=flaky_claim), \
+                self.assertLogs("airport.outbox", "ERROR") as logs:
+            delivered, counts = self.poll(workers=1, polls=2)
+
+        self.assertIn("connection lost", logs.output[0])
+        self.assertEqual(delivered, 3)
+        self.assertEqual(counts, [0, 3])
+        self.assertFalse(OutboxMessage.objects.exists())
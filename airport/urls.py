@@ -1,3 +1,4 @@
+from django.urls import path
 from rest_framework import routers
 from .views import (
     CountryViewSet,
@@ -8,7 +9,11 @@ from .views import (
     CrewViewSet,
     RouteViewSet,
     FlightViewSet,
+    FlightScheduleViewSet,
     OrderViewSet,
+    ReservationViewSet,
+    AnalyticsViewSet,
+    FlightSearchView,
 )
 
 router = routers.DefaultRouter()
@@ -20,8 +25,13 @@ router.register("airplanes", AirplaneViewSet)
 router.register("crews", CrewViewSet)
 router.register("routes", RouteViewSet)
 router.register("flights", FlightViewSet)
+router.register("flight_schedules", FlightScheduleViewSet)
 router.register("orders", OrderViewSet)
+router.register("reservations", ReservationViewSet)
+router.register("analytics", AnalyticsViewSet, basename="analytics")
 
-urlpatterns = router.urls
+urlpatterns = [
+    path("flights/search/", FlightSearchView.as_view(), name="flight-search"),
+] + router.urls
 
 app_name = "airport"
@@ -1,13 +1,21 @@
-from datetime import datetime
+import codecs
+from datetime import datetime, time, timedelta
 
-from django.db.models import F, Count, Q
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from .models import (
     Country,
@@ -18,9 +26,37 @@ from .models import (
     Route,
     Crew,
     Flight,
+    FlightSchedule,
     Order,
+    Ticket,
+    Reservation,
+    SeatHold,
+    FlightSearchRow,
+    DailyRouteLoad,
 )
+from .analytics import route_loads, sales_by_airplane_type, top_selling_routes
+from .caching import CachedListMixin
+from .crew_roster import season_conflicts
+from .exports import (
+    EXPORT_FORMATS,
+    FLIGHT_EXPORT,
+    MANIFEST_EXPORT,
+    ORDER_EXPORT,
+    streaming_export,
+)
+from .itineraries import search_itineraries
+from .pagination import KeysetPagination
 from .permisions import IsAdminOrIfAuthenticatedReadOnly
+from .route_graph import get_route_graph
+from .schedule_import import ScheduleImporter, read_schedule
+from .schedules import (
+    booking_horizon,
+    is_occurrence,
+    materialize_departure,
+    materialize_schedules,
+    reschedule,
+    scheduled_departures,
+)
 from .serializers import (
     CountrySerializer,
     CitySerializer,
@@ -33,19 +69,153 @@ from .serializers import (
     CrewSerializer,
     CrewListSerializer,
     CrewImageSerializer,
+    CrewConflictSerializer,
     RouteSerializer,
     RouteListSerializer,
     RouteDetailSerializer,
     FlightSerializer,
     FlightListSerializer,
+    FlightSearchRowSerializer,
     FlightDetailSerializer,
+    FlightSeatMapSerializer,
+    ItinerarySerializer,
+    ScheduleImportSerializer,
+    ScheduleImportResultSerializer,
+    FlightScheduleSerializer,
+    FlightScheduleListSerializer,
+    ScheduledDepartureSerializer,
+    MaterializeDepartureSerializer,
     OrderSerializer,
     OrderListSerializer,
+    ReservationSerializer,
+    DailyRouteLoadSerializer,
+    AirplaneTypeSalesSerializer,
+    RouteSalesSerializer,
 )
 
 
+def int_param(params, name, default=None):
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "A valid integer is required."})
+
+
+def date_param(params, name, default=None):
+    value = params.get(name)
+    if value is None:
+        if default is None:
+            raise ValidationError({name: "This query parameter is required."})
+        return default
+
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: "Use YYYY-MM-DD format."})
+    return day
+
+
+def date_range_params(params, default_from=None, default_to=None):
+    """Read date_from and date_to, at most a year apart"""
+    date_from = date_param(params, "date_from", default=default_from)
+    date_to = date_param(params, "date_to", default=default_to or date_from)
+    if not date_from <= date_to <= date_from + timedelta(days=366):
+        raise ValidationError(
+            {"date_to": "date_to must be within a year after date_from."}
+        )
+    return date_from, date_to
+
+
+def export_format_param(params):
+    export_format = params.get("file_format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        raise ValidationError({"file_format": "Use csv or ndjson."})
+    return export_format
+
+
+EXPORT_PARAMETERS = [
+    OpenApiParameter(
+        name="file_format",
+        description="Export file format, csv by default (ex. ?file_format=ndjson)",
+        enum=list(EXPORT_FORMATS),
+        type=OpenApiTypes.STR
+    ),
+]
+
+
+def endpoint_airports(params, graph):
+    """Resolve source and destination airport ids from airport or city params"""
+    endpoints = []
+    for airport_param, city_param in (
+        ("source", "source_city"),
+        ("destination", "destination_city"),
+    ):
+        airport_id = int_param(params, airport_param)
+        city_id = int_param(params, city_param)
+        if airport_id is None and city_id is None:
+            raise ValidationError(
+                {airport_param: f"Either {airport_param} or {city_param} is required."}
+            )
+
+        airports = set(graph.city_airports.get(city_id, ()))
+        if airport_id is not None:
+            airports.add(airport_id)
+        endpoints.append(airports)
+
+    return endpoints
+
+
+ENDPOINT_PARAMETERS = [
+    OpenApiParameter(
+        name="source",
+        description="Id of departure airport (ex. ?source=1)",
+        type=OpenApiTypes.INT
+    ),
+    OpenApiParameter(
+        name="destination",
+        description="Id of destination airport (ex. ?destination=7)",
+        type=OpenApiTypes.INT
+    ),
+    OpenApiParameter(
+        name="source_city",
+        description="Depart from any airport of the city (ex. ?source_city=2)",
+        type=OpenApiTypes.INT
+    ),
+    OpenApiParameter(
+        name="destination_city",
+        description="Arrive to any airport of the city (ex. ?destination_city=5)",
+        type=OpenApiTypes.INT
+    ),
+]
+
+
+DEPARTURE_PARAMETERS = [
+    OpenApiParameter(
+        name="date_from",
+        description="First date of departure, today by default "
+        "(ex. ?date_from=2024-05-01)",
+        type=OpenApiTypes.DATE
+    ),
+    OpenApiParameter(
+        name="date_to",
+        description="Last date of departure, up to a year after date_from. "
+        "Defaults to date_from, or to the end of the booking window "
+        "without it (ex. ?date_to=2024-09-30)",
+        type=OpenApiTypes.DATE
+    ),
+]
+
+
 class CountryViewSet(
-    mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    CachedListMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
@@ -53,9 +223,13 @@ class CountryViewSet(
 
 
 class CityViewSet(
-    mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    CachedListMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = City.objects.select_related("country")
+    cache_models = (City, Country)
     serializer_class = CitySerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
@@ -67,9 +241,13 @@ class CityViewSet(
 
 
 class AirportViewSet(
-    mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    CachedListMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = Airport.objects.select_related("closest_big_city")
+    cache_models = (Airport, City)
     serializer_class = AirportSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
@@ -81,7 +259,10 @@ class AirportViewSet(
 
 
 class AirplaneTypeViewSet(
-    mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    CachedListMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = AirplaneType.objects.all()
     serializer_class = AirplaneTypeSerializer
@@ -89,9 +270,13 @@ class AirplaneTypeViewSet(
 
 
 class AirplaneViewSet(
-    mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    CachedListMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = Airplane.objects.select_related("airplane_type")
+    cache_models = (Airplane, AirplaneType)
     serializer_class = AirplaneSerializer
 
     def get_serializer_class(self):
@@ -102,7 +287,10 @@ class AirplaneViewSet(
 
 
 class CrewViewSet(
-    mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    CachedListMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = Crew.objects.all()
     serializer_class = CrewSerializer
@@ -115,6 +303,9 @@ class CrewViewSet(
         if self.action == "upload_image":
             return CrewImageSerializer
 
+        if self.action == "conflicts":
+            return CrewConflictSerializer
+
         return self.serializer_class
 
     @action(
@@ -132,6 +323,30 @@ class CrewViewSet(
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @extend_schema(parameters=DEPARTURE_PARAMETERS)
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="conflicts",
+        permission_classes=[IsAdminUser],
+    )
+    def conflicts(self, request):
+        """Endpoint for crews assigned to flights overlapping in time"""
+        params = request.query_params
+        date_from, date_to = date_range_params(
+            params,
+            default_from=timezone.now().date(),
+            default_to=None if "date_from" in params else booking_horizon(),
+        )
+        serializer = self.get_serializer(
+            season_conflicts(date_from, date_to), many=True
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class RoutePagination(KeysetPagination):
+    ordering = ("id",)
+
 
 class RouteViewSet(
     mixins.ListModelMixin,
@@ -144,6 +359,7 @@ class RouteViewSet(
         "destination",
     )
     serializer_class = RouteSerializer
+    pagination_class = RoutePagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
     def get_serializer_class(self):
@@ -179,7 +395,7 @@ class RouteViewSet(
 
         if city_to:
             self.queryset = self.queryset.filter(
-                source__closest_big_city__name__icontains=city_to
+                destination__closest_big_city__name__icontains=city_to
             )
 
         if route:
@@ -222,6 +438,45 @@ class RouteViewSet(
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(
+        parameters=ENDPOINT_PARAMETERS + [
+            OpenApiParameter(
+                name="k",
+                description="Number of itineraries to return, up to 10 (ex. ?k=3)",
+                type=OpenApiTypes.INT
+            ),
+            OpenApiParameter(
+                name="by",
+                description="Rank itineraries by total distance or number of legs "
+                "(ex. ?by=legs)",
+                enum=["distance", "legs"],
+                type=OpenApiTypes.STR
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="connections")
+    def connections(self, request):
+        """Endpoint for the shortest itineraries between two airports or cities"""
+        params = request.query_params
+        graph = get_route_graph()
+        sources, targets = endpoint_airports(params, graph)
+
+        k = int_param(params, "k", default=3)
+        if not 1 <= k <= 10:
+            raise ValidationError({"k": "k must be in range (1, 10)."})
+
+        by = params.get("by", "distance")
+        if by not in ("distance", "legs"):
+            raise ValidationError({"by": "Use distance or legs."})
+
+        itineraries = graph.shortest_paths(sources, targets, k=k, by=by)
+        return Response(itineraries, status=status.HTTP_200_OK)
+
+
+class FlightPagination(KeysetPagination):
+    # pk, as the search rows serving the list have no id field
+    ordering = ("departure_time", "pk")
+
 
 class FlightViewSet(
     mixins.ListModelMixin,
@@ -229,46 +484,109 @@ class FlightViewSet(
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = (
-        Flight.objects.select_related(
-            "route",
-            "airplane",
-            "route__destination__closest_big_city",
-            "route__source__closest_big_city",
-        )
-        .prefetch_related("crews")
-        .annotate(
-            tickets_available=(
-                F("airplane__rows") * F("airplane__seats_in_row") - Count("tickets")
-            )
-        )
-    )
+    queryset = Flight.objects.select_related(
+        "route",
+        "airplane",
+        "route__destination__closest_big_city",
+        "route__source__closest_big_city",
+    ).prefetch_related("crews")
     serializer_class = FlightSerializer
+    pagination_class = FlightPagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
+    def serves_search_rows(self):
+        return self.action == "list" and settings.FLIGHT_LIST_FROM_SEARCH_ROWS
+
     def get_serializer_class(self):
+        if self.serves_search_rows():
+            return FlightSearchRowSerializer
+
         if self.action == "list":
             return FlightListSerializer
 
         if self.action == "retrieve":
             return FlightDetailSerializer
 
+        if self.action == "seat_map":
+            return FlightSeatMapSerializer
+
+        if self.action == "itineraries":
+            return ItinerarySerializer
+
+        if self.action == "import_schedule":
+            return ScheduleImportSerializer
+
         return FlightSerializer
 
+    @staticmethod
+    def _departure_bound(param, value, end=False, dates_only=False):
+        """Turn a date or datetime query param into an aware timestamp.
+
+        A plain date means the start of that day, or the start of the
+        next day when it closes the range, so ranges stay half-open.
+        """
+        try:
+            day = parse_date(value)
+            moment = None if day or dates_only else parse_datetime(value)
+        except ValueError:
+            day = moment = None
+
+        if day:
+            moment = datetime.combine(day + timedelta(days=int(end)), time.min)
+
+        if moment is None:
+            if dates_only:
+                raise ValidationError({param: "Use YYYY-MM-DD format."})
+            raise ValidationError(
+                {param: "Use YYYY-MM-DD or YYYY-MM-DDThh:mm format."}
+            )
+
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+
+        return moment
+
     def get_queryset(self):
         airport_from = self.request.query_params.get("airport_from")
         airport_to = self.request.query_params.get("airport_to")
         date = self.request.query_params.get("date")
+        date_from = self.request.query_params.get("date_from")
+        date_to = self.request.query_params.get("date_to")
+
+        source_name, destination_name = "route__source__name", "route__destination__name"
+        if self.serves_search_rows():
+            self.queryset = FlightSearchRow.objects.all()
+            source_name, destination_name = "source_name", "destination_name"
 
         if airport_from:
-            self.queryset = self.queryset.filter(route__source__name__icontains=airport_from)
+            self.queryset = self.queryset.filter(
+                **{f"{source_name}__icontains": airport_from}
+            )
 
         if airport_to:
-            self.queryset = self.queryset.filter(route__destination__name__icontains=airport_to)
+            self.queryset = self.queryset.filter(
+                **{f"{destination_name}__icontains": airport_to}
+            )
 
         if date:
-            date = datetime.strptime(date, "%Y-%m-%d").date()
-            self.queryset = self.queryset.filter(departure_time__date=date)
+            self.queryset = self.queryset.filter(
+                departure_time__gte=self._departure_bound(
+                    "date", date, dates_only=True
+                ),
+                departure_time__lt=self._departure_bound(
+                    "date", date, end=True, dates_only=True
+                ),
+            )
+
+        if date_from:
+            self.queryset = self.queryset.filter(
+                departure_time__gte=self._departure_bound("date_from", date_from)
+            )
+
+        if date_to:
+            self.queryset = self.queryset.filter(
+                departure_time__lt=self._departure_bound("date_to", date_to, end=True)
+            )
 
         return self.queryset
 
@@ -288,14 +606,274 @@ class FlightViewSet(
                 name="date",
                 description="Filter by date of departure (ex. ?date=2023-09-12)",
                 type=OpenApiTypes.DATE
-            )
+            ),
+            OpenApiParameter(
+                name="date_from",
+                description="Filter by departure from this date or time "
+                "(ex. ?date_from=2023-09-12 or ?date_from=2023-09-12T08:00)",
+                type=OpenApiTypes.STR
+            ),
+            OpenApiParameter(
+                name="date_to",
+                description="Filter by departure up to the end of this date or "
+                "before this time (ex. ?date_to=2023-09-14 or ?date_to=2023-09-14T18:00)",
+                type=OpenApiTypes.STR
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @action(methods=["GET"], detail=True, url_path="seat-map")
+    def seat_map(self, request, pk=None):
+        """Endpoint for seat occupancy of specific flight, one string per row"""
+        flight = self.get_object()
+        serializer = self.get_serializer(flight)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(parameters=EXPORT_PARAMETERS, responses={200: OpenApiTypes.BINARY})
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="export",
+        permission_classes=[IsAdminUser],
+    )
+    def export(self, request):
+        """Endpoint for streaming flights matching list filters as a file"""
+        export_format = export_format_param(request.query_params)
+        queryset = self.filter_queryset(self.get_queryset()).order_by(
+            "departure_time", "id"
+        )
+        return streaming_export(FLIGHT_EXPORT, queryset, export_format)
+
+    @extend_schema(parameters=EXPORT_PARAMETERS, responses={200: OpenApiTypes.BINARY})
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="manifest",
+        permission_classes=[IsAdminUser],
+    )
+    def manifest(self, request, pk=None):
+        """Endpoint for streaming passengers of specific flight as a file"""
+        export_format = export_format_param(request.query_params)
+        flight = self.get_object()
+        queryset = Ticket.objects.filter(flight=flight).order_by("row", "seat")
+        return streaming_export(
+            MANIFEST_EXPORT, queryset, export_format, f"manifest-{flight.pk}"
+        )
+
+    @extend_schema(responses=ScheduleImportResultSerializer)
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        url_name="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    def import_schedule(self, request):
+        """Endpoint for creating or updating flights from a CSV or NDJSON schedule"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        lines = codecs.iterdecode(serializer.validated_data["file"], "utf-8")
+        rows = read_schedule(lines, serializer.validated_data["file_format"])
+        result = ScheduleImporter().run(rows)
+
+        return Response(result, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=ENDPOINT_PARAMETERS + [
+            OpenApiParameter(
+                name="date",
+                description="Date of departure of the first flight (ex. ?date=2023-09-12)",
+                type=OpenApiTypes.DATE
+            ),
+            OpenApiParameter(
+                name="min_layover",
+                description="Minimal layover in minutes (ex. ?min_layover=60)",
+                type=OpenApiTypes.INT
+            ),
+            OpenApiParameter(
+                name="max_layover",
+                description="Maximal layover in minutes (ex. ?max_layover=240)",
+                type=OpenApiTypes.INT
+            ),
+            OpenApiParameter(
+                name="max_stops",
+                description="Maximal number of stops, up to 2 (ex. ?max_stops=1)",
+                type=OpenApiTypes.INT
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="itineraries")
+    def itineraries(self, request):
+        """Endpoint for direct and connecting flights with free seats"""
+        params = request.query_params
+        graph = get_route_graph()
+        sources, targets = endpoint_airports(params, graph)
+
+        date = params.get("date")
+        if not date:
+            raise ValidationError({"date": "This query parameter is required."})
 
-class OrderPagination(PageNumberPagination):
+        min_layover = int_param(
+            params,
+            "min_layover",
+            default=int(settings.ITINERARY_MIN_LAYOVER.total_seconds() // 60),
+        )
+        max_layover = int_param(
+            params,
+            "max_layover",
+            default=int(settings.ITINERARY_MAX_LAYOVER.total_seconds() // 60),
+        )
+        if not 0 <= min_layover <= max_layover:
+            raise ValidationError(
+                {"max_layover": "max_layover must not be less than min_layover."}
+            )
+
+        max_stops = int_param(params, "max_stops", default=2)
+        if not 0 <= max_stops <= 2:
+            raise ValidationError({"max_stops": "max_stops must be in range (0, 2)."})
+
+        itineraries = search_itineraries(
+            graph,
+            sources,
+            targets,
+            departure_from=self._departure_bound("date", date, dates_only=True),
+            departure_to=self._departure_bound(
+                "date", date, end=True, dates_only=True
+            ),
+            min_layover=timedelta(minutes=min_layover),
+            max_layover=timedelta(minutes=max_layover),
+            max_stops=max_stops,
+        )
+        serializer = self.get_serializer(
+            [
+                {
+                    "stops": len(flights) - 1,
+                    "departure_time": flights[0].departure_time,
+                    "arrival_time": flights[-1].arrival_time,
+                    "flights": flights,
+                }
+                for flights in itineraries
+            ],
+            many=True,
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class FlightScheduleViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.UpdateModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Recurring flights, stored as Flight rows only near their departure"""
+
+    queryset = FlightSchedule.objects.select_related(
+        "airplane",
+        "route__source__closest_big_city",
+        "route__destination__closest_big_city",
+    ).prefetch_related("crews")
+    serializer_class = FlightScheduleSerializer
+    pagination_class = KeysetPagination
+    permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return FlightScheduleListSerializer
+
+        if self.action == "departures":
+            return ScheduledDepartureSerializer
+
+        if self.action == "materialize":
+            return MaterializeDepartureSerializer
+
+        return FlightScheduleSerializer
+
+    def perform_create(self, serializer):
+        schedule = serializer.save()
+        materialize_schedules(schedules=FlightSchedule.objects.filter(pk=schedule.pk))
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        reschedule(serializer.save())
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="source",
+                description="Id of the departure airport (ex. ?source=1)",
+                type=OpenApiTypes.INT
+            ),
+            OpenApiParameter(
+                name="destination",
+                description="Id of the arrival airport (ex. ?destination=2)",
+                type=OpenApiTypes.INT
+            ),
+            OpenApiParameter(
+                name="date_from",
+                description="First date of departure (ex. ?date_from=2024-05-01)",
+                type=OpenApiTypes.DATE
+            ),
+            OpenApiParameter(
+                name="date_to",
+                description="Last date of departure, up to a year after date_from "
+                "(ex. ?date_to=2024-05-31)",
+                type=OpenApiTypes.DATE
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="departures")
+    def departures(self, request):
+        """Endpoint for scheduled departures, materialized as flights or not"""
+        params = request.query_params
+        date_from, date_to = date_range_params(params)
+
+        schedules = self.get_queryset().filter(
+            valid_from__lte=date_to, valid_until__gte=date_from
+        )
+        source = int_param(params, "source")
+        if source is not None:
+            schedules = schedules.filter(route__source_id=source)
+        destination = int_param(params, "destination")
+        if destination is not None:
+            schedules = schedules.filter(route__destination_id=destination)
+
+        departures = scheduled_departures(list(schedules), date_from, date_to)
+        serializer = self.get_serializer(departures, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(responses=FlightDetailSerializer)
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="materialize",
+        permission_classes=[IsAuthenticated],
+    )
+    def materialize(self, request, pk=None):
+        """Endpoint for turning a scheduled departure into a bookable flight"""
+        schedule = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        departure_time = serializer.validated_data["departure_time"]
+        if departure_time < timezone.now() or not is_occurrence(
+            schedule, departure_time
+        ):
+            raise ValidationError(
+                {"departure_time": "The schedule has no future departure at this time."}
+            )
+
+        flight = materialize_departure(schedule, departure_time)
+        flight = FlightViewSet.queryset.get(pk=flight.pk)
+        return Response(FlightDetailSerializer(flight).data, status=status.HTTP_200_OK)
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ("-created_at", "id")
     page_size = 10
     max_page_size = 100
 
@@ -305,13 +883,22 @@ class OrderViewSet(
     mixins.CreateModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Order.objects.prefetch_related("tickets__flight__route")
+    queryset = Order.objects.prefetch_related(
+        Prefetch(
+            "tickets",
+            queryset=Ticket.objects.select_related(
+                "flight__airplane",
+                "flight__route__source__closest_big_city",
+                "flight__route__destination__closest_big_city",
+            ).defer("flight__seat_map"),
+        )
+    )
     serializer_class = OrderSerializer
     pagination_class = OrderPagination
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return self.queryset.filter(user=self.request.user)
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -321,3 +908,322 @@ class OrderViewSet(
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    @extend_schema(parameters=EXPORT_PARAMETERS, responses={200: OpenApiTypes.BINARY})
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="export",
+        permission_classes=[IsAdminUser],
+    )
+    def export(self, request):
+        """Endpoint for streaming orders of all users as a file"""
+        export_format = export_format_param(request.query_params)
+        return streaming_export(
+            ORDER_EXPORT, Order.objects.order_by("id"), export_format
+        )
+
+
+class ReservationViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Hold seats for a short time before they are ordered"""
+
+    queryset = Reservation.objects.prefetch_related("holds")
+    serializer_class = ReservationSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.queryset.filter(
+            user=self.request.user, expires_at__gt=timezone.now()
+        )
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class RouteLoadPagination(KeysetPagination):
+    ordering = ("date", "id")
+    page_size = 50
+    max_page_size = 500
+
+
+SALES_PARAMETERS = [
+    OpenApiParameter(
+        name="date_from",
+        description="First date of ordering, 30 days ago by default "
+        "(ex. ?date_from=2024-05-01)",
+        type=OpenApiTypes.DATE
+    ),
+    OpenApiParameter(
+        name="date_to",
+        description="Last date of ordering, up to a year after date_from. "
+        "Defaults to date_from, or to today without it (ex. ?date_to=2024-05-31)",
+        type=OpenApiTypes.DATE
+    ),
+]
+
+
+class AnalyticsViewSet(viewsets.GenericViewSet):
+    """Sales and load factors read from rollups, see airport.analytics.
+
+    Rollups are brought up to date by the rollup_analytics command, so
+    these endpoints never aggregate tickets themselves.
+    """
+
+    queryset = DailyRouteLoad.objects.all()
+    permission_classes = (IsAdminUser,)
+
+    def get_serializer_class(self):
+        if self.action == "airplane_types":
+            return AirplaneTypeSalesSerializer
+
+        if self.action == "top_routes":
+            return RouteSalesSerializer
+
+        return DailyRouteLoadSerializer
+
+    @staticmethod
+    def sales_range(params):
+        today = timezone.now().date()
+        return date_range_params(
+            params,
+            default_from=today - timedelta(days=30),
+            default_to=None if "date_from" in params else today,
+        )
+
+    @extend_schema(
+        parameters=DEPARTURE_PARAMETERS + [
+            OpenApiParameter(
+                name="route",
+                description="Filter by route id (ex. ?route=3)",
+                type=OpenApiTypes.INT
+            ),
+        ]
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="load-factor",
+        pagination_class=RouteLoadPagination,
+    )
+    def load_factor(self, request):
+        """Endpoint for sold and offered seats per route and departure date"""
+        params = request.query_params
+        date_from, date_to = date_range_params(
+            params,
+            default_from=timezone.now().date(),
+            default_to=None if "date_from" in params else booking_horizon(),
+        )
+        loads = route_loads(date_from, date_to, int_param(params, "route"))
+        page = self.paginate_queryset(loads)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(parameters=SALES_PARAMETERS)
+    @action(methods=["GET"], detail=False, url_path="airplane-types")
+    def airplane_types(self, request):
+        """Endpoint for tickets ordered per airplane type, most sold first"""
+        date_from, date_to = self.sales_range(request.query_params)
+        serializer = self.get_serializer(
+            sales_by_airplane_type(date_from, date_to), many=True
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=SALES_PARAMETERS + [
+            OpenApiParameter(
+                name="limit",
+                description="Number of routes, 10 by default and at most 100 "
+                "(ex. ?limit=20)",
+                type=OpenApiTypes.INT
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="top-routes")
+    def top_routes(self, request):
+        """Endpoint for routes with the most tickets ordered"""
+        params = request.query_params
+        date_from, date_to = self.sales_range(params)
+        limit = min(max(int_param(params, "limit", 10), 1), 100)
+        serializer = self.get_serializer(
+            top_selling_routes(date_from, date_to, limit), many=True
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class FlightSearchView(APIView):
+    """Flights between airports or cities on a date, served asynchronously.
+
+    Flights, seats held by active reservations and the matched airports
+    are read by three queries. Django runs async queries in the request's
+    own thread, one after another on its connection, so they are awaited
+    in turn. Under an ASGI server the event loop serves other requests
+    while they run, under WSGI the view is run to completion per request.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    default_limit = 50
+    max_limit = 200
+
+    async def dispatch(self, request, *args, **kwargs):
+        """APIView.dispatch, with the handler awaited.
+
+        Authentication, permissions, throttling and content negotiation
+        read the database or the cache, so they run in a thread.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await self.get(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    @extend_schema(
+        parameters=ENDPOINT_PARAMETERS + [
+            OpenApiParameter(
+                name="date",
+                description="Date of departure (ex. ?date=2023-09-12)",
+                type=OpenApiTypes.DATE,
+                required=True,
+            ),
+            OpenApiParameter(
+                name="limit",
+                description="Number of flights, at most 200 (ex. ?limit=20)",
+                type=OpenApiTypes.INT
+            ),
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    async def get(self, request):
+        params = request.query_params
+        source = self.endpoint(params, "source")
+        destination = self.endpoint(params, "destination")
+        date = params.get("date")
+        if not date:
+            raise ValidationError({"date": "This query parameter is required."})
+        departure = {
+            "departure_time__gte": FlightViewSet._departure_bound(
+                "date", date, dates_only=True
+            ),
+            "departure_time__lt": FlightViewSet._departure_bound(
+                "date", date, end=True, dates_only=True
+            ),
+        }
+        limit = min(
+            max(int_param(params, "limit", self.default_limit), 1), self.max_limit
+        )
+
+        route = {**self.route_filter(source, "source"), **self.route_filter(
+            destination, "destination"
+        )}
+        flights = await self.flights(route, departure, limit)
+        held = await self.held_seats(route, departure)
+        airports = await self.airports(source, destination)
+
+        return Response(
+            {
+                "airports": airports,
+                "flights": [
+                    {
+                        "id": flight["id"],
+                        "source": flight["route__source_id"],
+                        "destination": flight["route__destination_id"],
+                        "airplane_name": flight["airplane_name"],
+                        "departure_time": flight["departure_time"],
+                        "arrival_time": flight["arrival_time"],
+                        "tickets_available": flight["capacity"]
+                        - flight["seats_sold"]
+                        - held.get(flight["id"], 0),
+                    }
+                    for flight in flights
+                ],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @staticmethod
+    def endpoint(params, name):
+        """Return ("airport" or "city", id) from the airport or city param"""
+        airport_id = int_param(params, name)
+        if airport_id is not None:
+            return "airport", airport_id
+
+        city_id = int_param(params, f"{name}_city")
+        if city_id is not None:
+            return "city", city_id
+
+        raise ValidationError(
+            {name: f"Either {name} or {name}_city is required."}
+        )
+
+    @staticmethod
+    def route_filter(endpoint, side):
+        kind, pk = endpoint
+        if kind == "airport":
+            return {f"route__{side}_id": pk}
+        return {f"route__{side}__closest_big_city_id": pk}
+
+    @staticmethod
+    async def flights(route, departure, limit):
+        queryset = (
+            Flight.objects.filter(**route, **departure)
+            .order_by("departure_time", "id")
+            .values(
+                "id",
+                "route__source_id",
+                "route__destination_id",
+                "departure_time",
+                "arrival_time",
+                "seats_sold",
+                airplane_name=F("airplane__name"),
+                capacity=F("airplane__rows") * F("airplane__seats_in_row"),
+            )
+        )
+        return [flight async for flight in queryset[:limit]]
+
+    @staticmethod
+    async def held_seats(route, departure):
+        """Count seats held by active reservations per matching flight"""
+        queryset = (
+            SeatHold.objects.filter(
+                reservation__expires_at__gt=timezone.now(),
+                **{f"flight__{lookup}": value for lookup, value in route.items()},
+                **{f"flight__{lookup}": value for lookup, value in departure.items()},
+            )
+            .values("flight_id")
+            .annotate(held=Count("id"))
+            .order_by()
+        )
+        return {row["flight_id"]: row["held"] async for row in queryset}
+
+    @staticmethod
+    async def airports(source, destination):
+        matches = {}
+        for side, (kind, pk) in (("source", source), ("destination", destination)):
+            matches[side] = Q(pk=pk) if kind == "airport" else Q(closest_big_city_id=pk)
+
+        queryset = Airport.objects.filter(
+            matches["source"] | matches["destination"]
+        ).values("id", "name", "closest_big_city_id", city=F("closest_big_city__name"))
+
+        airports = {"source": [], "destination": []}
+        async for airport in queryset:
+            for side, (kind, pk) in (("source", source), ("destination", destination)):
+                key = "id" if kind == "airport" else "closest_big_city_id"
+                if airport[key] == pk:
+                    airports[side].append(
+                        {"id": airport["id"], "name": airport["name"], "city": airport["city"]}
+                    )
+        return airports
@@ -0,0 +1,20 @@
+"""
+Settings of the environment named by DJANGO_ENV: dev (the default), test
+or prod. Each of them builds on base.py.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+DJANGO_ENV = os.environ.get("DJANGO_ENV", "dev")
+
+if DJANGO_ENV == "dev":
+    from .dev import *  # noqa: F401,F403
+elif DJANGO_ENV == "test":
+    from .test import *  # noqa: F401,F403
+elif DJANGO_ENV == "prod":
+    from .prod import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(
+        f"DJANGO_ENV must be dev, test or prod, not {DJANGO_ENV!r}"
+    )
@@ -1,5 +1,7 @@
 """
-Django settings for airport_service project.
+Django settings shared by every environment of airport_service.
+
+dev.py, test.py and prod.py build on these, see __init__.py.
 
 Generated by 'django-admin startproject' using Django 4.2.1.
 
@@ -14,7 +16,7 @@ from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 
 # Quick-start development settings - unsuitable for production
@@ -24,13 +26,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = "django-insecure-eulva%6i590h&+=i5w4ih@l1_8^$v-vvnfwa&27+ix+4@6emuo"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = False
 
 ALLOWED_HOSTS = []
 
-INTERNAL_IPS = [
-    "127.0.0.1",
-]
+# Only dev.py turns the debug toolbar on
+DEBUG_TOOLBAR = False
 
 
 # Application definition
@@ -45,14 +46,12 @@ INSTALLED_APPS = [
     "rest_framework",
     "rest_framework_simplejwt",
     "drf_spectacular",
-    "debug_toolbar",
     "user",
     "airport",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -95,6 +94,36 @@ DATABASES = {
     }
 }
 
+# Database exports, audits and rebuilds stream rows from with .iterator()
+# outside a transaction, see prod.py
+STREAMING_DB_ALIAS = "default"
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Seconds a cached list of reference data (countries, cities, airports,
+# airplanes, crews) is kept; saving any of those models invalidates it earlier
+REFERENCE_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a process keeps its route graph. Route writes rebuild it right
+# away in every process only when the cache above is shared (Redis).
+ROUTE_GRAPH_TTL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -143,6 +172,12 @@ MEDIA_ROOT = "/vol/web/media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": ["airport.renderers.ORJSONRenderer"],
+    "DEFAULT_PARSER_CLASSES": [
+        "airport.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.AnonRateThrottle",
@@ -172,3 +207,30 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
 }
+
+# How long seats held by a reservation stay unavailable to other users
+SEAT_HOLD_TTL = timedelta(minutes=10)
+
+# Serve the flight list from FlightSearchRow, a single table kept in sync
+# with flights, instead of joining routes, airports, cities and airplanes
+FLIGHT_LIST_FROM_SEARCH_ROWS = True
+
+# Scheduled departures closer than this are stored as Flight rows
+FLIGHT_BOOKING_WINDOW = timedelta(days=60)
+
+# Tickets join the analytics rollups once their order is this old, so
+# bookings still being committed are not skipped by the watermark
+ANALYTICS_ROLLUP_DELAY = timedelta(minutes=1)
+
+# Delivery of outbox messages, see airport.outbox. A claimed message is
+# retried once its lease ends, failed ones after a doubling delay, and
+# parked after the last attempt.
+OUTBOX_LEASE = timedelta(minutes=5)
+OUTBOX_RETRY_DELAY = timedelta(seconds=30)
+OUTBOX_MAX_ATTEMPTS = 8
+
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "tickets@airpro.local")
+
+# Default layover window between connecting flights of an itinerary
+ITINERARY_MIN_LAYOVER = timedelta(minutes=45)
+ITINERARY_MAX_LAYOVER = timedelta(hours=6)
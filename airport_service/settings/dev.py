@@ -0,0 +1,38 @@
+"""
+Development settings: DEBUG, the debug toolbar and the browsable API.
+"""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+# Also keeps every SQL query of a request in connection.queries
+DEBUG = True
+
+INTERNAL_IPS = [
+    "127.0.0.1",
+]
+
+# The toolbar middleware is sync only. Under ASGI it makes Django run
+# async views in the sync thread, where concurrent ORM calls deadlock,
+# so set DEBUG_TOOLBAR=false when serving with uvicorn.
+DEBUG_TOOLBAR = os.environ.get("DEBUG_TOOLBAR", "true") == "true"
+
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS = [*INSTALLED_APPS, "debug_toolbar"]
+    MIDDLEWARE = [
+        MIDDLEWARE[0],
+        "debug_toolbar.middleware.DebugToolbarMiddleware",
+        *MIDDLEWARE[1:],
+    ]
+
+# Order confirmations are printed by the outbox worker instead of sent
+EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": [
+        *REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"],
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
@@ -0,0 +1,50 @@
+"""
+Production settings, selected with DJANGO_ENV=prod.
+
+Serve the project with gunicorn, see gunicorn.conf.py.
+"""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES
+
+SECRET_KEY = os.environ["SECRET_KEY"]
+
+ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", "localhost").split(",")
+
+STATIC_ROOT = "/vol/web/static"
+
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 25))
+EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS") == "true"
+
+
+# Database connections
+# https://docs.djangoproject.com/en/4.2/ref/databases/#persistent-connections
+
+# Each worker thread keeps its connection for this many seconds instead of
+# opening one per request. Health checks replace a connection that died
+# between requests (database restart, pooler timeout) before it is used.
+DATABASES = {
+    "default": {
+        **DATABASES["default"],
+        "PORT": os.environ.get("POSTGRES_PORT", ""),
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+}
+
+# Behind pgbouncer in transaction pooling mode consecutive transactions of a
+# connection may run on different server connections. A server-side cursor
+# of .iterator() inside a transaction lives and dies with it, so it works,
+# but the WITH HOLD cursor Django declares outside one does not. Streaming
+# reads outside a transaction go to PostgreSQL directly instead.
+if os.environ.get("DB_POOLER") == "pgbouncer":
+    DATABASES["direct"] = {
+        **DATABASES["default"],
+        "HOST": os.environ.get("POSTGRES_DIRECT_HOST", "db"),
+        "PORT": os.environ.get("POSTGRES_DIRECT_PORT", ""),
+    }
+    STREAMING_DB_ALIAS = "direct"
@@ -0,0 +1,7 @@
+"""
+Settings of `manage.py test`, which selects them unless DJANGO_ENV is set.
+"""
+from .base import *  # noqa: F401,F403
+
+# Hashing with the default PBKDF2 iterations dominates tests creating users
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
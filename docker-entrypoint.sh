@@ -0,0 +1,9 @@
+#!/bin/sh
+# Production entrypoint: migrate, collect static files, then start gunicorn.
+set -e
+
+python manage.py wait_for_db
+python manage.py migrate --noinput
+python manage.py collectstatic --noinput
+
+exec gunicorn --config gunicorn.conf.py
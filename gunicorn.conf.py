@@ -0,0 +1,32 @@
+"""
+gunicorn settings of the production server, overridable by environment.
+
+Sync WSGI workers with threads keep one persistent database connection per
+thread, so at most WEB_CONCURRENCY * GUNICORN_THREADS connections are open.
+GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker serves the ASGI
+application instead, for the async flight search. Django 4.2 can't reuse
+connections across ASGI requests, so put pgbouncer in front of PostgreSQL
+when doing that.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)
+)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+keepalive = 5
+
+# Restart workers now and then, so a slow leak can't grow without bounds
+max_requests = 2000
+max_requests_jitter = 200
+
+if "uvicorn" in worker_class:
+    wsgi_app = "airport_service.asgi:application"
+else:
+    wsgi_app = "airport_service.wsgi:application"
+
+accesslog = "-"